@@ -0,0 +1,143 @@
+"""Per-player command serialization for game routes.
+
+Commands of one player run one at a time within a worker. Workers sharing
+the database (``cache_sync_enabled``) also check ``User.version`` at every
+commit of a command: a command that another worker's command of the same
+player overtook is rolled back with 409, and the client sends it again.
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Annotated
+
+from fastapi import Depends, HTTPException
+from sqlalchemy import event, update
+from sqlmodel import Session
+
+from app.auth import get_current_user, oauth2_scheme, token_subject
+from app.config import settings
+from app.database import get_session
+from app.events import bus
+from app.models import User
+
+
+class PlayerActor:
+    """FIFO queue of one player's commands; only the head is running."""
+    __slots__ = ("lock", "pending")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.pending = 0
+
+
+class ActorRegistry:
+    """Actors of players with commands in flight, plus queue metrics.
+
+    An actor exists only while its player has a command running or queued,
+    so memory is bounded by the number of requests in flight.
+    """
+
+    def __init__(self):
+        self._actors: dict[str, PlayerActor] = {}
+        self.clear()
+
+    def clear(self) -> None:
+        """Reset actors and metrics."""
+        self._actors.clear()
+        self.commands = 0
+        self.queued = 0
+        self.max_queue_depth = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @asynccontextmanager
+    async def turn(self, player: str):
+        """Wait until all earlier commands of ``player`` are done."""
+        actor = self._actors.get(player)
+        if actor is None:
+            actor = self._actors[player] = PlayerActor()
+        actor.pending += 1
+        self.max_queue_depth = max(self.max_queue_depth, actor.pending - 1)
+        self.queued += 1
+        started = time.perf_counter()
+        try:
+            await actor.lock.acquire()
+        except BaseException:
+            self._leave(player, actor)
+            raise
+        finally:
+            self.queued -= 1
+
+        wait = time.perf_counter() - started
+        self.commands += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        try:
+            yield
+        finally:
+            actor.lock.release()
+            self._leave(player, actor)
+
+    def _leave(self, player: str, actor: PlayerActor) -> None:
+        actor.pending -= 1
+        if actor.pending == 0:
+            del self._actors[player]
+
+    def metrics(self) -> dict:
+        """Queue depth and wait time statistics."""
+        return {
+            "active_players": len(self._actors),
+            "queued_commands": self.queued,
+            "max_queue_depth": self.max_queue_depth,
+            "commands": self.commands,
+            "avg_wait_ms": round(self.total_wait / self.commands * 1000, 3) if self.commands else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 3),
+        }
+
+
+actors = ActorRegistry()
+
+
+async def player_turn(token: Annotated[str, Depends(oauth2_scheme)]):
+    """Run the route as the player's only command in flight.
+
+    The command starts once the events of the earlier ones are handled.
+    """
+    player = token_subject(token)
+    if player is None:
+        # get_current_user rejects the request
+        yield
+        return
+    async with actors.turn(player):
+        await bus.settled(player)
+        yield
+
+
+def command_version(db: Session = Depends(get_session), user: User = Depends(get_current_user)):
+    """Make the commits of the command fail if another worker ran one of the player's meanwhile.
+
+    Listed after ``player_turn``, so the version is read once the earlier
+    commands of this worker are done.
+    """
+    if not settings.cache_sync_enabled:
+        yield
+        return
+    db.info["command_version"] = (user.id, user.version)
+    try:
+        yield
+    finally:
+        db.info.pop("command_version", None)
+
+
+@event.listens_for(Session, "before_commit")
+def _check_command_version(db: Session) -> None:
+    claim = db.info.get("command_version")
+    if claim is None:
+        return
+    user_id, version = claim
+    updated = db.execute(
+        update(User).where(User.id == user_id, User.version == version).values(version=version + 1)
+    ).rowcount
+    if not updated:
+        raise HTTPException(409, "Another command of the player ran first, send it again")
+    db.info["command_version"] = (user_id, version + 1)
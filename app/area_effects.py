@@ -0,0 +1,85 @@
+"""Set-based area effects on map tiles.
+
+An effect resolves all of its target areas with one range query (or a
+slice of an in-memory grid) and applies the resulting tile changes with
+one bulk UPDATE, so its cost in queries does not depend on the size or
+number of areas.
+"""
+from sqlalchemy import and_, or_, update
+from sqlmodel import Session
+
+from app.models import MapTile
+
+
+class Area:
+    """Rectangle of tiles, optionally narrowed to a circle."""
+    __slots__ = ("x1", "y1", "x2", "y2", "center", "radius")
+
+    def __init__(self, x1: int, y1: int, x2: int, y2: int):
+        self.x1, self.y1, self.x2, self.y2 = x1, y1, x2, y2
+        self.center = None
+        self.radius = None
+
+    @classmethod
+    def square(cls, x: int, y: int, radius: int) -> "Area":
+        """Square of side ``2 * radius + 1`` centered on a tile."""
+        return cls(x - radius, y - radius, x + radius, y + radius)
+
+    @classmethod
+    def circle(cls, x: int, y: int, radius: int) -> "Area":
+        """Tiles within Euclidean ``radius`` of a tile."""
+        area = cls.square(x, y, radius)
+        area.center = (x, y)
+        area.radius = radius
+        return area
+
+    def clip(self, width: int, height: int) -> "Area":
+        """Limit the area to a ``width`` x ``height`` map."""
+        self.x1, self.y1 = max(self.x1, 0), max(self.y1, 0)
+        self.x2, self.y2 = min(self.x2, width - 1), min(self.y2, height - 1)
+        return self
+
+    def contains(self, x: int, y: int) -> bool:
+        """Check if a tile is inside the area."""
+        if not (self.x1 <= x <= self.x2 and self.y1 <= y <= self.y2):
+            return False
+        if self.center is None:
+            return True
+        return (x - self.center[0]) ** 2 + (y - self.center[1]) ** 2 <= self.radius ** 2
+
+    def cells(self):
+        """Yield the ``(x, y)`` cells of the area."""
+        for x in range(self.x1, self.x2 + 1):
+            for y in range(self.y1, self.y2 + 1):
+                if self.contains(x, y):
+                    yield x, y
+
+    def condition(self):
+        """SQL condition selecting the area's tiles."""
+        condition = and_(
+            MapTile.x >= self.x1, MapTile.x <= self.x2,
+            MapTile.y >= self.y1, MapTile.y <= self.y2
+        )
+        if self.center is None:
+            return condition
+        dx, dy = MapTile.x - self.center[0], MapTile.y - self.center[1]
+        return and_(condition, dx * dx + dy * dy <= self.radius ** 2)
+
+
+def change_tiles(
+    db: Session,
+    user_id: int,
+    areas: list[Area],
+    tile_type: str,
+    from_type: str | None = None
+) -> None:
+    """Set the type of the player's tiles inside any of the areas with one bulk UPDATE."""
+    if not areas:
+        return
+    query = update(MapTile).where(
+        MapTile.user_id == user_id,
+        or_(*(area.condition() for area in areas))
+    )
+    if from_type is not None:
+        query = query.where(MapTile.tile_type == from_type)
+    db.execute(query.values(tile_type=tile_type))
@@ -1,6 +1,10 @@
 """
 Authentication routes and utilities.
 """
+import base64
+import hashlib
+import hmac
+import secrets
 from datetime import datetime, timedelta, timezone
 from typing import Annotated
 
@@ -10,12 +14,15 @@ from jose import JWTError, jwt
 from passlib.context import CryptContext
 from sqlmodel import Session, select
 
+from app import journal
 from app.config import settings
 from app.database import get_session
-from app.models import User
+from app.models import User, RefreshToken
 
 pwd_context = CryptContext(schemes=["sha256_crypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
+# last_action is only needed for idle checks measured in days
+LAST_ACTION_RESOLUTION = timedelta(minutes=1)
 
 
 def get_password_hash(password: str) -> str:
@@ -42,11 +49,113 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None) -> s
     )
 
 
+def _token_hash(secret: str) -> str:
+    return hashlib.sha256(secret.encode()).hexdigest()
+
+
+def _next_secret(secret: str) -> str:
+    # Derived rather than random, so a repeated rotation gets the same token
+    digest = hmac.new(settings.secret_key.encode(), secret.encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+
+def issue_refresh_token(
+        db: Session,
+        user: User,
+        session: RefreshToken | None = None,
+        secret: str | None = None
+) -> str:
+    """Start a session with a new refresh token, or rotate the token of a session.
+
+    The token is ``<session id>.<secret>``; only a SHA-256 of the secret is
+    stored, so checking it costs no password hashing. The caller commits.
+    """
+    secret = secret or secrets.token_urlsafe(32)
+    if session is None:
+        session = RefreshToken(
+            id=secrets.token_urlsafe(12),
+            user_id=user.id,
+            token_hash="",
+            expires_at=datetime.now()
+        )
+    session.token_hash = _token_hash(secret)
+    session.expires_at = datetime.now() + timedelta(days=settings.refresh_token_expire_days)
+    db.add(session)
+    return f"{session.id}.{secret}"
+
+
+def _refresh_session(db: Session, token: str) -> tuple[RefreshToken | None, bool]:
+    """Session of a refresh token and whether the token is its current one."""
+    session_id, _, secret = token.partition(".")
+    session = db.get(RefreshToken, session_id) if secret else None
+    if session is None:
+        return None, False
+    return session, hmac.compare_digest(session.token_hash, _token_hash(secret))
+
+
+def rotate_refresh_token(db: Session, token: str) -> tuple[User, str]:
+    """Exchange a refresh token for its user and a new refresh token.
+
+    A token that was already rotated is a sign of theft: the whole
+    session is revoked, so neither the thief nor the owner can use it.
+    Only the token rotated last is accepted again for
+    ``refresh_token_reuse_grace_seconds``, and gets the same new token:
+    requests of one client that refresh at the same time are not theft.
+    """
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid refresh token",
+    )
+    session, current = _refresh_session(db, token)
+    if session is None or session.revoked or session.expires_at < datetime.now():
+        raise credentials_exception
+    user = db.get(User, session.user_id)
+    if user is None:
+        raise credentials_exception
+
+    next_secret = _next_secret(token.partition(".")[2])
+    if current:
+        new_token = issue_refresh_token(db, user, session, next_secret)
+        db.commit()
+        return user, new_token
+
+    # Every rotation moves the expiry, so it also tells when the last one was
+    rotated_at = session.expires_at - timedelta(days=settings.refresh_token_expire_days)
+    grace = timedelta(seconds=settings.refresh_token_reuse_grace_seconds)
+    if datetime.now() - rotated_at <= grace \
+            and hmac.compare_digest(session.token_hash, _token_hash(next_secret)):
+        return user, f"{session.id}.{next_secret}"
+    session.revoked = True
+    db.commit()
+    raise credentials_exception
+
+
+def revoke_refresh_token(db: Session, token: str) -> None:
+    """End the session of a refresh token."""
+    session, current = _refresh_session(db, token)
+    if session is not None and current:
+        session.revoked = True
+        db.commit()
+
+
+def token_subject(token: str) -> str | None:
+    """Return the username of a valid token without touching the database."""
+    try:
+        payload = jwt.decode(
+            token,
+            settings.secret_key,
+            algorithms=[settings.algo]
+        )
+    except JWTError:
+        return None
+    return payload.get("sub")
+
+
 async def get_current_user(
         token: Annotated[str, Depends(oauth2_scheme)],
         db_session: Session = Depends(get_session)
 ) -> User:
-    """Get current user from JWT token."""
+    """Get current user from JWT token and record their activity."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -67,11 +176,17 @@ async def get_current_user(
             user.y = 0
             user.health = 100
             user.is_active = True
+            journal.record(db_session, user, "reset", p=[0, 0, 100])
             db_session.commit()
 
         if user is None:
             raise credentials_exception
 
+        now = datetime.now()
+        if user.last_action is None or now - user.last_action > LAST_ACTION_RESOLUTION:
+            user.last_action = now
+            db_session.commit()
+
     except JWTError as exc:
         raise credentials_exception from exc
 
@@ -0,0 +1,158 @@
+"""Invalidation of per-process caches across workers sharing the database.
+
+Every worker keeps its own response cache and leaderboard. With
+``cache_sync_enabled`` each worker appends the user ids it bumps to the
+``cacheinvalidation`` table every ``cache_sync_interval_ms`` and applies
+the rows written by the others. Between writes the check is a single
+``PRAGMA data_version`` on a connection kept open for it, which changes
+only after another connection committed, so idle polling never reads the
+table. While nothing changes the interval doubles up to
+``cache_sync_max_interval_ms``.
+"""
+import asyncio
+import logging
+import time
+from threading import Lock
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import Connection, Engine, delete, func, insert, select
+from sqlmodel import Session
+
+from app.config import settings
+from app.database import engine as app_engine
+from app.leaderboard import Leaderboard, leaderboard
+from app.models import CacheInvalidation
+from app.response_cache import ResponseCache, response_cache
+
+logger = logging.getLogger(__name__)
+
+
+class CacheSync:
+    """Exchange of cache invalidations between the workers of one database."""
+
+    def __init__(self, engine: Engine, cache: ResponseCache, board: Leaderboard):
+        self.engine = engine
+        self.cache = cache
+        self.board = board
+        self._lock = Lock()
+        self._connection: Connection | None = None
+        self._data_version = None
+        self._last_id = 0
+        self._trimmed = 0.0
+        self.sent = 0
+        self.received = 0
+        self.resets = 0
+
+    @property
+    def running(self) -> bool:
+        return self._connection is not None
+
+    def start(self) -> None:
+        """Start collecting local invalidations; older ones are not needed."""
+        with self._lock:
+            self._connection = self.engine.connect()
+            self._last_id = self._connection.execute(
+                select(func.max(CacheInvalidation.id))
+            ).scalar() or 0
+            self._connection.rollback()
+            self.cache.outbox = set()
+
+    def stop(self) -> None:
+        """Send the remaining invalidations and close the connection."""
+        self.sync()
+        with self._lock:
+            self.cache.outbox = None
+            self._connection.close()
+            self._connection = None
+
+    def sync(self) -> bool:
+        """Send local invalidations and apply the ones of other workers.
+
+        Returns whether anything was sent or the database changed.
+        """
+        with self._lock:
+            if self._connection is None:
+                return False
+            outbox = self.cache.take_outbox()
+            self._send(outbox)
+            data_version = self._connection.exec_driver_sql("PRAGMA data_version").scalar()
+            changed = data_version != self._data_version
+            if changed:
+                self._data_version = data_version
+                self._receive()
+            self._connection.rollback()
+            if time.time() - self._trimmed > settings.cache_sync_retention_seconds:
+                self._trim()
+            return changed or bool(outbox)
+
+    def _send(self, user_ids: set[int]) -> None:
+        if not user_ids:
+            return
+        now = time.time()
+        with self.engine.begin() as connection:
+            connection.execute(insert(CacheInvalidation), [
+                {"user_id": user_id, "origin": self.cache.nonce, "created": now}
+                for user_id in user_ids
+            ])
+        self.sent += len(user_ids)
+
+    def _receive(self) -> None:
+        rows = self._connection.execute(
+            select(CacheInvalidation.id, CacheInvalidation.user_id, CacheInvalidation.origin)
+            .where(CacheInvalidation.id > self._last_id)
+            .order_by(CacheInvalidation.id)
+        ).all()
+        if not rows:
+            return
+        # Ids have no gaps unless rows were trimmed before this worker saw them
+        if rows[0].id != self._last_id + 1 and self._last_id:
+            logger.warning("Missed cache invalidations, dropping all cached data")
+            self.cache.clear()
+            self.board.clear()
+            self.resets += 1
+        self._last_id = rows[-1].id
+        user_ids = list({row.user_id for row in rows if row.origin != self.cache.nonce})
+        if not user_ids:
+            return
+        for user_id in user_ids:
+            self.cache.bump(user_id, share=False)
+        with Session(bind=self._connection) as db:
+            self.board.refresh(db, user_ids)
+        self.received += len(user_ids)
+
+    def _trim(self) -> None:
+        self._trimmed = time.time()
+        with self.engine.begin() as connection:
+            connection.execute(delete(CacheInvalidation).where(
+                CacheInvalidation.created < self._trimmed - settings.cache_sync_retention_seconds
+            ))
+
+    def metrics(self) -> dict:
+        """Invalidations exchanged with the other workers."""
+        return {
+            "running": self.running,
+            "sent": self.sent,
+            "received": self.received,
+            "resets": self.resets,
+        }
+
+
+cache_sync = CacheSync(app_engine, response_cache, leaderboard)
+
+
+async def run_cache_sync() -> None:
+    """Exchange invalidations every ``cache_sync_interval_ms``, less often while idle."""
+    await run_in_threadpool(cache_sync.start)
+    interval = settings.cache_sync_interval_ms
+    try:
+        while True:
+            await asyncio.sleep(interval / 1000)
+            try:
+                active = await run_in_threadpool(cache_sync.sync)
+            except Exception:  # pylint: disable=broad-exception-caught
+                logger.exception("Cache sync failed")
+                continue
+            interval = settings.cache_sync_interval_ms if active \
+                else min(interval * 2, settings.cache_sync_max_interval_ms)
+    finally:
+        await run_in_threadpool(cache_sync.stop)
@@ -7,5 +7,61 @@ class Settings(BaseSettings):
     algo: str = "HS256"
     database_url: str = "sqlite:///game.db"
     access_token_expire_minutes: int = 30
+    refresh_token_expire_days: int = 30
+    # A just-rotated refresh token still works this long, e.g. for parallel tabs
+    refresh_token_reuse_grace_seconds: int = 10
+    static_max_age: int = 31536000
+    static_min_compress_size: int = 256
+    action_log_enabled: bool = False
+    snapshot_interval: int = 100
+    fog_of_war: bool = False
+    sight_radius: int = 4
+    # route -> (requests per second, burst) per user
+    rate_limits: dict[str, tuple[float, int]] = {
+        "/game/move": (10.0, 20),
+        "/game/use-wallbreaker": (2.0, 5),
+        "/game/generate_map": (0.2, 3),
+        "/game/reset": (1.0, 5),
+        "/game/surrender": (1.0, 5),
+        "/shared/move": (10.0, 20),
+    }
+    rate_limit_max_keys: int = 200_000
+    max_concurrent_requests: int = 200
+    event_bus_enabled: bool = True
+    event_batch_size: int = 200
+    event_batch_delay_ms: int = 5
+    event_settle_timeout_ms: int = 5000
+    # Several workers on one database: share cache invalidations, command
+    # order, pending events and idempotency keys through it
+    cache_sync_enabled: bool = False
+    cache_sync_interval_ms: int = 5
+    cache_sync_max_interval_ms: int = 20
+    cache_sync_retention_seconds: int = 60
+    # Deletes the map, mobs and inventory of players idle longer than
+    # reaper_idle_days; their progress counters stay
+    reaper_enabled: bool = False
+    reaper_idle_days: int = 30
+    reaper_interval_seconds: int = 600
+    reaper_batch_size: int = 200
+    reaper_time_budget_ms: int = 200
+    reaper_vacuum_pages: int = 2000
+    response_cache_max_users: int = 500_000
+    response_cache_max_entries: int = 100_000
+    idempotent_routes: set[str] = {
+        "/game/move", "/game/use-wallbreaker", "/game/reset",
+        "/game/generate_map", "/game/surrender", "/shared/move",
+    }
+    idempotency_ttl_seconds: int = 300
+    idempotency_max_keys_per_user: int = 16
+    idempotency_max_users: int = 100_000
+    idempotency_lease_seconds: int = 30
+    shared_world_enabled: bool = False
+    shared_map_size: int = 200
+    shared_mob_count: int = 400
+    shared_shard_capacity: int = 1000
+    shared_view_radius: int = 8
+    shared_aggro_radius: int = 4
+    shared_outbox_size: int = 256
+    shared_idle_seconds: int = 300
 
 settings = Settings()
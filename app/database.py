@@ -1,4 +1,8 @@
 """Database connection and setup."""
+import time
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
 from sqlmodel import SQLModel, create_engine, Session
 
 engine = create_engine("sqlite:///database.db")
@@ -9,5 +13,25 @@ def get_session():
         yield session
 
 def create_db_and_tables():
-    """Create database tables."""
-    SQLModel.metadata.create_all(engine)
+    """Create database tables and the indexes missing in older databases.
+
+    ``auto_vacuum`` only takes effect on a new database; an existing one
+    keeps its mode until ``VACUUM`` is run once by hand.
+    """
+    with engine.begin() as connection:
+        # Lets the reaper return freed pages
+        connection.execute(text("PRAGMA auto_vacuum = INCREMENTAL"))
+    # Workers started together race to create the same tables
+    for attempt in range(5):
+        try:
+            SQLModel.metadata.create_all(engine)
+            # create_all skips existing tables together with their new indexes
+            for table in SQLModel.metadata.sorted_tables:
+                for index in table.indexes:
+                    index.create(engine, checkfirst=True)
+            return
+        except OperationalError:
+            if attempt == 4:
+                raise
+            # Give the worker holding the schema lock time to finish
+            time.sleep(0.1 * 2 ** attempt)
@@ -0,0 +1,367 @@
+"""Headless game rules: map, player, mobs and commands, without any I/O.
+
+``GameWorld`` keeps the map in a flat ``bytearray`` and the player and mobs
+in ``__slots__`` objects. Routes load a world from the database, run one
+command on it and write back what changed; bots, balancing scripts and
+tests can drive it directly.
+"""
+import random
+
+from app.area_effects import Area
+
+MAP_SIZE = 20
+MOB_COUNT = 5
+MOB_HEALTH = 50
+MOB_DAMAGE = 10
+WALL_CHANCE = 0.2
+LOOT_CHANCE = 0.2
+MOB_LOOT = "Mob Loot"
+WALLBREAKER = "Стенолом"
+
+# Kind of the first tile stored at a cell, plus a flag for exit tiles
+EMPTY, FLOOR, WALL, EXIT = 0, 1, 2, 3
+KIND_MASK = 3
+EXIT_FLAG = 4
+TILE_KINDS = {"floor": FLOOR, "wall": WALL, "exit": EXIT}
+TILE_TYPES = {FLOOR: "floor", WALL: "wall", EXIT: "exit"}
+
+DIRECTIONS = {"up": (0, -1), "down": (0, 1), "left": (-1, 0), "right": (1, 0)}
+
+
+class GameError(Exception):
+    """Command rejected by the game rules."""
+
+
+class Player:
+    """Player position and stats."""
+    __slots__ = (
+        "x", "y", "health", "base_attack", "bonus_attack", "bonus_health",
+        "killed_mobs", "upgrade_level", "is_active"
+    )
+
+    def __init__(
+        self,
+        x: int = 0,
+        y: int = 0,
+        health: int = 100,
+        base_attack: int = 10,
+        bonus_attack: int = 0,
+        bonus_health: int = 0,
+        killed_mobs: int = 0,
+        upgrade_level: int = 0,
+        is_active: bool = True
+    ): # pylint: disable=too-many-arguments
+        self.x, self.y = x, y
+        self.health = health
+        self.base_attack = base_attack
+        self.bonus_attack = bonus_attack
+        self.bonus_health = bonus_health
+        self.killed_mobs = killed_mobs
+        self.upgrade_level = upgrade_level
+        self.is_active = is_active
+
+
+class MobState:
+    """Enemy position and health; ``id`` is None until stored."""
+    __slots__ = ("id", "x", "y", "health")
+
+    def __init__(self, mob_id: int | None, x: int, y: int, health: int = MOB_HEALTH):
+        self.id = mob_id
+        self.x, self.y = x, y
+        self.health = health
+
+
+class MoveResult:
+    """Outcome of one move command."""
+    __slots__ = ("outcome", "target", "killed", "loot", "moved", "status")
+
+    def __init__(self):
+        self.outcome = None     # "move", "attack" or None if the player did not act
+        self.target = None      # attacked mob
+        self.killed = False
+        self.loot = []          # names of dropped items
+        self.moved = []         # mobs that changed position
+        self.status = None      # "lose" or "win" when the game is over
+
+
+def apply_upgrades(player: Player) -> bool:
+    """Apply stat upgrades when reaching kill milestones."""
+    if player.killed_mobs < 2 ** player.upgrade_level:
+        return False
+    player.upgrade_level += 1
+    player.bonus_attack += 5
+    player.bonus_health += 20
+    player.health += player.bonus_health
+    return True
+
+
+class GameWorld:
+    """One player's map, mobs and inventory counters."""
+    __slots__ = ("width", "height", "cells", "player", "mobs", "exit", "wallbreakers", "rng")
+
+    def __init__(
+        self,
+        width: int = MAP_SIZE,
+        height: int = MAP_SIZE,
+        player: Player | None = None,
+        rng=None
+    ):
+        self.width, self.height = width, height
+        self.cells = bytearray(width * height)
+        self.player = player or Player()
+        self.mobs: list[MobState] = []
+        self.exit: tuple[int, int] | None = None
+        self.wallbreakers = 0
+        self.rng = rng or random
+
+    @classmethod
+    def from_tiles(
+        cls,
+        tiles,
+        mobs: list[MobState],
+        player: Player,
+        rng=None,
+        size: tuple[int, int] | None = None
+    ) -> "GameWorld":
+        """Build a world from ``(x, y, tile_type)`` rows in storage order.
+
+        ``size`` is needed when ``tiles`` are only part of the map; cells
+        without tiles are ``EMPTY``.
+        """
+        tiles = list(tiles)
+        if size is None:
+            size = (
+                max([MAP_SIZE] + [x + 1 for x, _, _ in tiles]),
+                max([MAP_SIZE] + [y + 1 for _, y, _ in tiles])
+            )
+        world = cls(*size, player, rng)
+        for x, y, tile_type in tiles:
+            world.add_tile(x, y, tile_type)
+        world.mobs = mobs
+        return world
+
+    def add_tile(self, x: int, y: int, tile_type: str) -> None:
+        """Add a tile; the first tile stored at a cell decides passability."""
+        index = y * self.width + x
+        if not self.cells[index] & KIND_MASK:
+            self.cells[index] |= TILE_KINDS[tile_type]
+        if tile_type == "exit":
+            self.cells[index] |= EXIT_FLAG
+            if self.exit is None:
+                self.exit = (x, y)
+
+    def tile_at(self, x: int, y: int) -> int:
+        """Kind of the tile at a cell, ``EMPTY`` outside the map."""
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return self.cells[y * self.width + x] & KIND_MASK
+        return EMPTY
+
+    def is_passable(self, x: int, y: int) -> bool:
+        """Check if a cell can be entered."""
+        return self.tile_at(x, y) in (FLOOR, EXIT)
+
+    def is_exit(self, x: int, y: int) -> bool:
+        """Check if a cell holds an exit tile."""
+        return 0 <= x < self.width and 0 <= y < self.height \
+            and bool(self.cells[y * self.width + x] & EXIT_FLAG)
+
+    def tile_rows(self):
+        """Yield ``(x, y, tile_type)`` rows describing the map."""
+        exits = []
+        for x in range(self.width):
+            for y in range(self.height):
+                cell = self.cells[y * self.width + x]
+                if cell & KIND_MASK:
+                    yield x, y, TILE_TYPES[cell & KIND_MASK]
+                if cell & EXIT_FLAG and cell & KIND_MASK != EXIT:
+                    exits.append((x, y))
+        for x, y in exits:
+            yield x, y, "exit"
+
+    def mob_at(self, x: int, y: int) -> MobState | None:
+        """First mob standing at a cell."""
+        for mob in self.mobs:
+            if mob.x == x and mob.y == y:
+                return mob
+        return None
+
+    def in_sight(self, x: int, y: int, radius: int) -> bool:
+        """Check if the player sees a cell: close enough and no wall between."""
+        x0, y0 = self.player.x, self.player.y
+        if (x - x0) ** 2 + (y - y0) ** 2 > radius ** 2:
+            return False
+        if (x, y) == (x0, y0):
+            return True
+        # Walk the Bresenham line; the target itself may be a wall
+        dx, dy = abs(x - x0), -abs(y - y0)
+        step_x, step_y = (1 if x > x0 else -1), (1 if y > y0 else -1)
+        error = dx + dy
+        cx, cy = x0, y0
+        while True:
+            doubled = 2 * error
+            if doubled >= dy:
+                error += dy
+                cx += step_x
+            if doubled <= dx:
+                error += dx
+                cy += step_y
+            if (cx, cy) == (x, y):
+                return True
+            if self.tile_at(cx, cy) in (WALL, EMPTY):
+                return False
+
+    def reveal(self, explored: bytearray, radius: int) -> list[tuple[int, int]]:
+        """Mark the cells the player sees in a bitset of explored cells.
+
+        Bit ``y * width + x`` stands for a cell. Only cells not explored yet
+        are checked, so a step into known territory costs little. Returns
+        the newly revealed cells.
+        """
+        width = self.width
+        revealed = []
+        area = Area.circle(self.player.x, self.player.y, radius).clip(width, self.height)
+        for x, y in area.cells():
+            index = y * width + x
+            if not explored[index >> 3] & (1 << (index & 7)) and self.in_sight(x, y, radius):
+                explored[index >> 3] |= 1 << (index & 7)
+                revealed.append((x, y))
+        return revealed
+
+    def generate(self, width: int = MAP_SIZE, height: int = MAP_SIZE, mob_count: int = MOB_COUNT) -> None:
+        """Replace the map with a random one: walls, exit and mobs."""
+        rng = self.rng
+        self.width, self.height = width, height
+        self.cells = cells = bytearray(width * height)
+        self.mobs = []
+        fixed = {(0, 0), (1, 0), (0, 1), (width - 1, height - 1)}
+        for x in range(width):
+            for y in range(height):
+                cells[y * width + x] = FLOOR if (x, y) in fixed \
+                    else WALL if rng.random() < WALL_CHANCE else FLOOR
+
+        self.exit = (width - 1, height - 1)
+        cells[-1] |= EXIT_FLAG
+
+        while len(self.mobs) < mob_count:
+            x, y = rng.randint(0, width - 1), rng.randint(0, height - 1)
+            if cells[y * width + x] & KIND_MASK != WALL:
+                self.mobs.append(MobState(None, x, y))
+        self.wallbreakers += 1
+
+    def reset_player(self) -> None:
+        """Put the player back at the start with full health."""
+        player = self.player
+        player.x = player.y = 0
+        player.health = 100 + player.bonus_health
+        player.is_active = True
+
+    def restart(self) -> None:
+        """Start a new game on a new map after a win or a loss."""
+        self.generate()
+        self.reset_player()
+
+    def surrender(self) -> None:
+        """Give up the current game."""
+        self.player.health = 0
+        self._lose()
+
+    def move(self, direction: str) -> MoveResult:
+        """Move the player or attack a mob, then let the mobs act."""
+        player = self.player
+        result = MoveResult()
+        if player.health <= 0:
+            self._lose()
+            result.status = "lose"
+            return result
+        if not player.is_active:
+            raise GameError("Game over!")
+
+        try:
+            dx, dy = DIRECTIONS[direction.lower()]
+        except KeyError as exc:
+            raise GameError("Invalid direction") from exc
+        x, y = player.x + dx, player.y + dy
+        if not self.is_passable(x, y):
+            raise GameError("Invalid move")
+
+        target = self.mob_at(x, y)
+        if target:
+            self._attack(target, result)
+        else:
+            player.x, player.y = x, y
+            result.outcome = "move"
+
+        self._move_mobs(result)
+
+        if player.health <= 0:
+            self._lose()
+            result.status = "lose"
+        elif self.is_exit(player.x, player.y):
+            player.is_active = False
+            result.status = "win"
+        return result
+
+    def use_wallbreaker(self) -> list[tuple[int, int]]:
+        """Destroy walls around the player and the exit, return their cells."""
+        if self.wallbreakers < 1:
+            raise GameError("У вас нет стенолома!")
+        if self.exit is None:
+            raise GameError("Выход не найден")
+
+        destroyed = set()
+        for center_x, center_y in ((self.player.x, self.player.y), self.exit):
+            area = Area.square(center_x, center_y, 1).clip(self.width, self.height)
+            for x, y in area.cells():
+                if (x, y) != self.exit and self.tile_at(x, y) == WALL:
+                    destroyed.add((x, y))
+        if not destroyed:
+            raise GameError("Нет стен для разрушения")
+
+        for x, y in destroyed:
+            index = y * self.width + x
+            self.cells[index] = self.cells[index] & ~KIND_MASK | FLOOR
+        self.wallbreakers -= 1
+        return sorted(destroyed)
+
+    def _lose(self) -> None:
+        self.player.is_active = False
+        self.wallbreakers = 0
+
+    def _attack(self, mob: MobState, result: MoveResult) -> None:
+        player = self.player
+        mob.health -= player.base_attack + player.bonus_attack
+        result.outcome = "attack"
+        result.target = mob
+        if mob.health > 0:
+            return
+
+        player.killed_mobs += 1
+        apply_upgrades(player)
+        self.mobs.remove(mob)
+        result.killed = True
+        result.loot.append(MOB_LOOT)
+        if self.rng.random() < LOOT_CHANCE:
+            result.loot.append(WALLBREAKER)
+            self.wallbreakers += 1
+
+    def _move_mobs(self, result: MoveResult) -> None:
+        player = self.player
+        px, py = player.x, player.y
+        for mob in self.mobs:
+            x, y = mob.x, mob.y
+            dx, dy = px - x, py - y
+            if dx:
+                x += 1 if dx > 0 else -1
+            elif dy:
+                y += 1 if dy > 0 else -1
+            if (x, y) == (px, py) or not self.is_passable(x, y):
+                x, y = mob.x, mob.y
+
+            if abs(x - px) + abs(y - py) == 1:
+                player.health -= MOB_DAMAGE
+                if player.health <= 0:
+                    player.health = 0
+                    player.is_active = False
+            elif (x, y) != (mob.x, mob.y):
+                mob.x, mob.y = x, y
+                result.moved.append(mob)
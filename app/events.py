@@ -0,0 +1,309 @@
+"""In-process bus for game events and their batched consumers.
+
+Routes publish typed events before committing a command; subscribers do
+the follow-up writes (loot, new maps, leaderboard) in batches on their own
+database session, after the response has been sent. Every player's next
+command waits in ``player_turn`` until their earlier events are handled, so
+it never sees a half-applied command.
+
+An event is stored as a ``PendingEvent`` row per subscriber in the
+command's transaction and queued once that commits. A batch deletes its
+rows in the handler's transaction, so a worker that stops or crashes
+leaves its unhandled events in the table, and ``start`` replays them; a
+row deleted by another worker first is skipped. With ``cache_sync_enabled``
+``settled`` also waits for the player's rows written by other workers.
+
+While the bus is not started (tests, scripts) events are handled at once,
+on the publisher's session and in its transaction.
+"""
+import asyncio
+import json
+import logging
+import threading
+from collections import Counter
+from typing import Annotated, Callable, NamedTuple
+
+from fastapi import Depends
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, event as sa_event, update
+from sqlmodel import Session, select
+
+from app.auth import oauth2_scheme, token_subject
+from app.config import settings
+from app.database import engine
+from app.models import PendingEvent
+
+logger = logging.getLogger(__name__)
+
+
+class MobKilled(NamedTuple):
+    """A player killed a mob, ``loot`` are the names of the dropped items."""
+    user_id: int
+    player: str
+    mob_id: int
+    loot: tuple[str, ...] = ()
+
+
+class PlayerDied(NamedTuple):
+    """A player died or surrendered."""
+    user_id: int
+    player: str
+
+
+class ExitReached(NamedTuple):
+    """A player reached the exit of their map."""
+    user_id: int
+    player: str
+
+
+EVENT_TYPES = {event_type.__name__: event_type for event_type in (MobKilled, PlayerDied, ExitReached)}
+
+Handler = Callable[[Session, list], None]
+
+
+class Subscription:
+    """A handler with the queue of events waiting for it."""
+    __slots__ = ("handler", "name", "event_types", "queue", "task")
+
+    def __init__(self, handler: Handler, event_types: tuple[type, ...]):
+        self.handler = handler
+        self.name = f"{handler.__module__}.{handler.__qualname__}"
+        self.event_types = event_types
+        self.queue: asyncio.Queue | None = None
+        self.task: asyncio.Task | None = None
+
+
+class EventBus:
+    """Typed events delivered to subscribers in batches.
+
+    A subscriber is a plain function ``handler(db, events)`` that gets the
+    events in publish order and commits its own writes. Up to
+    ``event_batch_size`` events are handed over at once, gathered for at
+    most ``event_batch_delay_ms`` after the first one. A failed batch is
+    retried one event at a time, so one bad event does not lose the others.
+    """
+
+    def __init__(self, session_factory: Callable[[], Session]):
+        self._session_factory = session_factory
+        self._subscriptions: list[Subscription] = []
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._lock = threading.Lock()
+        self._pending: dict[str, int] = {}
+        self._settled: dict[str, asyncio.Event] = {}
+        self.clear()
+
+    def clear(self) -> None:
+        """Reset metrics and the pending events of players."""
+        with self._lock:
+            self._pending.clear()
+        self._settled.clear()
+        self.published: Counter[str] = Counter()
+        self.batches = 0
+        self.max_batch = 0
+        self.failed = 0
+
+    @property
+    def running(self) -> bool:
+        return self._loop is not None
+
+    def subscribe(self, *event_types: type) -> Callable[[Handler], Handler]:
+        """Decorator registering a handler for the given event types."""
+        def register(handler: Handler) -> Handler:
+            self._subscriptions.append(Subscription(handler, event_types))
+            return handler
+        return register
+
+    def publish(self, db: Session, event: NamedTuple) -> None:
+        """Hand an event to its subscribers once ``db`` commits; callable from any thread."""
+        self.published[type(event).__name__] += 1
+        subscriptions = [sub for sub in self._subscriptions if isinstance(event, sub.event_types)]
+        if self._loop is None:
+            for sub in subscriptions:
+                sub.handler(db, [event])
+            return
+        data = json.dumps(event, ensure_ascii=False, separators=(",", ":"))
+        rows = [
+            PendingEvent(handler=sub.name, player=event.player, kind=type(event).__name__, data=data)
+            for sub in subscriptions
+        ]
+        db.add_all(rows)
+        # Ids are needed after the commit, when the rows can no longer be loaded
+        db.flush()
+        db.info.setdefault("published_events", []).extend(
+            (self, sub, row.id, event) for sub, row in zip(subscriptions, rows)
+        )
+
+    def _enqueue(self, sub: Subscription, row_id: int, event: NamedTuple) -> None:
+        loop = self._loop
+        if loop is None:
+            return  # Replayed by the next start
+        with self._lock:
+            self._pending[event.player] = self._pending.get(event.player, 0) + 1
+        loop.call_soon_threadsafe(sub.queue.put_nowait, (row_id, event))
+
+    def _replay(self) -> int:
+        """Queue the events left unhandled by earlier runs, return their number."""
+        subscriptions = {sub.name: sub for sub in self._subscriptions}
+        with self._session_factory() as db:
+            rows = db.exec(select(PendingEvent).order_by(PendingEvent.id)).all()
+            pending = [(row.id, row.handler, row.kind, row.data) for row in rows]
+        replayed = 0
+        for row_id, handler, kind, data in pending:
+            sub = subscriptions.get(handler)
+            if sub is None or kind not in EVENT_TYPES:
+                logger.warning("Pending event %d for unknown handler %s", row_id, handler)
+                continue
+            values = (tuple(value) if isinstance(value, list) else value for value in json.loads(data))
+            self._enqueue(sub, row_id, EVENT_TYPES[kind](*values))
+            replayed += 1
+        return replayed
+
+    async def settled(self, player: str) -> None:
+        """Wait until all events of the player published so far are handled."""
+        while self._pending.get(player):
+            waiter = self._settled.get(player)
+            if waiter is None:
+                waiter = self._settled[player] = asyncio.Event()
+            await waiter.wait()
+        if settings.cache_sync_enabled and self.running:
+            await self._settled_elsewhere(player)
+
+    async def _settled_elsewhere(self, player: str) -> None:
+        # Rows of a worker that died wait for a restart: give up after a while
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.event_settle_timeout_ms / 1000
+        while await run_in_threadpool(self._has_pending_rows, player):
+            if loop.time() > deadline:
+                logger.warning("Events of %s are still pending in other workers", player)
+                return
+            await asyncio.sleep(settings.cache_sync_interval_ms / 1000)
+
+    def _has_pending_rows(self, player: str) -> bool:
+        with self._session_factory() as db:
+            return db.exec(
+                select(PendingEvent.id).where(PendingEvent.player == player, PendingEvent.failed.is_(False))
+            ).first() is not None
+
+    async def start(self) -> None:
+        """Start delivering events from the running event loop, the pending ones first."""
+        self._loop = asyncio.get_running_loop()
+        for sub in self._subscriptions:
+            sub.queue = asyncio.Queue()
+            sub.task = asyncio.create_task(self._consume(sub))
+        replayed = await run_in_threadpool(self._replay)
+        if replayed:
+            logger.info("Replaying %d pending events", replayed)
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        """Deliver the queued events, then go back to handling them at once."""
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(sub.queue.join() for sub in self._subscriptions)), timeout
+            )
+        except asyncio.TimeoutError:
+            logger.warning("Event bus stopped with undelivered events")
+        for sub in self._subscriptions:
+            sub.task.cancel()
+        await asyncio.gather(*(sub.task for sub in self._subscriptions), return_exceptions=True)
+        self._loop = None
+
+    async def _consume(self, sub: Subscription) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await sub.queue.get()]
+            deadline = loop.time() + settings.event_batch_delay_ms / 1000
+            while len(batch) < settings.event_batch_size:
+                if sub.queue.empty():
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(sub.queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    batch.append(sub.queue.get_nowait())
+            try:
+                await run_in_threadpool(self._deliver, sub.handler, batch)
+            finally:
+                for _, event in batch:
+                    self._done(event.player)
+                    sub.queue.task_done()
+
+    def _deliver(self, handler: Handler, batch: list[tuple[int, NamedTuple]]) -> None:
+        self.batches += 1
+        self.max_batch = max(self.max_batch, len(batch))
+        try:
+            with self._session_factory() as db:
+                # Handled with the handler's writes, or not at all
+                claimed = set(db.execute(
+                    delete(PendingEvent)
+                    .where(PendingEvent.id.in_([row_id for row_id, _ in batch]))
+                    .returning(PendingEvent.id)
+                ).scalars())
+                events = [event for row_id, event in batch if row_id in claimed]
+                if events:
+                    handler(db, events)
+                db.commit()
+            return
+        except Exception:  # pylint: disable=broad-exception-caught
+            if len(batch) == 1:
+                self.failed += 1
+                logger.exception("Event handler %s failed", handler.__name__)
+                self._mark_failed(batch[0][0])
+                return
+        for item in batch:
+            self._deliver(handler, [item])
+
+    def _mark_failed(self, row_id: int) -> None:
+        # Kept for the next start, but no longer holds up the player
+        try:
+            with self._session_factory() as db:
+                db.execute(update(PendingEvent).where(PendingEvent.id == row_id).values(failed=True))
+                db.commit()
+        except Exception:  # pylint: disable=broad-exception-caught
+            logger.exception("Could not mark event %d as failed", row_id)
+
+    def _done(self, player: str) -> None:
+        with self._lock:
+            left = self._pending.get(player, 1) - 1
+            if left:
+                self._pending[player] = left
+            else:
+                del self._pending[player]
+        if not left:
+            waiter = self._settled.pop(player, None)
+            if waiter is not None:
+                waiter.set()
+
+    def metrics(self) -> dict:
+        """Published events by type and delivery statistics."""
+        return {
+            "running": self.running,
+            "published": dict(self.published),
+            "queued": sum(sub.queue.qsize() for sub in self._subscriptions if sub.queue),
+            "batches": self.batches,
+            "max_batch": self.max_batch,
+            "failed": self.failed,
+        }
+
+
+bus = EventBus(lambda: Session(engine))
+
+
+@sa_event.listens_for(Session, "after_commit")
+def _enqueue_published(db: Session) -> None:
+    for event_bus, sub, row_id, event in db.info.pop("published_events", ()):
+        event_bus._enqueue(sub, row_id, event)  # pylint: disable=protected-access
+
+
+@sa_event.listens_for(Session, "after_rollback")
+def _drop_published(db: Session) -> None:
+    db.info.pop("published_events", None)
+
+
+async def events_settled(token: Annotated[str, Depends(oauth2_scheme)]):
+    """Wait for the player's pending events before reading their state."""
+    player = token_subject(token)
+    if player is not None:
+        await bus.settled(player)
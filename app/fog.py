@@ -0,0 +1,76 @@
+"""Fog of war: the tiles each player has explored, kept as a bitset."""
+from sqlmodel import Session, delete
+
+from app.config import settings
+from app.engine import EXIT, TILE_TYPES, GameWorld, MobState
+from app.models import ExploredMap, User
+
+
+def explore(db: Session, user: User, world: GameWorld) -> list[tuple[int, int]]:
+    """Reveal what the player sees now, return the newly explored cells.
+
+    Updates the stored bitset; the caller commits.
+    """
+    row = db.get(ExploredMap, user.id)
+    if row is None:
+        row = ExploredMap(user_id=user.id)
+    size = (world.width * world.height + 7) // 8
+    bits = bytearray(row.bits) if len(row.bits) == size else bytearray(size)
+    revealed = world.reveal(bits, settings.sight_radius)
+    if revealed or row.bits != bits:
+        row.bits = bytes(bits)
+        db.add(row)
+    return revealed
+
+
+def explored_tiles(db: Session, user: User, world: GameWorld) -> list[dict]:
+    """Explored tiles of the player's map, as served by ``/game/state``."""
+    row = db.get(ExploredMap, user.id)
+    bits = row.bits if row is not None else b""
+    width = world.width
+    tiles = []
+    for x, y, tile_type in world.tile_rows():
+        index = y * width + x
+        if index >> 3 < len(bits) and bits[index >> 3] & (1 << (index & 7)):
+            tiles.append({"x": x, "y": y, "type": tile_type})
+    return tiles
+
+
+def revealed_tiles(world: GameWorld, cells: list[tuple[int, int]]) -> list[dict]:
+    """Tiles of newly explored cells."""
+    tiles = []
+    for x, y in cells:
+        kind = world.tile_at(x, y)
+        if kind:
+            tiles.append({"x": x, "y": y, "type": TILE_TYPES[kind]})
+        if kind != EXIT and world.is_exit(x, y):
+            tiles.append({"x": x, "y": y, "type": "exit"})
+    return tiles
+
+
+def changed_tiles(db: Session, user_id: int, world: GameWorld, cells: list[tuple[int, int]]) -> list[dict]:
+    """Tiles of changed cells the player knows: explored ones, all without fog.
+
+    Explored cells are not looked at again by ``explore``, so a change
+    there reaches the client only this way.
+    """
+    if settings.fog_of_war:
+        row = db.get(ExploredMap, user_id)
+        bits = row.bits if row is not None else b""
+        known = []
+        for x, y in cells:
+            index = y * world.width + x
+            if index >> 3 < len(bits) and bits[index >> 3] & (1 << (index & 7)):
+                known.append((x, y))
+        cells = known
+    return revealed_tiles(world, cells)
+
+
+def visible_mobs(world: GameWorld, mobs: list[MobState]) -> list[MobState]:
+    """Mobs the player can see right now."""
+    return [mob for mob in mobs if world.in_sight(mob.x, mob.y, settings.sight_radius)]
+
+
+def forget(db: Session, user_id: int) -> None:
+    """Drop the player's explored tiles, e.g. for a new map."""
+    db.execute(delete(ExploredMap).where(ExploredMap.user_id == user_id))
@@ -0,0 +1,299 @@
+"""Replay of game command responses for requests retried with an Idempotency-Key.
+
+A worker keeps the keys in memory. Workers sharing the database
+(``cache_sync_enabled``) keep them in the ``idempotencykey`` table instead,
+so a retry that reaches another worker is replayed as well.
+"""
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import Engine, delete, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.auth import token_subject
+from app.config import settings
+from app.database import engine as app_engine
+from app.models import IdempotencyKey
+
+MAX_KEY_LENGTH = 255
+# Answers that depend on the moment, not on the command: run again on retry
+NOT_STORED = {401, 409, 429}
+
+
+class StoredResponse:
+    """Response of a command, or the command still running under a key."""
+    __slots__ = ("fingerprint", "expires", "done", "status", "headers", "body")
+
+    def __init__(self, fingerprint: str, expires: float):
+        self.fingerprint = fingerprint
+        self.expires = expires
+        self.done = asyncio.Event()
+        self.status: int | None = None
+        self.headers: list[tuple[bytes, bytes]] = []
+        self.body = b""
+
+
+class IdempotencyCache:
+    """Stored responses by user and key.
+
+    Each user keeps at most ``idempotency_max_keys_per_user`` keys for
+    ``idempotency_ttl_seconds``; users are evicted least recently used
+    beyond ``idempotency_max_users``. Only used from the event loop.
+    """
+
+    def __init__(self):
+        self._users: OrderedDict[str, OrderedDict[str, StoredResponse]] = OrderedDict()
+
+    def clear(self) -> None:
+        """Forget all stored responses."""
+        self._users.clear()
+
+    def __len__(self) -> int:
+        return sum(len(keys) for keys in self._users.values())
+
+    def _keys_of(self, username: str) -> OrderedDict[str, StoredResponse] | None:
+        keys = self._users.get(username)
+        if keys is None:
+            return None
+        self._users.move_to_end(username)
+        # Keys are added in time order and share the TTL: expired ones come first
+        now = time.monotonic()
+        while keys and next(iter(keys.values())).expires <= now:
+            keys.popitem(last=False)
+        return keys
+
+    def get(self, username: str, key: str) -> StoredResponse | None:
+        """Response or running command stored under a key."""
+        keys = self._keys_of(username)
+        return keys.get(key) if keys else None
+
+    def start(self, username: str, key: str, fingerprint: str) -> StoredResponse:
+        """Register a command that starts running under a key."""
+        keys = self._keys_of(username)
+        if keys is None:
+            keys = self._users[username] = OrderedDict()
+            while len(self._users) > settings.idempotency_max_users:
+                self._users.popitem(last=False)
+        entry = keys[key] = StoredResponse(
+            fingerprint, time.monotonic() + settings.idempotency_ttl_seconds
+        )
+        while len(keys) > settings.idempotency_max_keys_per_user:
+            keys.popitem(last=False)
+        return entry
+
+    def discard(self, username: str, key: str, entry: StoredResponse) -> None:
+        """Drop a command that left no response worth replaying."""
+        keys = self._users.get(username)
+        if keys is not None and keys.get(key) is entry:
+            del keys[key]
+
+
+idempotency_cache = IdempotencyCache()
+
+
+class SharedKeys:
+    """Stored responses in the database, seen by all workers.
+
+    A key is claimed by inserting its row; a running command holds it for
+    ``idempotency_lease_seconds``, so the key of a worker that died is
+    claimed again once that runs out.
+    """
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+
+    def claim(self, username: str, key: str, fingerprint: str) -> StoredResponse | None:
+        """Claim a key for a command, or return what is stored under it."""
+        now = time.time()
+        with Session(self.engine) as db:
+            db.execute(delete(IdempotencyKey).where(
+                IdempotencyKey.username == username, IdempotencyKey.expires <= now
+            ))
+            db.add(IdempotencyKey(
+                username=username, key=key, fingerprint=fingerprint,
+                expires=now + settings.idempotency_lease_seconds
+            ))
+            try:
+                db.commit()
+            except IntegrityError:
+                db.rollback()
+                row = db.get(IdempotencyKey, (username, key))
+                if row is None:
+                    return self.claim(username, key, fingerprint)
+                stored = StoredResponse(row.fingerprint, row.expires)
+                stored.status = row.status
+                stored.headers = [(name.encode("latin-1"), value.encode("latin-1"))
+                                  for name, value in json.loads(row.headers)]
+                stored.body = row.body
+                return stored
+            # Oldest keys of the player beyond the limit
+            stale = db.execute(
+                select(IdempotencyKey.key)
+                .where(IdempotencyKey.username == username)
+                .order_by(IdempotencyKey.expires.desc())
+                .offset(settings.idempotency_max_keys_per_user)
+            ).scalars().all()
+            if stale:
+                db.execute(delete(IdempotencyKey).where(
+                    IdempotencyKey.username == username, IdempotencyKey.key.in_(stale)
+                ))
+                db.commit()
+            return None
+
+    def finish(self, username: str, key: str, entry: StoredResponse | None) -> None:
+        """Store the response of a claimed key, or release it if there is none to replay."""
+        with Session(self.engine) as db:
+            where = (IdempotencyKey.username == username, IdempotencyKey.key == key)
+            if entry is None:
+                db.execute(delete(IdempotencyKey).where(*where))
+            else:
+                db.execute(update(IdempotencyKey).where(*where).values(
+                    status=entry.status,
+                    headers=json.dumps([
+                        [name.decode("latin-1"), value.decode("latin-1")] for name, value in entry.headers
+                    ]),
+                    body=entry.body,
+                    expires=time.time() + settings.idempotency_ttl_seconds
+                ))
+            db.commit()
+
+
+shared_keys = SharedKeys(app_engine)
+
+
+async def _read_body(receive: Receive) -> bytes:
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body", False):
+            return body
+
+
+class IdempotencyMiddleware:
+    """Run a game command once per ``Idempotency-Key`` and replay its response.
+
+    Applies to ``settings.idempotent_routes``. A retry with the same key and
+    request gets the stored response without reaching the routes or the
+    database; a retry that arrives while the first request still runs waits
+    for it. Reusing a key for a different request is rejected with 422.
+    With ``cache_sync_enabled`` the keys are kept in ``shared_keys``.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] not in settings.idempotent_routes:
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        key = headers.get("idempotency-key")
+        scheme, _, token = headers.get("authorization", "").partition(" ")
+        username = token_subject(token) if scheme.lower() == "bearer" else None
+        if key is None or username is None:
+            await self.app(scope, receive, send)
+            return
+        if not key or len(key) > MAX_KEY_LENGTH:
+            await JSONResponse({"detail": "Invalid Idempotency-Key"}, 400)(scope, receive, send)
+            return
+
+        body = await _read_body(receive)
+        fingerprint = hashlib.sha256(
+            f"{scope['method']} {scope['path']}\n".encode() + body
+        ).hexdigest()
+        if settings.cache_sync_enabled:
+            await self._shared(scope, receive, send, body, username, key, fingerprint)
+            return
+
+        while (entry := idempotency_cache.get(username, key)) is not None:
+            if entry.fingerprint != fingerprint:
+                await JSONResponse(
+                    {"detail": "Idempotency-Key was used for a different request"}, 422
+                )(scope, receive, send)
+                return
+            if entry.status is None:
+                await entry.done.wait()
+                continue
+            await self._replay(entry, send)
+            return
+
+        entry = idempotency_cache.start(username, key, fingerprint)
+        try:
+            await self._run(scope, receive, send, body, entry)
+        finally:
+            if entry.status is None or entry.status >= 500 or entry.status in NOT_STORED:
+                entry.status = None
+                idempotency_cache.discard(username, key, entry)
+            entry.done.set()
+
+    async def _shared(
+        self, scope: Scope, receive: Receive, send: Send, body: bytes,
+        username: str, key: str, fingerprint: str
+    ) -> None:  # pylint: disable=too-many-arguments
+        while (stored := await run_in_threadpool(shared_keys.claim, username, key, fingerprint)) is not None:
+            if stored.fingerprint != fingerprint:
+                await JSONResponse(
+                    {"detail": "Idempotency-Key was used for a different request"}, 422
+                )(scope, receive, send)
+                return
+            if stored.status is None:
+                # Running in this or another worker
+                await asyncio.sleep(settings.cache_sync_interval_ms / 1000)
+                continue
+            await self._replay(stored, send)
+            return
+
+        entry = StoredResponse(fingerprint, 0.0)
+        try:
+            await self._run(scope, receive, send, body, entry)
+        finally:
+            if entry.status is None or entry.status >= 500 or entry.status in NOT_STORED:
+                entry = None
+            await run_in_threadpool(shared_keys.finish, username, key, entry)
+
+    async def _run(
+        self, scope: Scope, receive: Receive, send: Send, body: bytes, entry: StoredResponse
+    ) -> None:
+        body_sent = False
+        status = None
+        chunks = []
+
+        async def replay_receive() -> Message:
+            nonlocal body_sent
+            if body_sent:
+                return await receive()
+            body_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def capture_send(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                entry.headers = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+                if not message.get("more_body", False):
+                    entry.body = b"".join(chunks)
+                    entry.status = status
+            await send(message)
+
+        await self.app(scope, replay_receive, capture_send)
+
+    @staticmethod
+    async def _replay(entry: StoredResponse, send: Send) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": entry.status,
+            "headers": entry.headers + [(b"idempotent-replayed", b"true")],
+        })
+        await send({"type": "http.response.body", "body": entry.body})
@@ -0,0 +1,362 @@
+"""Append-only player action log with periodic world snapshots.
+
+Every player action is stored as one compact event holding its outcome
+(positions, damage, dropped loot, destroyed walls), so replaying the log
+never re-rolls any randomness. A full world snapshot is written after each
+map generation and every ``snapshot_interval`` events; the world is the
+latest snapshot plus the events that follow, older events are deleted.
+
+With the log enabled it is the write path for the fields every move
+changes: player position, health and ``is_active``, mob positions and
+health. An action appends one event and leaves these columns alone; they
+are written at the next snapshot. Until then the loaded ``User`` and
+``Mob`` rows get the values of the log tail, so the rest of the app reads
+them as usual.
+
+Code that assigns these fields on loaded objects without ``record`` still
+works: the flush logs the new values as a ``set`` event, otherwise the tail
+would hide them at the next load. Bulk ``UPDATE`` statements bypass the
+session and are hidden by the tail; while the log is enabled they must be
+followed by ``take_snapshot``.
+"""
+import json
+from typing import Iterator
+
+from sqlalchemy import Connection, event, inspect, update
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
+from sqlmodel import Session, select, delete
+
+from app.config import settings
+from app.models import ActionEvent, WorldSnapshot, User, MapTile, Mob, InventoryItem
+from app.response_cache import invalidate
+
+PLAYER_FIELDS = (
+    "x", "y", "health", "base_attack", "bonus_attack", "bonus_health",
+    "killed_mobs", "upgrade_level", "is_active"
+)
+STAT_FIELDS = ("killed_mobs", "upgrade_level", "bonus_attack", "bonus_health", "health")
+# Written only by snapshots while the log is enabled
+LOGGED_PLAYER_FIELDS = ("x", "y", "health", "is_active")
+LOGGED_MOB_FIELDS = ("x", "y", "health")
+
+
+def _dumps(data) -> str:
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+
+def player_stats(user: User) -> list:
+    """Compact list of the player stats changed by combat."""
+    return [getattr(user, field) for field in STAT_FIELDS]
+
+
+def _empty_tail() -> dict:
+    return {"events": 0, "player": {}, "mobs": {}}
+
+
+def _add_to_tail(tail: dict, kind: str, data: dict) -> None:
+    """Track the logged fields an action changed since the latest snapshot."""
+    tail["events"] += 1
+    player, mobs = tail["player"], tail["mobs"]
+    match kind:
+        case "move":
+            player["x"], player["y"], player["health"] = data["p"]
+            player["is_active"] = player["health"] > 0
+            for mob_id, x, y in data["m"]:
+                mobs.setdefault(mob_id, {}).update(x=x, y=y)
+        case "attack":
+            if data["hp"] <= 0:
+                mobs.pop(data["mob"], None)
+            else:
+                mobs.setdefault(data["mob"], {})["health"] = data["hp"]
+            player["health"] = data["stats"][STAT_FIELDS.index("health")]
+        case "death" | "surrender":
+            player["health"] = 0
+            player["is_active"] = False
+        case "win":
+            player["is_active"] = False
+        case "reset":
+            player["x"], player["y"], player["health"] = data["p"]
+            player["is_active"] = True
+        case "set":
+            player.update(data["p"])
+            for mob_id, values in data["m"]:
+                mobs.setdefault(mob_id, {}).update(values)
+
+
+def load_tails(connection: Connection, user_ids: list[int]) -> dict[int, dict]:
+    """Logged fields changed since the latest snapshots of the players."""
+    tails = {user_id: _empty_tail() for user_id in user_ids}
+    rows = connection.execute(
+        select(ActionEvent.user_id, ActionEvent.kind, ActionEvent.data)
+        .where(ActionEvent.user_id.in_(user_ids))
+        .order_by(ActionEvent.id)
+    )
+    for user_id, kind, data in rows:
+        _add_to_tail(tails[user_id], kind, json.loads(data))
+    return tails
+
+
+def _tail(db: Session, user_id: int) -> dict:
+    # Read once per session, then kept up to date by record()
+    tails = db.info.setdefault("journal_tails", {})
+    if user_id not in tails:
+        tails.update(load_tails(db.connection(), [user_id]))
+    return tails[user_id]
+
+
+def _set_logged(obj, fields: tuple[str, ...], values: dict) -> None:
+    # Committed values are not flushed: the log already holds them
+    for field in fields:
+        if field in values:
+            set_committed_value(obj, field, values[field])
+        elif field in obj.__dict__:
+            set_committed_value(obj, field, obj.__dict__[field])
+
+
+@event.listens_for(User, "load")
+def _user_loaded(user: User, context) -> None:
+    if settings.action_log_enabled:
+        tail = _tail(context.session, inspect(user).identity[0])
+        _set_logged(user, LOGGED_PLAYER_FIELDS, tail["player"])
+
+
+@event.listens_for(User, "refresh")
+def _user_refreshed(user: User, context, _attrs) -> None:
+    # No context when an UPDATE statement sets the values in the session
+    if context is not None:
+        _user_loaded(user, context)
+
+
+@event.listens_for(Mob, "load")
+def _mob_loaded(mob: Mob, context) -> None:
+    user_id = mob.__dict__.get("user_id")
+    if settings.action_log_enabled and user_id is not None:
+        _set_logged(mob, LOGGED_MOB_FIELDS, _tail(context.session, user_id)["mobs"].get(mob.id, {}))
+
+
+@event.listens_for(Mob, "refresh")
+def _mob_refreshed(mob: Mob, context, _attrs) -> None:
+    if context is not None:
+        _mob_loaded(mob, context)
+
+
+@event.listens_for(Session, "before_flush")
+def _log_direct_writes(db: Session, _context, _instances) -> None:
+    # Logged fields assigned without record(), which marks its own as committed
+    if not settings.action_log_enabled:
+        return
+    changes: dict[int, dict] = {}
+    for obj in db.dirty:
+        if isinstance(obj, User):
+            fields, user_id = LOGGED_PLAYER_FIELDS, obj.id
+        elif isinstance(obj, Mob):
+            fields, user_id = LOGGED_MOB_FIELDS, obj.user_id
+        else:
+            continue
+        attrs = inspect(obj).attrs
+        values = {field: getattr(obj, field) for field in fields if attrs[field].history.has_changes()}
+        if not values:
+            continue
+        data = changes.setdefault(user_id, {"p": {}, "m": []})
+        if isinstance(obj, User):
+            data["p"].update(values)
+        else:
+            data["m"].append([obj.id, values])
+    for user_id, data in changes.items():
+        db.add(ActionEvent(user_id=user_id, kind="set", data=_dumps(data)))
+        _add_to_tail(_tail(db, user_id), "set", data)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_tails(db: Session) -> None:
+    db.info.pop("journal_tails", None)
+
+
+def record(db: Session, user: User, kind: str, **data) -> None:
+    """Append an action to the player's log (committed with the action).
+
+    The logged fields the action changed are not written to the user and
+    mob rows; a snapshot follows every ``snapshot_interval`` events.
+    """
+    if not settings.action_log_enabled:
+        return
+    tail = _tail(db, user.id)
+    db.add(ActionEvent(user_id=user.id, kind=kind, data=_dumps(data)))
+    _add_to_tail(tail, kind, data)
+    _set_logged(user, LOGGED_PLAYER_FIELDS, {})
+    for mob_id in tail["mobs"]:
+        mob = db.identity_map.get(identity_key(Mob, mob_id))
+        if mob is not None:
+            _set_logged(mob, LOGGED_MOB_FIELDS, {})
+    if tail["events"] >= settings.snapshot_interval:
+        db.flush()
+        take_snapshot(db, user)
+
+
+def take_snapshot(db: Session, user: User) -> None:
+    """Store the player's current world as a snapshot.
+
+    Writes the logged fields to the user and mob rows and deletes the
+    events and snapshots the new one replaces.
+    """
+    if not settings.action_log_enabled:
+        return
+    tail = _tail(db, user.id)
+    state = capture_world(db, user)
+    last_event = db.exec(
+        select(ActionEvent.id)
+        .where(ActionEvent.user_id == user.id)
+        .order_by(ActionEvent.id.desc())
+    ).first() or 0
+
+    db.execute(
+        update(User)
+        .where(User.id == user.id)
+        .values({field: state["player"][field] for field in LOGGED_PLAYER_FIELDS})
+    )
+    mobs = [
+        dict(zip(("id", *LOGGED_MOB_FIELDS), (int(mob_id), *values)))
+        for mob_id, values in state["mobs"].items()
+        if int(mob_id) in tail["mobs"]
+    ]
+    if mobs:
+        db.execute(update(Mob), mobs)
+    db.execute(delete(ActionEvent).where(
+        ActionEvent.user_id == user.id, ActionEvent.id <= last_event
+    ))
+    db.execute(delete(WorldSnapshot).where(WorldSnapshot.user_id == user.id))
+    db.add(WorldSnapshot(user_id=user.id, event_id=last_event, state=_dumps(state)))
+    tail.update(_empty_tail())
+
+
+def capture_world(db: Session, user: User) -> dict:
+    """Read the player's world from the state tables."""
+    return {
+        "player": {field: getattr(user, field) for field in PLAYER_FIELDS},
+        "tiles": [[t.x, t.y, t.tile_type] for t in db.exec(
+            select(MapTile).where(MapTile.user_id == user.id).order_by(MapTile.id)
+        ).all()],
+        "mobs": {str(m.id): [m.x, m.y, m.health] for m in db.exec(
+            select(Mob).where(Mob.user_id == user.id)
+        ).all()},
+        "items": {str(i.id): [i.name, i.quantity, i.mob_id] for i in db.exec(
+            select(InventoryItem).where(InventoryItem.owner_id == user.id)
+        ).all()},
+    }
+
+
+def apply_event(state: dict, kind: str, data: dict) -> None:
+    """Apply one logged action to a world state in place."""
+    player, mobs, items = state["player"], state["mobs"], state["items"]
+    match kind:
+        case "move":
+            player["x"], player["y"], player["health"] = data["p"]
+            player["is_active"] = player["health"] > 0
+            for mob_id, x, y in data["m"]:
+                mobs[str(mob_id)][:2] = [x, y]
+        case "attack":
+            mob_id = str(data["mob"])
+            if data["hp"] <= 0:
+                mobs.pop(mob_id, None)
+            else:
+                mobs[mob_id][2] = data["hp"]
+            player.update(zip(STAT_FIELDS, data["stats"]))
+            # Older logs stored the loot with the attack
+            for item_id, name, quantity, loot_mob_id in data.get("loot", ()):
+                items[str(item_id)] = [name, quantity, loot_mob_id]
+        case "loot":
+            for item_id, name, quantity, loot_mob_id in data["items"]:
+                items[str(item_id)] = [name, quantity, loot_mob_id]
+        case "wallbreaker":
+            destroyed = {tuple(xy) for xy in data["tiles"]}
+            for tile in state["tiles"]:
+                if (tile[0], tile[1]) in destroyed and tile[2] == "wall":
+                    tile[2] = "floor"
+            item_id, quantity = data["item"]
+            if quantity:
+                items[str(item_id)][1] = quantity
+            else:
+                items.pop(str(item_id), None)
+        case "death" | "surrender":
+            player["health"] = 0
+            player["is_active"] = False
+            items.clear()
+        case "win":
+            player["is_active"] = False
+        case "reset":
+            player["x"], player["y"], player["health"] = data["p"]
+            player["is_active"] = True
+        case "set":
+            player.update(data["p"])
+            for mob_id, values in data["m"]:
+                mob = mobs.get(str(mob_id))
+                if mob is not None:
+                    for field, value in values.items():
+                        mob[LOGGED_MOB_FIELDS.index(field)] = value
+
+
+def replay(db: Session, user_id: int, until: int | None = None) -> Iterator[tuple]:
+    """Yield ``(event, state)`` for each action after the latest snapshot.
+
+    ``until`` limits the replay to events with ``id <= until``; the first
+    item is ``(None, state)`` with the snapshot itself.
+    """
+    snapshot = db.exec(
+        select(WorldSnapshot)
+        .where(WorldSnapshot.user_id == user_id)
+        .order_by(WorldSnapshot.id.desc())
+    ).first()
+    if snapshot is None:
+        return
+    state = json.loads(snapshot.state)
+    yield None, state
+
+    # Older events were deleted with the snapshot, SQLite may reuse their ids
+    query = select(ActionEvent).where(ActionEvent.user_id == user_id)
+    if until is not None:
+        query = query.where(ActionEvent.id <= until)
+    for event in db.exec(query.order_by(ActionEvent.id)):
+        apply_event(state, event.kind, json.loads(event.data))
+        yield event, state
+
+
+def rebuild_world(db: Session, user_id: int, until: int | None = None) -> dict | None:
+    """Return the player's world rebuilt from snapshot and log tail."""
+    state = None
+    for _, state in replay(db, user_id, until):
+        pass
+    return state
+
+
+def restore_world(db: Session, user: User, state: dict) -> None:
+    """Overwrite the player's state tables with a rebuilt world and snapshot it."""
+    # The new rows may get the ids of deleted ones still in the session
+    fetch = {"synchronize_session": "fetch"}
+    db.execute(delete(InventoryItem).where(InventoryItem.owner_id == user.id).execution_options(**fetch))
+    db.execute(delete(MapTile).where(MapTile.user_id == user.id).execution_options(**fetch))
+    db.execute(delete(Mob).where(Mob.user_id == user.id).execution_options(**fetch))
+    for field, value in state["player"].items():
+        setattr(user, field, value)
+    db.add(user)
+    for x, y, tile_type in state["tiles"]:
+        db.add(MapTile(x=x, y=y, tile_type=tile_type, user_id=user.id))
+    for mob_id, (x, y, health) in state["mobs"].items():
+        db.add(Mob(id=int(mob_id), x=x, y=y, health=health, user_id=user.id))
+    for item_id, (name, quantity, mob_id) in state["items"].items():
+        db.add(InventoryItem(
+            id=int(item_id), name=name, quantity=quantity, owner_id=user.id, mob_id=mob_id
+        ))
+    db.flush()
+    take_snapshot(db, user)
+    invalidate(db, user.id)
+    db.commit()
+
+
+def forget(db: Session, *user_ids: int) -> None:
+    """Delete the logs and snapshots of the players."""
+    db.execute(delete(ActionEvent).where(ActionEvent.user_id.in_(user_ids)))
+    db.execute(delete(WorldSnapshot).where(WorldSnapshot.user_id.in_(user_ids)))
+    tails = db.info.get("journal_tails", {})
+    for user_id in user_ids:
+        tails.pop(user_id, None)
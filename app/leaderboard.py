@@ -0,0 +1,185 @@
+"""In-memory player ranking with logarithmic top-K and rank queries."""
+from threading import Lock
+
+from sqlmodel import Session, select
+
+from app.models import User
+
+
+class Leaderboard:
+    """Players ranked by killed mobs.
+
+    Scores are counted in a Fenwick tree indexed by score, so "my rank" and
+    finding the next occupied score are O(log S). Players with equal scores
+    keep the order in which they reached it.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._load_lock = Lock()
+        # Updates made while the rows are being read, None when not loading
+        self._changes: list[tuple[int, str | None, int | None]] | None = None
+        self.loaded = False
+        self._scores: dict[int, int] = {}
+        self._names: dict[int, str] = {}
+        self._buckets: dict[int, dict[int, None]] = {}
+        self._tree = [0] * 64
+
+    def clear(self) -> None:
+        """Drop all entries; the board is reloaded on next use."""
+        with self._lock:
+            self.loaded = False
+            self._changes = None
+            self._scores.clear()
+            self._names.clear()
+            self._buckets.clear()
+            self._tree = [0] * 64
+
+    def ensure_loaded(self, db: Session) -> None:
+        """Build the board from the database once per process.
+
+        The rows are read and ranked without holding the board lock, so
+        updates (and the event bus behind them) are not held up by a cold
+        load. Updates made meanwhile are recorded and applied over the rows
+        before the new board is swapped in.
+        """
+        if self.loaded:
+            return
+        with self._load_lock:
+            if self.loaded:
+                return
+            with self._lock:
+                self._changes = []
+            board = Leaderboard()
+            rows = db.exec(select(User.id, User.username, User.killed_mobs)).all()
+            for user_id, username, score in rows:
+                board._set(user_id, username, score)  # pylint: disable=protected-access
+            with self._lock:
+                if self._changes is None:
+                    return  # Cleared during the load
+                for user_id, username, score in self._changes:
+                    if score is None:
+                        board.remove(user_id)
+                    else:
+                        board._set(user_id, username, score)  # pylint: disable=protected-access
+                self._changes = None
+                self._scores, self._names = board._scores, board._names  # pylint: disable=protected-access
+                self._buckets, self._tree = board._buckets, board._tree  # pylint: disable=protected-access
+                self.loaded = True
+
+    def update(self, user: User) -> None:
+        """Record the current score of a player."""
+        with self._lock:
+            if self.loaded:
+                self._set(user.id, user.username, user.killed_mobs)
+            elif self._changes is not None:
+                self._changes.append((user.id, user.username, user.killed_mobs))
+
+    def refresh(self, db: Session, user_ids: list[int]) -> None:
+        """Re-read the scores of players changed by another process."""
+        if not self.loaded:
+            return
+        rows = db.exec(
+            select(User.id, User.username, User.killed_mobs).where(User.id.in_(user_ids))
+        ).all()
+        with self._lock:
+            for user_id, username, score in rows:
+                self._set(user_id, username, score)
+        for user_id in set(user_ids) - {row[0] for row in rows}:
+            self.remove(user_id)
+
+    def remove(self, user_id: int) -> None:
+        """Remove a player from the board."""
+        with self._lock:
+            if self._changes is not None:
+                self._changes.append((user_id, None, None))
+            score = self._scores.pop(user_id, None)
+            self._names.pop(user_id, None)
+            if score is not None:
+                self._discard(user_id, score)
+
+    def rank(self, user_id: int) -> int | None:
+        """Return 1-based rank of a player, ties sharing the best rank."""
+        with self._lock:
+            score = self._scores.get(user_id)
+            if score is None:
+                return None
+            return len(self._scores) - self._prefix(score) + 1
+
+    def top(self, limit: int) -> list[dict]:
+        """Return the best ``limit`` players, best first."""
+        entries = []
+        with self._lock:
+            total = len(self._scores)
+            while len(entries) < limit and len(entries) < total:
+                # The largest score not yet listed holds element #(total - listed)
+                score = self._find(total - len(entries))
+                rank = len(entries) + 1
+                for user_id in self._buckets[score]:
+                    if len(entries) == limit:
+                        break
+                    entries.append({
+                        "rank": rank,
+                        "username": self._names[user_id],
+                        "killed_mobs": score
+                    })
+        return entries
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def _set(self, user_id: int, username: str, score: int) -> None:
+        self._names[user_id] = username
+        old_score = self._scores.get(user_id)
+        if old_score == score:
+            return
+        if old_score is not None:
+            self._discard(user_id, old_score)
+        while score + 1 >= len(self._tree):
+            self._grow()
+        self._scores[user_id] = score
+        self._buckets.setdefault(score, {})[user_id] = None
+        self._add(score, 1)
+
+    def _discard(self, user_id: int, score: int) -> None:
+        bucket = self._buckets[score]
+        del bucket[user_id]
+        if not bucket:
+            del self._buckets[score]
+        self._add(score, -1)
+
+    def _grow(self) -> None:
+        counts = [0] * len(self._tree)
+        for score, bucket in self._buckets.items():
+            counts[score] = len(bucket)
+        self._tree = [0] * (len(self._tree) * 2)
+        for score, count in enumerate(counts):
+            if count:
+                self._add(score, count)
+
+    def _add(self, score: int, delta: int) -> None:
+        index = score + 1
+        while index < len(self._tree):
+            self._tree[index] += delta
+            index += index & -index
+
+    def _prefix(self, score: int) -> int:
+        """Number of players with a score <= ``score``."""
+        index, total = score + 1, 0
+        while index > 0:
+            total += self._tree[index]
+            index -= index & -index
+        return total
+
+    def _find(self, k: int) -> int:
+        """Smallest score whose prefix count reaches ``k``."""
+        index, step = 0, len(self._tree) // 2
+        while step:
+            if index + step < len(self._tree) and self._tree[index + step] < k:
+                index += step
+                k -= self._tree[index]
+            step //= 2
+        return index
+
+
+leaderboard = Leaderboard()
@@ -1,22 +1,75 @@
 """Main FastAPI application setup."""
+import asyncio
+
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
 from fastapi.responses import RedirectResponse
 
+from app.config import settings
+from app.cache_sync import run_cache_sync
 from app.database import create_db_and_tables
-from app.routes import auth, game, inventory
+from app.events import bus
+from app.idempotency import IdempotencyMiddleware
+from app.ratelimit import RateLimitMiddleware
+from app.reaper import run_reaper
+from app.routes import auth, game, inventory, leaderboard, metrics, shared
+from app.shared_world import run_shared_eviction
+from app.static_files import PrecompressedStaticFiles
 
 app = FastAPI(title="Rogue-like Game API")
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
+app.add_middleware(RateLimitMiddleware)
+# Outermost, so that replayed retries do not use up rate limits
+app.add_middleware(IdempotencyMiddleware)
+app.mount("/static", PrecompressedStaticFiles(directory="app/static"), name="static")
 app.include_router(inventory.router)
 app.include_router(auth.router)
 app.include_router(game.router)
+app.include_router(leaderboard.router)
+app.include_router(metrics.router)
+app.include_router(shared.router)
 
 @app.on_event("startup")
 def on_startup():
     """Initialize database on startup."""
     create_db_and_tables()
 
+@app.on_event("startup")
+async def start_reaper():
+    """Start releasing worlds of inactive players in the background."""
+    if settings.reaper_enabled:
+        app.state.reaper = asyncio.create_task(run_reaper())
+
+@app.on_event("startup")
+async def start_shared_eviction():
+    """Take idle players out of the shared world in the background."""
+    if settings.shared_world_enabled:
+        app.state.shared_eviction = asyncio.create_task(run_shared_eviction())
+
+@app.on_event("startup")
+async def start_cache_sync():
+    """Keep caches coherent with the other workers."""
+    if settings.cache_sync_enabled:
+        app.state.cache_sync = asyncio.create_task(run_cache_sync())
+
+@app.on_event("shutdown")
+async def stop_cache_sync():
+    """Send the last invalidations to the other workers."""
+    task = getattr(app.state, "cache_sync", None)
+    if task is not None:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+@app.on_event("startup")
+async def start_event_bus():
+    """Move event consumers off the request path."""
+    if settings.event_bus_enabled:
+        await bus.start()
+
+@app.on_event("shutdown")
+async def stop_event_bus():
+    """Deliver the remaining events before exiting."""
+    if bus.running:
+        await bus.stop()
+
 @app.get("/")
 async def root_redirect():
     """Redirect root to static index.html."""
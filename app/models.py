@@ -18,6 +18,8 @@ class User(SQLModel, table=True, extend_existing=True):
     upgrade_level: int = 0
     is_active: bool = True
     last_action: Optional[datetime] = None
+    # Commands counter, checked at commit by workers sharing the database
+    version: int = 0
     inventory: list["InventoryItem"] = Relationship(back_populates="owner")
 
 class InventoryItem(SQLModel, table=True):
@@ -35,7 +37,7 @@ class MapTile(SQLModel, table=True):
     x: int
     y: int
     tile_type: str
-    user_id: int = Field(foreign_key="user.id")
+    user_id: int = Field(foreign_key="user.id", index=True)
 
 class Mob(SQLModel, table=True):
     """Enemy entity model."""
@@ -44,3 +46,60 @@ class Mob(SQLModel, table=True):
     y: int
     health: int = 50
     user_id: int = Field(foreign_key="user.id")
+
+class ActionEvent(SQLModel, table=True):
+    """Player action log entry."""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="user.id", index=True)
+    kind: str
+    data: str = "{}"
+
+class WorldSnapshot(SQLModel, table=True):
+    """Player world state as of an action log entry."""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="user.id", index=True)
+    event_id: int = 0
+    state: str
+
+class ExploredMap(SQLModel, table=True):
+    """Cells of the current map a player has seen, one bit per cell."""
+    user_id: int = Field(foreign_key="user.id", primary_key=True)
+    bits: bytes = b""
+
+class RefreshToken(SQLModel, table=True):
+    """Signed-in session: the current refresh token of a rotation chain."""
+    id: str = Field(primary_key=True)
+    user_id: int = Field(foreign_key="user.id", index=True)
+    token_hash: str
+    expires_at: datetime
+    revoked: bool = False
+
+class PendingEvent(SQLModel, table=True):
+    """A game event committed with its command and not yet handled by a subscriber."""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    handler: str
+    player: str = Field(index=True)
+    kind: str
+    data: str
+    failed: bool = False
+
+class IdempotencyKey(SQLModel, table=True):
+    """Response of a game command stored under its Idempotency-Key for all workers.
+
+    ``status`` is None while the command runs.
+    """
+    username: str = Field(primary_key=True)
+    key: str = Field(primary_key=True)
+    fingerprint: str
+    expires: float
+    status: Optional[int] = None
+    headers: str = "[]"
+    body: bytes = b""
+
+class CacheInvalidation(SQLModel, table=True):
+    """A user's data changed: cached copies in other workers are outdated."""
+    __table_args__ = {"sqlite_autoincrement": True}
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int
+    origin: str
+    created: float
@@ -0,0 +1,106 @@
+"""Per-user token-bucket rate limiting and global load shedding."""
+import math
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.auth import token_subject
+from app.config import settings
+
+
+class TokenBucket:
+    """Token bucket state of one user on one route."""
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+
+
+class RateLimiter:
+    """Token buckets keyed by (user, route), evicting least recently used."""
+
+    def __init__(self):
+        self._buckets: OrderedDict[tuple, TokenBucket] = OrderedDict()
+        self._lock = Lock()
+
+    def clear(self) -> None:
+        """Forget all buckets."""
+        with self._lock:
+            self._buckets.clear()
+
+    def acquire(self, key: tuple, rate: float, burst: int) -> float:
+        """Take one token; return 0 on success or seconds until the next token."""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(burst, now)
+                while len(self._buckets) > settings.rate_limit_max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket.tokens = min(burst, bucket.tokens + (now - bucket.updated) * rate)
+                bucket.updated = now
+
+            if bucket.tokens >= 1:
+                bucket.tokens -= 1
+                return 0.0
+            return (1 - bucket.tokens) / rate if rate > 0 else math.inf
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+rate_limiter = RateLimiter()
+
+
+def _reject(status_code: int, detail: str, retry_after: float) -> JSONResponse:
+    retry_after = 3600 if math.isinf(retry_after) else max(1, math.ceil(retry_after))
+    return JSONResponse(
+        {"detail": detail},
+        status_code=status_code,
+        headers={"Retry-After": str(retry_after)}
+    )
+
+
+class RateLimitMiddleware:
+    """Reject over-limit requests before they reach the routes.
+
+    Routes listed in ``settings.rate_limits`` get a ``(rate, burst)`` token
+    bucket per user (429 when empty); all API requests share a cap of
+    ``settings.max_concurrent_requests`` in-flight requests (503 above it).
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.in_flight = 0
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"].startswith("/static/"):
+            await self.app(scope, receive, send)
+            return
+
+        limit = settings.rate_limits.get(scope["path"])
+        if limit is not None:
+            scheme, _, token = Headers(scope=scope).get("authorization", "").partition(" ")
+            username = token_subject(token) if scheme.lower() == "bearer" else None
+            if username is not None:
+                retry_after = rate_limiter.acquire((username, scope["path"]), *limit)
+                if retry_after:
+                    await _reject(429, "Too many requests", retry_after)(scope, receive, send)
+                    return
+
+        if self.in_flight >= settings.max_concurrent_requests:
+            await _reject(503, "Server is busy", 1)(scope, receive, send)
+            return
+
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
@@ -0,0 +1,82 @@
+"""Background release of worlds abandoned by inactive players."""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import exists, or_, text
+from sqlmodel import Session, select, delete
+
+from app import journal
+from app.config import settings
+from app.database import engine
+from app.models import User, MapTile, Mob, InventoryItem, ExploredMap
+from app.response_cache import invalidate
+
+logger = logging.getLogger(__name__)
+
+
+def reap_idle_worlds(db: Session, now: datetime | None = None) -> int:
+    """Delete worlds of players idle longer than ``reaper_idle_days``.
+
+    Works in batches of ``reaper_batch_size`` players, committing after
+    each, and stops starting new batches once ``reaper_time_budget_ms`` is
+    spent. Returns the number of released worlds. The map of a released
+    player is generated again by ``/game/state`` when they return. Players
+    without ``last_action`` have not been seen since it was introduced and
+    count as idle.
+    """
+    cutoff = (now or datetime.now()) - timedelta(days=settings.reaper_idle_days)
+    deadline = time.perf_counter() + settings.reaper_time_budget_ms / 1000
+    reaped = 0
+    last_id = 0
+
+    while time.perf_counter() < deadline:
+        user_ids = db.exec(
+            select(User.id)
+            .where(
+                User.id > last_id,
+                or_(User.last_action.is_(None), User.last_action < cutoff),
+                exists().where(MapTile.user_id == User.id)
+            )
+            .order_by(User.id)
+            .limit(settings.reaper_batch_size)
+        ).all()
+        if not user_ids:
+            break
+
+        db.execute(delete(InventoryItem).where(InventoryItem.owner_id.in_(user_ids)))
+        db.execute(delete(MapTile).where(MapTile.user_id.in_(user_ids)))
+        db.execute(delete(Mob).where(Mob.user_id.in_(user_ids)))
+        db.execute(delete(ExploredMap).where(ExploredMap.user_id.in_(user_ids)))
+        journal.forget(db, *user_ids)
+        for user_id in user_ids:
+            invalidate(db, user_id)
+        db.commit()
+
+        reaped += len(user_ids)
+        last_id = user_ids[-1]
+
+    if reaped:
+        db.execute(text(f"PRAGMA incremental_vacuum({settings.reaper_vacuum_pages})"))
+        db.commit()
+    return reaped
+
+
+def _reap_once() -> int:
+    with Session(engine) as db:
+        return reap_idle_worlds(db)
+
+
+async def run_reaper() -> None:
+    """Release idle worlds every ``reaper_interval_seconds``."""
+    while True:
+        await asyncio.sleep(settings.reaper_interval_seconds)
+        try:
+            reaped = await run_in_threadpool(_reap_once)
+        except Exception:  # pylint: disable=broad-exception-caught
+            logger.exception("World reaper failed")
+            continue
+        if reaped:
+            logger.info("Released %d idle worlds", reaped)
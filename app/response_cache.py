@@ -0,0 +1,135 @@
+"""Per-user response caching with version counters and ETags."""
+import hashlib
+import json
+import secrets
+from collections import OrderedDict
+from threading import Lock
+from typing import Callable
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import event
+from sqlmodel import Session
+
+from app.config import settings
+
+
+class ResponseCache:
+    """JSON bodies of per-user endpoints, valid until the user's data changes.
+
+    Every change bumps the user's version to the next value of a global
+    clock, so a version that was evicted and re-created can never match a
+    body built from different data. Versions are local to the process; the
+    nonce marks its rows in the shared invalidation table.
+
+    While ``outbox`` is a set, bumped user ids are also collected there for
+    the other workers (see ``app.cache_sync``).
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._clock = 0
+        self._versions: OrderedDict[int, int] = OrderedDict()
+        self._bodies: OrderedDict[tuple, tuple[int, bytes]] = OrderedDict()
+        self.nonce = secrets.token_hex(4)
+        self.outbox: set[int] | None = None
+
+    def clear(self) -> None:
+        """Drop all versions and bodies."""
+        with self._lock:
+            # Versions start again from the clock, past ETags must not match
+            self._clock += 1
+            self._versions.clear()
+            self._bodies.clear()
+
+    def bump(self, user_id: int, share: bool = True) -> None:
+        """Mark the user's cached responses as outdated."""
+        with self._lock:
+            if share and self.outbox is not None:
+                self.outbox.add(user_id)
+            self._clock += 1
+            self._versions[user_id] = self._clock
+            self._versions.move_to_end(user_id)
+            while len(self._versions) > settings.response_cache_max_users:
+                self._versions.popitem(last=False)
+
+    def take_outbox(self) -> set[int]:
+        """User ids bumped since the last call."""
+        with self._lock:
+            outbox, self.outbox = self.outbox or set(), set()
+            return outbox
+
+    def version(self, user_id: int) -> int:
+        """Current version of the user's data."""
+        with self._lock:
+            version = self._versions.get(user_id)
+            if version is None:
+                version = self._versions[user_id] = self._clock
+                while len(self._versions) > settings.response_cache_max_users:
+                    self._versions.popitem(last=False)
+            return version
+
+    def get(self, user_id: int, name: str, version: int) -> bytes | None:
+        """Cached body of an endpoint, if it is still current."""
+        with self._lock:
+            entry = self._bodies.get((user_id, name))
+            if entry is None or entry[0] != version:
+                return None
+            self._bodies.move_to_end((user_id, name))
+            return entry[1]
+
+    def put(self, user_id: int, name: str, version: int, body: bytes) -> None:
+        """Store the body of an endpoint for a version."""
+        with self._lock:
+            self._bodies[(user_id, name)] = (version, body)
+            self._bodies.move_to_end((user_id, name))
+            while len(self._bodies) > settings.response_cache_max_entries:
+                self._bodies.popitem(last=False)
+
+
+response_cache = ResponseCache()
+
+
+def invalidate(db: Session, user_id: int) -> None:
+    """Outdate the user's cached responses before ``db`` commits their changes.
+
+    The version is bumped now, so no cached body of the old data is served
+    while the commit is under way, and again after the commit, so bodies
+    built from the old data in between are not served either.
+    """
+    response_cache.bump(user_id)
+    db.info.setdefault("invalidated_users", set()).add(user_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_committed(db: Session) -> None:
+    for user_id in db.info.pop("invalidated_users", ()):
+        response_cache.bump(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_invalidated(db: Session) -> None:
+    db.info.pop("invalidated_users", None)
+
+
+def cached_json(request: Request, user_id: int, name: str, build: Callable[[], dict]) -> Response:
+    """Answer with 304, a cached body or a freshly built one, with an ETag.
+
+    The ETag is a digest of the body, which is built from the shared
+    database, so every worker and a restarted server issue the same one
+    for the same data.
+    """
+    version = response_cache.version(user_id)
+    body = response_cache.get(user_id, name, version)
+    if body is None:
+        body = json.dumps(
+            jsonable_encoder(build()), ensure_ascii=False, separators=(",", ":")
+        ).encode("utf-8")
+        response_cache.put(user_id, name, version, body)
+    etag = f'"{name}-{user_id}-{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
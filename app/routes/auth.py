@@ -1,17 +1,23 @@
 # Authentication routes for user registration, login, and account deletion.
-from datetime import timedelta
+from datetime import datetime, timedelta
 
 from fastapi import APIRouter, Depends, HTTPException, status, Form
 from sqlmodel import Session, select, delete
 
-from app.models import User, InventoryItem, MapTile, Mob
-from app.schemas import UserCreate, Token, UserResponse
+from app import fog, journal
+from app.models import User, InventoryItem, MapTile, Mob, RefreshToken
+from app.schemas import UserCreate, Token, UserResponse, RefreshRequest
 from app.database import get_session
+from app.leaderboard import leaderboard
+from app.response_cache import invalidate
 from app.auth import (
     get_password_hash,
     verify_password,
     create_access_token,
     get_current_user,
+    issue_refresh_token,
+    rotate_refresh_token,
+    revoke_refresh_token,
 )
 from app.config import settings
 
@@ -33,7 +39,11 @@ def register(user: UserCreate, db: Session = Depends(get_session)):
     hashed_password = get_password_hash(user.password)
     db_user = User(username=user.username, hashed_password=hashed_password)
     db.add(db_user)
+    db.flush()
+    # Other workers add the player to their leaderboards
+    invalidate(db, db_user.id)
     db.commit()
+    leaderboard.update(db_user)
     return db_user
 
 
@@ -51,11 +61,39 @@ def login(
             detail="Incorrect username or password",
         )
 
+    db.execute(delete(RefreshToken).where(
+        RefreshToken.user_id == user.id,
+        RefreshToken.expires_at < datetime.now()
+    ))
+    refresh_token = issue_refresh_token(db, user)
+    db.commit()
+    return _tokens(user, refresh_token)
+
+
+@router.post("/refresh", response_model=Token)
+def refresh(data: RefreshRequest, db: Session = Depends(get_session)):
+    """Exchange a refresh token for a new access token and refresh token."""
+    user, refresh_token = rotate_refresh_token(db, data.refresh_token)
+    return _tokens(user, refresh_token)
+
+
+@router.post("/logout")
+def logout(data: RefreshRequest, db: Session = Depends(get_session)):
+    """Revoke the session of a refresh token."""
+    revoke_refresh_token(db, data.refresh_token)
+    return {"message": "Logged out"}
+
+
+def _tokens(user: User, refresh_token: str) -> dict:
     access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
     access_token = create_access_token(
         data={"sub": user.username}, expires_delta=access_token_expires
     )
-    return {"access_token": access_token, "token_type": "bearer"}
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "refresh_token": refresh_token
+    }
 
 
 @router.delete("/delete-account")
@@ -67,6 +105,11 @@ def delete_user(
     db.execute(delete(InventoryItem).where(InventoryItem.owner_id == user.id))
     db.execute(delete(MapTile).where(MapTile.user_id == user.id))
     db.execute(delete(Mob).where(Mob.user_id == user.id))
+    db.execute(delete(RefreshToken).where(RefreshToken.user_id == user.id))
+    fog.forget(db, user.id)
+    journal.forget(db, user.id)
     db.delete(user)
+    invalidate(db, user.id)
     db.commit()
+    leaderboard.remove(user.id)
     return {"message": "Аккаунт удален"}
@@ -1,262 +1,235 @@
-"""Game logic and routes for the rogue-like game."""
-import random
-from datetime import datetime
-from typing import Tuple
-
-from fastapi import APIRouter, Depends, HTTPException
+"""Game routes: thin adapters between the database and the game engine."""
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from pydantic import BaseModel
+from sqlalchemy import func, insert, or_
 from sqlmodel import Session, select, delete
 
+from app import engine, fog, journal
+from app import subscribers  # pylint: disable=unused-import  # consumers of the events below
+from app.actors import command_version, player_turn
+from app.area_effects import Area, change_tiles
 from app.auth import get_current_user
+from app.config import settings
 from app.database import get_session
+from app.engine import GameError, GameWorld, MobState, MoveResult, Player
+from app.events import ExitReached, MobKilled, PlayerDied, bus, events_settled
 from app.models import MapTile, User, Mob, InventoryItem
+from app.response_cache import cached_json, invalidate
 
 router = APIRouter(prefix="/game", tags=["game"])
 
+PLAYER_FIELDS = Player.__slots__
+
 
 class MoveDirection(BaseModel):
     """Direction model for player movement."""
     direction: str
 
 
-def is_adjacent(x1: int, y1: int, x2: int, y2: int) -> bool:
-    """Check if two coordinates are adjacent."""
-    return (abs(x1 - x2) + abs(y1 - y2)) == 1
+def _player_of(user: User) -> Player:
+    """Engine player with the user's position and stats."""
+    return Player(**{field: getattr(user, field) for field in PLAYER_FIELDS})
+
+
+def _store_player(user: User, player: Player) -> None:
+    """Copy engine player state back to the user row."""
+    for field in PLAYER_FIELDS:
+        setattr(user, field, getattr(player, field))
 
 
-def move_towards(
-    start_x: int,
-    start_y: int,
-    target_x: int,
-    target_y: int,
+def _load_world(
     db: Session,
-    user: User
-) -> Tuple[int, int]: # pylint: disable=too-many-arguments
-    """Calculate next step towards target coordinates avoiding walls."""
-    dx = target_x - start_x
-    dy = target_y - start_y
-    new_x, new_y = start_x, start_y
-
-    if dx != 0:
-        new_x += 1 if dx > 0 else -1
-    elif dy != 0:
-        new_y += 1 if dy > 0 else -1
-
-    if (new_x, new_y) == (user.x, user.y):
-        return start_x, start_y
-
-    # Checking for a wall in the way
-    tile = db.exec(select(MapTile).where(
-        MapTile.x == new_x,
-        MapTile.y == new_y,
-        MapTile.user_id == user.id
-    )).first()
-
-    return (new_x, new_y) if tile and tile.tile_type != "wall" else (start_x, start_y)
-
-
-def _handle_player_death(db: Session, user: User) -> dict:
-    """Handle player death logic."""
-    user.is_active = False
-    db.execute(delete(InventoryItem).where(InventoryItem.owner_id == user.id))
+    user: User,
+    with_mobs: bool = True,
+    window=None
+) -> tuple[GameWorld, dict]:
+    """Load the user's world, return it with mob rows by id.
+
+    ``window(player, mobs)`` returns the areas one command can look at;
+    only their tiles are read then, plus the map size and exit.
+    """
+    mob_rows = db.exec(select(Mob).where(Mob.user_id == user.id)).all() if with_mobs else []
+    mobs = [MobState(mob.id, mob.x, mob.y, mob.health) for mob in mob_rows]
+    player = _player_of(user)
+    query = select(MapTile.x, MapTile.y, MapTile.tile_type).where(MapTile.user_id == user.id)
+    size = exit_cell = None
+    if window is not None:
+        # A map has one exit
+        is_exit = MapTile.tile_type == "exit"
+        width, height, exit_x, exit_y = db.exec(
+            select(
+                func.max(MapTile.x) + 1, func.max(MapTile.y) + 1,
+                func.min(MapTile.x).filter(is_exit), func.min(MapTile.y).filter(is_exit)
+            ).where(MapTile.user_id == user.id)
+        ).one()
+        if width is not None:
+            size = (max(width, engine.MAP_SIZE), max(height, engine.MAP_SIZE))
+            exit_cell = (exit_x, exit_y) if exit_x is not None else None
+            areas = window(player, mobs, exit_cell)
+            query = query.where(or_(*(area.condition() for area in areas)))
+    tiles = db.exec(query.order_by(MapTile.id)).all()
+    world = GameWorld.from_tiles(tiles, mobs, player, size=size)
+    if exit_cell is not None:
+        world.exit = exit_cell
+    return world, {mob.id: mob for mob in mob_rows}
+
+
+def _move_window(player: Player, mobs: list[MobState], _exit) -> list[Area]:
+    # The player steps and looks around, mobs step towards the player
+    radius = settings.sight_radius + 1 if settings.fog_of_war else 1
+    return [Area.square(player.x, player.y, radius)] + [
+        Area.square(mob.x, mob.y, 1) for mob in mobs
+    ]
+
+
+def _wallbreaker_window(player: Player, _mobs, exit_cell) -> list[Area]:
+    areas = [Area.square(player.x, player.y, 1)]
+    if exit_cell is not None:
+        areas.append(Area.square(*exit_cell, 1))
+    return areas
+
+
+def _store_new_map(db: Session, user: User, world: GameWorld) -> None:
+    """Replace the user's map and mobs with a freshly generated world."""
+    db.execute(delete(MapTile).where(MapTile.user_id == user.id))
+    db.execute(delete(Mob).where(Mob.user_id == user.id))
+    fog.forget(db, user.id)
+    db.add(InventoryItem(name=engine.WALLBREAKER, owner_id=user.id, quantity=1))
+    db.execute(insert(MapTile), [
+        {"x": x, "y": y, "tile_type": tile_type, "user_id": user.id}
+        for x, y, tile_type in world.tile_rows()
+    ])
+    mob_rows = [Mob(x=mob.x, y=mob.y, health=mob.health, user_id=user.id) for mob in world.mobs]
+    db.add_all(mob_rows)
+    db.flush()
+    for mob, row in zip(world.mobs, mob_rows):
+        mob.id = row.id
+    journal.take_snapshot(db, user)
+    invalidate(db, user.id)
     db.commit()
-    generate_map(db=db, user=user)
-    reset_player(db=db, user=user)
-    return {
-        "game_over": True,
-        "status": "lose",
-        "message": "You died!",
-        "killed_mobs": user.killed_mobs,
-        "inventory": 0
-    }
 
 
-def _handle_mob_attack(user: User, mob: Mob, db: Session) -> bool:
-    """Process mob attack and return if player was attacked."""
-    total_attack = user.base_attack + user.bonus_attack
-    mob.health -= total_attack
+def _end_game(db: Session, user: User, world: GameWorld, kind: str) -> None:
+    """Persist a finished game; the new map follows from the published event."""
+    _store_player(user, world.player)
+    journal.record(db, user, kind)
+    event = ExitReached if kind == "win" else PlayerDied
+    bus.publish(db, event(user.id, user.username))
+    db.commit()
 
-    if mob.health <= 0:
-        user.killed_mobs += 1
-        apply_upgrades(user, db)
-        db.add(InventoryItem(name="Mob Loot", owner_id=user.id, mob_id=mob.id))
-        if random.random() < 0.2:
-            db.add(InventoryItem(name="Стенолом", owner_id=user.id, quantity=1))
-        db.delete(mob)
 
-    db.add(user)
-    db.commit()
-    return True
+def _store_step(db: Session, user: User, mob_rows: dict, result: MoveResult) -> None:
+    """Persist the effects of one move command."""
+    if result.outcome == "attack":
+        mob = result.target
+        row = mob_rows[mob.id]
+        if result.killed:
+            db.delete(row)
+        else:
+            row.health = mob.health
+        journal.record(
+            db, user, "attack",
+            mob=mob.id,
+            hp=mob.health,
+            stats=journal.player_stats(user)
+        )
 
+    for mob in result.moved:
+        row = mob_rows[mob.id]
+        row.x, row.y = mob.x, mob.y
+    if result.outcome:
+        journal.record(
+            db, user, "move",
+            p=[user.x, user.y, user.health],
+            m=[[mob.id, mob.x, mob.y] for mob in result.moved]
+        )
+    if result.killed:
+        # Upgrades are part of the user row, the loot is stored by subscribers
+        invalidate(db, user.id)
+        # A player killed in the same move loses the loot with the inventory
+        loot = () if result.status == "lose" else tuple(result.loot)
+        bus.publish(db, MobKilled(user.id, user.username, result.target.id, loot))
+    db.commit()
 
-def _move_mobs(db: Session, user: User) -> None:
-    """Process mob movement and attacks."""
-    mobs = db.exec(select(Mob).where(Mob.user_id == user.id)).all()
-    for mob in mobs:
-        new_mob_x, new_mob_y = move_towards(mob.x, mob.y, user.x, user.y, db, user)
 
-        if is_adjacent(new_mob_x, new_mob_y, user.x, user.y):
-            user.health -= 10
-            if user.health <= 0:
-                user.health = 0
-                user.is_active = False
-        else:
-            mob.x, mob.y = new_mob_x, new_mob_y
-            db.add(mob)
+def _game_over(user: User, status: str, message: str, inventory: int = 0) -> dict:
+    return {
+        "game_over": True,
+        "status": status,
+        "message": message,
+        "killed_mobs": user.killed_mobs,
+        "inventory": inventory
+    }
 
 
-@router.post("/move")
+@router.post("/move", dependencies=[Depends(player_turn), Depends(command_version)])
 def move_player(
     move_data: MoveDirection,
     db: Session = Depends(get_session),
     user: User = Depends(get_current_user)
 ) -> dict:
     """Move player and handle collisions, combat and game state."""
-    if user.health <= 0:
-        return _handle_player_death(db, user)
-
-    if not user.is_active:
-        raise HTTPException(400, "Game over!")
-
-    direction = move_data.direction.lower()
-    new_x, new_y = user.x, user.y
-    attacked = False
-
-    # Calculate new position
-    match direction:
-        case "up": new_y -= 1
-        case "down": new_y += 1
-        case "left": new_x -= 1
-        case "right": new_x += 1
-        case _: raise HTTPException(400, "Invalid direction")
-
-    # Check valid tile
-    tile = db.exec(select(MapTile).where(
-        MapTile.x == new_x,
-        MapTile.y == new_y,
-        MapTile.user_id == user.id
-    )).first()
-
-    if not tile or tile.tile_type == "wall":
-        raise HTTPException(400, "Invalid move")
-
-    # Combat logic
-    target_mob = db.exec(select(Mob).where(
-        Mob.x == new_x,
-        Mob.y == new_y,
-        Mob.user_id == user.id
-    )).first()
-
-    if target_mob:
-        attacked = _handle_mob_attack(user, target_mob, db)
-
-    # Update player position if no attack
-    if not attacked:
-        user.x, user.y = new_x, new_y
-        user.last_action = datetime.now()
-        db.add(user)
-
-    # Mob AI
-    _move_mobs(db, user)
-    db.commit()
-
-    # Post-movement checks
-    if user.health <= 0:
-        return _handle_player_death(db, user)
-
-    # Exit condition
-    exit_tile = db.exec(select(MapTile).where(
-        MapTile.x == user.x,
-        MapTile.y == user.y,
-        MapTile.tile_type == "exit",
-        MapTile.user_id == user.id
-    )).first()
-
-    if exit_tile:
-        user.is_active = False
-        inventory_count = db.query(InventoryItem).filter(
-            InventoryItem.owner_id == user.id).count()
-        db.commit()
-        generate_map(db=db, user=user)
-        reset_player(db=db, user=user)
-        return {
-            "game_over": True,
-            "status": "win",
-            "killed_mobs": user.killed_mobs,
-            "inventory": inventory_count,
-            "message": "Exit reached!"
-        }
-
-    return {
+    world, mob_rows = _load_world(db, user, window=_move_window)
+    try:
+        result = world.move(move_data.direction)
+    except GameError as exc:
+        raise HTTPException(400, str(exc)) from exc
+
+    _store_player(user, world.player)
+    revealed = fog.explore(db, user, world) if settings.fog_of_war and not result.status else []
+    _store_step(db, user, mob_rows, result)
+
+    if result.status == "lose":
+        _end_game(db, user, world, "death")
+        return _game_over(user, "lose", "You died!")
+
+    if result.status == "win":
+        inventory_count = db.exec(
+            select(func.count()).select_from(InventoryItem)
+            .where(InventoryItem.owner_id == user.id)
+        ).one()
+        _end_game(db, user, world, "win")
+        return _game_over(user, "win", "Exit reached!", inventory_count)
+
+    response = {
         "x": user.x,
         "y": user.y,
         "health": user.health,
-        "mobs": [{"x": m.x, "y": m.y} for m in
-                db.exec(select(Mob).where(Mob.user_id == user.id)).all()]
+        "mobs": [{"x": m.x, "y": m.y} for m in world.mobs]
     }
+    if settings.fog_of_war:
+        response["mobs"] = [{"x": m.x, "y": m.y} for m in fog.visible_mobs(world, world.mobs)]
+        response["revealed"] = fog.revealed_tiles(world, revealed)
+    return response
 
 
-@router.post("/reset")
+@router.post("/reset", dependencies=[Depends(player_turn), Depends(command_version)])
 def reset_player(
     db: Session = Depends(get_session),
     user: User = Depends(get_current_user)
 ) -> dict:
     """Reset player to starting position."""
-    user.x = 0
-    user.y = 0
-    user.health = 100 + user.bonus_health
-    user.is_active = True
+    world = GameWorld(player=_player_of(user))
+    world.reset_player()
+    _store_player(user, world.player)
+    journal.record(db, user, "reset", p=[user.x, user.y, user.health])
     db.commit()
     return {"message": "Player reset"}
 
 
-@router.post("/generate_map")
+@router.post("/generate_map", dependencies=[Depends(player_turn), Depends(command_version)])
 def generate_map(
     db: Session = Depends(get_session),
     user: User = Depends(get_current_user)
 ) -> dict:
     """Generate new game map with walls, exit and mobs."""
-    db.execute(delete(MapTile).where(MapTile.user_id == user.id))
-    db.execute(delete(Mob).where(Mob.user_id == user.id))
-    db.add(InventoryItem(name="Стенолом", owner_id=user.id, quantity=1))
-    db.commit()
-
-    # Generate base map
-    for x in range(20):
-        for y in range(20):
-            tile_type = "floor" if (x, y) in [(0, 0), (1, 0), (0, 1), (19, 19)] \
-                else "wall" if random.random() < 0.2 else "floor"
-            db.add(MapTile(
-                x=x,
-                y=y,
-                tile_type=tile_type,
-                user_id=user.id
-            ))
-
-    # Add exit
-    db.add(MapTile(
-        x=19,
-        y=19,
-        tile_type="exit",
-        user_id=user.id
-    ))
-
-    # Add mobs
-    mob_count = 0
-    while mob_count < 5:
-        x, y = random.randint(0, 19), random.randint(0, 19)
-        tile = db.exec(select(MapTile)
-                      .where(MapTile.x == x, MapTile.y == y, MapTile.user_id == user.id)
-                      ).first()
-        if tile and tile.tile_type != "wall":
-            db.add(Mob(x=x, y=y, user_id=user.id, health=50))
-            mob_count += 1
-
-    db.commit()
+    world = GameWorld(player=_player_of(user))
+    world.generate()
+    _store_new_map(db, user, world)
     return {"message": "Персональная карта создана"}
 
 
-@router.get("/state")
+@router.get("/state", dependencies=[Depends(events_settled)])
 def get_game_state(
     db: Session = Depends(get_session),
     user: User = Depends(get_current_user)
@@ -266,6 +239,21 @@ def get_game_state(
         generate_map(db=db, user=user)
         reset_player(db=db, user=user)
 
+    if settings.fog_of_war:
+        world, _ = _load_world(db, user)
+        fog.explore(db, user, world)
+        db.commit()
+        return {
+            "player": {
+                "x": user.x,
+                "y": user.y,
+                "health": user.health,
+                "is_active": user.is_active
+            },
+            "mobs": [{"x": m.x, "y": m.y} for m in fog.visible_mobs(world, world.mobs)],
+            "tiles": fog.explored_tiles(db, user, world)
+        }
+
     return {
         "player": {
             "x": user.x,
@@ -280,29 +268,19 @@ def get_game_state(
     }
 
 
-@router.patch("/surrender")
+@router.patch("/surrender", dependencies=[Depends(player_turn), Depends(command_version)])
 def surrender(
     db: Session = Depends(get_session),
     user: User = Depends(get_current_user)
 ) -> dict:
     """Handle player surrender."""
-    user.health = 0
-    user.is_active = False
-    db.execute(delete(InventoryItem).where(InventoryItem.owner_id == user.id))
-    db.commit()
-
-    generate_map(db=db, user=user)
-    reset_player(db=db, user=user)
-    return {
-        "game_over": True,
-        "status": "lose",
-        "message": "Вы сдались!",
-        "killed_mobs": user.killed_mobs,
-        "inventory": 0
-    }
+    world = GameWorld(player=_player_of(user))
+    world.surrender()
+    _end_game(db, user, world, "surrender")
+    return _game_over(user, "lose", "Вы сдались!")
 
 
-@router.put("/use-wallbreaker")
+@router.put("/use-wallbreaker", dependencies=[Depends(player_turn), Depends(command_version)])
 def use_wallbreaker(
     db: Session = Depends(get_session),
     user: User = Depends(get_current_user)
@@ -311,7 +289,7 @@ def use_wallbreaker(
     wallbreaker = db.exec(
         select(InventoryItem).where(
             InventoryItem.owner_id == user.id,
-            InventoryItem.name == "Стенолом",
+            InventoryItem.name == engine.WALLBREAKER,
             InventoryItem.quantity >= 1
         )
     ).first()
@@ -319,45 +297,16 @@ def use_wallbreaker(
     if not wallbreaker:
         raise HTTPException(400, "У вас нет стенолома!")
 
-    exit_tile = db.exec(
-        select(MapTile).where(
-            MapTile.user_id == user.id,
-            MapTile.tile_type == "exit"
-        )
-    ).first()
-    if not exit_tile:
-        raise HTTPException(400, "Выход не найден")
-
-    def get_walls_around(x: int, y: int) -> list:
-        """Get walls in 3x3 area around coordinates."""
-        walls = []
-        for dx in (-1, 0, 1):
-            for dy in (-1, 0, 1):
-                check_x = x + dx
-                check_y = y + dy
-                if 0 <= check_x < 20 and 0 <= check_y < 20:
-                    tile = db.exec(select(MapTile).where(
-                        MapTile.x == check_x,
-                        MapTile.y == check_y,
-                        MapTile.user_id == user.id,
-                        MapTile.tile_type == "wall"
-                    )).first()
-                    if tile:
-                        walls.append(tile)
-        return walls
-
-    # Get walls around player and exit
-    walls_to_destroy = get_walls_around(user.x, user.y) + get_walls_around(exit_tile.x, exit_tile.y)
-    unique_walls = {(wall.x, wall.y): wall for wall in walls_to_destroy}
-    unique_walls.pop((exit_tile.x, exit_tile.y), None)
-
-    if not unique_walls:
-        raise HTTPException(400, "Нет стен для разрушения")
-
-    # Update walls and inventory
-    for wall in unique_walls.values():
-        wall.tile_type = "floor"
-        db.add(wall)
+    world, _ = _load_world(db, user, with_mobs=False, window=_wallbreaker_window)
+    world.wallbreakers = wallbreaker.quantity
+    try:
+        destroyed = world.use_wallbreaker()
+    except GameError as exc:
+        raise HTTPException(400, str(exc)) from exc
+
+    # Update walls and inventory: every wall in the two squares was destroyed
+    areas = _wallbreaker_window(world.player, None, world.exit)
+    change_tiles(db, user.id, areas, "floor", from_type="wall")
 
     wallbreaker.quantity -= 1
     if wallbreaker.quantity == 0:
@@ -365,29 +314,33 @@ def use_wallbreaker(
     else:
         db.add(wallbreaker)
 
+    journal.record(
+        db, user, "wallbreaker",
+        tiles=destroyed,
+        item=[wallbreaker.id, wallbreaker.quantity]
+    )
+    tiles = fog.changed_tiles(db, user.id, world, destroyed)
+    invalidate(db, user.id)
     db.commit()
-    return {"message": f"Уничтожено {len(unique_walls)} стен!"}
-
-
-def apply_upgrades(user: User, db: Session) -> None:
-    """Apply stat upgrades when reaching kill milestones."""
-    next_level = 2 ** user.upgrade_level
-    if user.killed_mobs >= next_level:
-        user.upgrade_level += 1
-        user.bonus_attack += 5
-        user.bonus_health += 20
-        user.health += user.bonus_health
-    db.add(user)
-    db.commit()
+    return {"message": f"Уничтожено {len(destroyed)} стен!", "tiles": tiles}
 
 
 @router.get("/upgrades")
-def get_upgrades(user: User = Depends(get_current_user)) -> dict:
+def get_upgrades(
+    request: Request,
+    db: Session = Depends(get_session),
+    user: User = Depends(get_current_user)
+) -> Response:
     """Get player upgrade progression."""
-    next_level = 2 ** user.upgrade_level
-    return {
-        "killed_mobs": user.killed_mobs,
-        "bonus_attack": user.bonus_attack,
-        "bonus_health": user.bonus_health,
-        "next_level": next_level
-    }
+    def build() -> dict:
+        # The user was loaded before the version was read, a commit in
+        # between must not be cached under the new version
+        db.refresh(user)
+        next_level = 2 ** user.upgrade_level
+        return {
+            "killed_mobs": user.killed_mobs,
+            "bonus_attack": user.bonus_attack,
+            "bonus_health": user.bonus_health,
+            "next_level": next_level
+        }
+    return cached_json(request, user.id, "upgrades", build)
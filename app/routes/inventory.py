@@ -1,19 +1,24 @@
 """Inventory management endpoints."""
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request, Response
 from sqlmodel import Session, select
 
 from app.models import InventoryItem, User
 from app.database import get_session
 from app.auth import get_current_user
+from app.events import events_settled
+from app.response_cache import cached_json
 
 router = APIRouter()
 
-@router.get("/inventory")
+@router.get("/inventory", dependencies=[Depends(events_settled)])
 def get_inventory(
+    request: Request,
     db: Session = Depends(get_session),
     user: User = Depends(get_current_user)
-)-> dict:
+)-> Response:
     """Get player's inventory items."""
-    items = db.exec(select(InventoryItem)
-                    .where(InventoryItem.owner_id == user.id)).all()
-    return {"items": items}
+    def build() -> dict:
+        items = db.exec(select(InventoryItem)
+                        .where(InventoryItem.owner_id == user.id)).all()
+        return {"items": items}
+    return cached_json(request, user.id, "inventory", build)
@@ -0,0 +1,36 @@
+"""Leaderboard endpoints."""
+from fastapi import APIRouter, Depends, Query
+from sqlmodel import Session
+
+from app.auth import get_current_user
+from app.database import get_session
+from app.leaderboard import leaderboard
+from app.models import User
+
+router = APIRouter(prefix="/leaderboard", tags=["leaderboard"])
+
+
+@router.get("")
+def get_leaderboard(
+    limit: int = Query(10, ge=1, le=100),
+    db: Session = Depends(get_session)
+) -> dict:
+    """Get the best players by killed mobs."""
+    leaderboard.ensure_loaded(db)
+    return {"players": leaderboard.top(limit), "total": len(leaderboard)}
+
+
+@router.get("/me")
+def get_my_rank(
+    db: Session = Depends(get_session),
+    user: User = Depends(get_current_user)
+) -> dict:
+    """Get the current player's rank."""
+    leaderboard.ensure_loaded(db)
+    leaderboard.update(user)
+    return {
+        "username": user.username,
+        "killed_mobs": user.killed_mobs,
+        "rank": leaderboard.rank(user.id),
+        "total": len(leaderboard)
+    }
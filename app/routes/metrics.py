@@ -0,0 +1,26 @@
+"""Runtime metrics endpoints."""
+from fastapi import APIRouter
+
+from app.actors import actors
+from app.cache_sync import cache_sync
+from app.events import bus
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+
+@router.get("/actors")
+def get_actor_metrics() -> dict:
+    """Get queue depth and wait time of per-player command queues."""
+    return actors.metrics()
+
+
+@router.get("/events")
+def get_event_metrics() -> dict:
+    """Get published game events and how their consumers keep up."""
+    return bus.metrics()
+
+
+@router.get("/cache")
+def get_cache_metrics() -> dict:
+    """Get cache invalidations exchanged with other workers."""
+    return cache_sync.metrics()
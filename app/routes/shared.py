@@ -0,0 +1,63 @@
+"""Shared world routes: many players on one large map."""
+from fastapi import APIRouter, Depends, HTTPException
+
+from app.actors import player_turn
+from app.auth import get_current_user
+from app.config import settings
+from app.engine import GameError
+from app.models import User
+from app.routes.game import MoveDirection
+from app.shared_world import SharedWorld, shared_worlds
+
+
+def shared_world_enabled() -> None:
+    """Hide the routes unless the shared world mode is on."""
+    if not settings.shared_world_enabled:
+        raise HTTPException(404, "Shared world is disabled")
+
+
+router = APIRouter(prefix="/shared", tags=["shared"], dependencies=[Depends(shared_world_enabled)])
+
+
+def _world_of(user: User) -> SharedWorld:
+    try:
+        return shared_worlds.world_of(user.id)
+    except GameError as exc:
+        raise HTTPException(400, str(exc)) from exc
+
+
+@router.post("/join")
+def join(user: User = Depends(get_current_user)) -> dict:
+    """Enter a shard of the shared world and see its surroundings."""
+    return shared_worlds.join(user).view(user.id)
+
+
+@router.post("/move", dependencies=[Depends(player_turn)])
+def move(move_data: MoveDirection, user: User = Depends(get_current_user)) -> dict:
+    """Move in the shared world, return the player and the changes they saw."""
+    world = _world_of(user)
+    try:
+        result = world.move(user.id, move_data.direction)
+    except GameError as exc:
+        raise HTTPException(400, str(exc)) from exc
+    result.update(world.updates(user.id))
+    return result
+
+
+@router.get("/view")
+def view(user: User = Depends(get_current_user)) -> dict:
+    """Get all players and mobs within the view radius."""
+    return _world_of(user).view(user.id)
+
+
+@router.get("/updates")
+def updates(user: User = Depends(get_current_user)) -> dict:
+    """Get the changes around the player since the last request."""
+    return _world_of(user).updates(user.id)
+
+
+@router.post("/leave")
+def leave(user: User = Depends(get_current_user)) -> dict:
+    """Leave the shared world."""
+    shared_worlds.leave(user.id)
+    return {"message": "Left the shared world"}
@@ -10,6 +10,11 @@ class Token(BaseModel):
     """JWT token response."""
     access_token: str
     token_type: str
+    refresh_token: str | None = None
+
+class RefreshRequest(BaseModel):
+    """Refresh token sent to renew or revoke a session."""
+    refresh_token: str
 
 class UserResponse(BaseModel):
     """User data response."""
@@ -0,0 +1,401 @@
+"""Shared world mode: many players on one large map, split into shards.
+
+Every shard keeps its map, players and mobs in memory. Players and mobs
+are indexed in a ``SpatialGrid`` whose cells are as large as the view
+radius, so finding the players that can see a change only looks at the
+3x3 grid cells around it. Changes are queued to those players only, and
+the cost of a move grows with the local density, not with the number of
+players in the shard.
+
+A player who made no request for ``shared_idle_seconds`` is taken out of
+their shard by ``run_shared_eviction``.
+"""
+import asyncio
+import itertools
+import logging
+import random
+import time
+from collections import deque
+from threading import Lock, RLock
+from typing import Iterator
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.engine import DIRECTIONS, MOB_DAMAGE, MOB_HEALTH, GameError, GameWorld
+from app.models import User
+
+logger = logging.getLogger(__name__)
+
+
+class SpatialGrid:
+    """Objects with ``x`` and ``y`` bucketed into square cells."""
+    __slots__ = ("cell_size", "_cells", "_keys")
+
+    def __init__(self, cell_size: int):
+        self.cell_size = cell_size
+        self._cells: dict[tuple[int, int], set] = {}
+        self._keys: dict[object, tuple[int, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, obj) -> None:
+        """Index an object at its current position."""
+        key = (obj.x // self.cell_size, obj.y // self.cell_size)
+        self._cells.setdefault(key, set()).add(obj)
+        self._keys[obj] = key
+
+    def remove(self, obj) -> None:
+        """Drop an object from the index."""
+        key = self._keys.pop(obj)
+        bucket = self._cells[key]
+        bucket.discard(obj)
+        if not bucket:
+            del self._cells[key]
+
+    def update(self, obj) -> None:
+        """Re-index an object after its position changed."""
+        if self._keys[obj] != (obj.x // self.cell_size, obj.y // self.cell_size):
+            self.remove(obj)
+            self.add(obj)
+
+    def near(self, x: int, y: int, radius: int) -> Iterator:
+        """Objects at most ``radius`` cells away from a point on both axes."""
+        size = self.cell_size
+        for cell_x in range((x - radius) // size, (x + radius) // size + 1):
+            for cell_y in range((y - radius) // size, (y + radius) // size + 1):
+                for obj in self._cells.get((cell_x, cell_y), ()):
+                    if abs(obj.x - x) <= radius and abs(obj.y - y) <= radius:
+                        yield obj
+
+
+class SharedPlayer:
+    """A player in a shard, with the updates not yet sent to their client.
+
+    ``resync`` is set when the outbox overflowed and dropped updates; the
+    client then has to load a full ``view``.
+    """
+    __slots__ = (
+        "id", "name", "x", "y", "health", "max_health", "attack", "killed_mobs",
+        "outbox", "resync", "last_seen"
+    )
+
+    def __init__(self, user: User):
+        self.id = user.id
+        self.name = user.username
+        self.x = self.y = 0
+        self.max_health = self.health = 100 + user.bonus_health
+        self.attack = user.base_attack + user.bonus_attack
+        self.killed_mobs = 0
+        self.outbox: deque[dict] = deque(maxlen=settings.shared_outbox_size)
+        self.resync = False
+        self.last_seen = time.monotonic()
+
+    def state(self) -> dict:
+        return {"type": "player", "id": self.id, "name": self.name,
+                "x": self.x, "y": self.y, "health": self.health}
+
+    def send(self, update: dict) -> None:
+        """Queue an update, dropping the oldest one when the outbox is full."""
+        if len(self.outbox) == self.outbox.maxlen:
+            self.resync = True
+        self.outbox.append(update)
+
+
+class SharedMob:
+    """A mob in a shard."""
+    __slots__ = ("id", "x", "y", "health")
+
+    def __init__(self, mob_id: int):
+        self.id = mob_id
+        self.x = self.y = 0
+        self.health = MOB_HEALTH
+
+    def state(self) -> dict:
+        return {"type": "mob", "id": self.id, "x": self.x, "y": self.y, "health": self.health}
+
+
+def _gone(entity: SharedPlayer | SharedMob) -> dict:
+    kind = "player" if isinstance(entity, SharedPlayer) else "mob"
+    return {"type": kind, "id": entity.id, "gone": True}
+
+
+class SharedWorld:
+    """One shard: a large map whose mobs are fought by all its players.
+
+    Killed mobs respawn elsewhere, and dead players respawn with full
+    health; there is no exit to reach.
+    """
+
+    def __init__(self, shard_id: int, size: int | None = None, mob_count: int | None = None, rng=None):
+        size = size or settings.shared_map_size
+        self.id = shard_id
+        self.rng = rng or random.Random()
+        self.terrain = GameWorld(rng=self.rng)
+        self.terrain.generate(size, size, mob_count=0)
+        self.players: dict[int, SharedPlayer] = {}
+        self.mobs: dict[int, SharedMob] = {}
+        self.occupants: dict[tuple[int, int], SharedPlayer | SharedMob] = {}
+        self.player_grid = SpatialGrid(settings.shared_view_radius)
+        self.mob_grid = SpatialGrid(settings.shared_view_radius)
+        self._mob_ids = itertools.count(1)
+        self._lock = RLock()
+        for _ in range(settings.shared_mob_count if mob_count is None else mob_count):
+            self._spawn_mob()
+
+    def __len__(self) -> int:
+        return len(self.players)
+
+    def join(self, user: User) -> None:
+        """Place a player on a free cell, if they are not here yet."""
+        with self._lock:
+            if user.id in self.players:
+                return
+            player = self.players[user.id] = SharedPlayer(user)
+            self._put(player, self.player_grid)
+            self._notify(player, (player.x, player.y), player.state())
+
+    def leave(self, user_id: int) -> None:
+        """Remove a player from the shard."""
+        with self._lock:
+            player = self.players.pop(user_id, None)
+            if player is not None:
+                self._take(player, self.player_grid)
+                self._notify(player, (player.x, player.y), _gone(player))
+
+    def move(self, user_id: int, direction: str) -> dict:
+        """Move the player or attack a mob, then let the nearby mobs act."""
+        with self._lock:
+            player = self._player(user_id)
+            try:
+                dx, dy = DIRECTIONS[direction.lower()]
+            except KeyError as exc:
+                raise GameError("Invalid direction") from exc
+            x, y = player.x + dx, player.y + dy
+            if not self.terrain.is_passable(x, y):
+                raise GameError("Invalid move")
+
+            player.last_seen = time.monotonic()
+            start = (player.x, player.y)
+            target = self.occupants.get((x, y))
+            if isinstance(target, SharedMob):
+                outcome = "attack"
+                self._attack(player, target)
+            elif target is not None:
+                raise GameError("Cell is occupied")
+            else:
+                outcome = "move"
+                self._relocate(player, self.player_grid, x, y)
+                self._view_changed(player, start)
+
+            self._mobs_act(player)
+            if player.health <= 0:
+                outcome = "death"
+                player.health = player.max_health
+                died_at = (player.x, player.y)
+                self._take(player, self.player_grid)
+                self._put(player, self.player_grid)
+                self._view_changed(player, died_at)
+            self._notify(player, start, player.state())
+            return {"outcome": outcome, "player": player.state()}
+
+    def view(self, user_id: int) -> dict:
+        """Everything the player can see; replaces their pending updates."""
+        with self._lock:
+            player = self._player(user_id)
+            player.outbox.clear()
+            player.resync = False
+            player.last_seen = time.monotonic()
+            radius = settings.shared_view_radius
+            return {
+                "shard": self.id,
+                "player": player.state(),
+                "players": [other.state() for other in self.player_grid.near(player.x, player.y, radius)
+                            if other is not player],
+                "mobs": [mob.state() for mob in self.mob_grid.near(player.x, player.y, radius)],
+            }
+
+    def updates(self, user_id: int) -> dict:
+        """Take the changes seen by the player since their last request.
+
+        After an overflow the updates are incomplete: none are returned and
+        ``resync`` stays true until the player loads a ``view``.
+        """
+        with self._lock:
+            player = self._player(user_id)
+            player.last_seen = time.monotonic()
+            updates = [] if player.resync else list(player.outbox)
+            player.outbox.clear()
+            return {"updates": updates, "resync": player.resync}
+
+    def evict_idle(self, before: float) -> list[int]:
+        """Take out the players whose last request was before a ``time.monotonic()`` value."""
+        with self._lock:
+            idle = [player.id for player in self.players.values() if player.last_seen < before]
+            for user_id in idle:
+                self.leave(user_id)
+            return idle
+
+    def _player(self, user_id: int) -> SharedPlayer:
+        try:
+            return self.players[user_id]
+        except KeyError as exc:
+            raise GameError("Join the shared world first") from exc
+
+    def _free_cell(self) -> tuple[int, int]:
+        terrain, rng = self.terrain, self.rng
+        while True:
+            x, y = rng.randrange(terrain.width), rng.randrange(terrain.height)
+            if terrain.is_passable(x, y) and (x, y) not in self.occupants:
+                return x, y
+
+    def _put(self, entity, grid: SpatialGrid) -> None:
+        entity.x, entity.y = self._free_cell()
+        self.occupants[(entity.x, entity.y)] = entity
+        grid.add(entity)
+
+    def _take(self, entity, grid: SpatialGrid) -> None:
+        del self.occupants[(entity.x, entity.y)]
+        grid.remove(entity)
+
+    def _relocate(self, entity, grid: SpatialGrid, x: int, y: int) -> None:
+        del self.occupants[(entity.x, entity.y)]
+        entity.x, entity.y = x, y
+        self.occupants[(x, y)] = entity
+        grid.update(entity)
+
+    def _spawn_mob(self) -> SharedMob:
+        mob = SharedMob(next(self._mob_ids))
+        self.mobs[mob.id] = mob
+        self._put(mob, self.mob_grid)
+        return mob
+
+    def _notify(self, entity, start: tuple[int, int], update: dict) -> None:
+        """Queue an update for the players who could see the entity before or after.
+
+        Players who saw the entity only before its move are told it is gone.
+        """
+        radius = settings.shared_view_radius
+        observers = set(self.player_grid.near(entity.x, entity.y, radius))
+        observers.discard(entity)
+        for observer in observers:
+            observer.send(update)
+        if start != (entity.x, entity.y) and not update.get("gone"):
+            for observer in self.player_grid.near(*start, radius):
+                if observer not in observers and observer is not entity:
+                    observer.send(_gone(entity))
+
+    def _visible(self, x: int, y: int) -> set:
+        radius = settings.shared_view_radius
+        return set(self.player_grid.near(x, y, radius)) | set(self.mob_grid.near(x, y, radius))
+
+    def _view_changed(self, player: SharedPlayer, start: tuple[int, int]) -> None:
+        """Queue what came into and went out of the player's view by their own move."""
+        before, after = self._visible(*start), self._visible(player.x, player.y)
+        for entity in after - before - {player}:
+            player.send(entity.state())
+        for entity in before - after - {player}:
+            player.send(_gone(entity))
+
+    def _attack(self, player: SharedPlayer, mob: SharedMob) -> None:
+        mob.health -= player.attack
+        if mob.health > 0:
+            self._notify(mob, (mob.x, mob.y), mob.state())
+            return
+        player.killed_mobs += 1
+        self._take(mob, self.mob_grid)
+        del self.mobs[mob.id]
+        self._notify(mob, (mob.x, mob.y), _gone(mob))
+        spawned = self._spawn_mob()
+        self._notify(spawned, (spawned.x, spawned.y), spawned.state())
+
+    def _mobs_act(self, player: SharedPlayer) -> None:
+        """Mobs close to the player step towards them or hit them."""
+        px, py = player.x, player.y
+        for mob in list(self.mob_grid.near(px, py, settings.shared_aggro_radius)):
+            x, y = mob.x, mob.y
+            dx, dy = px - x, py - y
+            if abs(dx) + abs(dy) == 1:
+                player.health = max(player.health - MOB_DAMAGE, 0)
+                continue
+            if dx:
+                x += 1 if dx > 0 else -1
+            elif dy:
+                y += 1 if dy > 0 else -1
+            if self.terrain.is_passable(x, y) and (x, y) not in self.occupants:
+                start = (mob.x, mob.y)
+                self._relocate(mob, self.mob_grid, x, y)
+                self._notify(mob, start, mob.state())
+
+
+class SharedWorlds:
+    """Shards of the shared world and the shard of every joined player."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self.shards: list[SharedWorld] = []
+        self._placement: dict[int, SharedWorld] = {}
+
+    def clear(self) -> None:
+        """Drop all shards."""
+        with self._lock:
+            self.shards.clear()
+            self._placement.clear()
+
+    def join(self, user: User) -> SharedWorld:
+        """Shard of the player, placing them in one with room if needed."""
+        with self._lock:
+            world = self._placement.get(user.id)
+            if world is None:
+                world = next(
+                    (shard for shard in self.shards if len(shard) < settings.shared_shard_capacity),
+                    None
+                )
+                if world is None:
+                    world = SharedWorld(len(self.shards))
+                    self.shards.append(world)
+                world.join(user)
+                self._placement[user.id] = world
+            return world
+
+    def world_of(self, user_id: int) -> SharedWorld:
+        """Shard the player has joined."""
+        world = self._placement.get(user_id)
+        if world is None:
+            raise GameError("Join the shared world first")
+        return world
+
+    def leave(self, user_id: int) -> None:
+        """Take the player out of their shard."""
+        with self._lock:
+            world = self._placement.pop(user_id, None)
+            if world is not None:
+                world.leave(user_id)
+
+    def evict_idle(self, now: float | None = None) -> int:
+        """Take out players idle for ``shared_idle_seconds``, return their number."""
+        before = (now or time.monotonic()) - settings.shared_idle_seconds
+        evicted = 0
+        with self._lock:
+            for world in self.shards:
+                for user_id in world.evict_idle(before):
+                    self._placement.pop(user_id, None)
+                    evicted += 1
+        return evicted
+
+
+shared_worlds = SharedWorlds()
+
+
+async def run_shared_eviction() -> None:
+    """Evict idle players every ``shared_idle_seconds``."""
+    while True:
+        await asyncio.sleep(settings.shared_idle_seconds)
+        try:
+            evicted = await run_in_threadpool(shared_worlds.evict_idle)
+        except Exception:  # pylint: disable=broad-exception-caught
+            logger.exception("Shared world eviction failed")
+            continue
+        if evicted:
+            logger.info("Evicted %d idle players from the shared world", evicted)
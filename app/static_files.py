@@ -0,0 +1,134 @@
+"""Precompressed static asset serving with content-hashed URLs."""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import Scope
+
+from app.config import settings
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+ASSET_REF = re.compile(r"/static/([\w./-]+\.\w+)")
+
+
+class StaticAsset:
+    """Static file loaded into memory with its precompressed variants."""
+    __slots__ = ("media_type", "digest", "bodies")
+
+    def __init__(self, media_type: str, body: bytes):
+        self.media_type = media_type
+        self.digest = hashlib.sha256(body).hexdigest()[:12]
+        self.bodies = {"identity": body}
+
+    def compress(self, min_size: int) -> None:
+        """Build gzip/brotli variants, keeping only those that are smaller."""
+        body = self.bodies["identity"]
+        if len(body) < min_size or not self.media_type.startswith(COMPRESSIBLE_TYPES):
+            return
+        variants = {"gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants["br"] = brotli.compress(body, quality=11)
+        for encoding, data in variants.items():
+            if len(data) < len(body):
+                self.bodies[encoding] = data
+
+
+def choose_encoding(accept_encoding: str, available) -> str:
+    """Pick the best available content-coding allowed by Accept-Encoding."""
+    accepted = set()
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        params = params.replace(" ", "")
+        if coding and params not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            accepted.add(coding.lower())
+    for encoding in ("br", "gzip"):
+        if encoding in available and (encoding in accepted or "*" in accepted):
+            return encoding
+    return "identity"
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles serving in-memory, precompressed and content-hashed assets.
+
+    Every file under ``directory`` is read and compressed once, at startup.
+    HTML pages get their ``/static/...`` references rewritten to
+    ``/static/...?v=<hash>``; requests carrying the current hash are cached
+    as ``immutable``, everything else is revalidated through its ETag.
+    """
+
+    def __init__(self, *, directory: str, **kwargs):
+        super().__init__(directory=directory, **kwargs)
+        self.assets: dict[str, StaticAsset] = {}
+        self.load_assets()
+
+    def load_assets(self) -> None:
+        """Read, hash and compress all files of the static directory."""
+        pages = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                full_path = os.path.join(root, name)
+                key = os.path.relpath(full_path, self.directory).replace(os.sep, "/")
+                media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+                with open(full_path, "rb") as file:
+                    self.assets[key] = StaticAsset(media_type, file.read())
+                if media_type == "text/html":
+                    pages.append(key)
+
+        # Pages link to each other, so only non-page assets get hashed URLs
+        for key in pages:
+            asset = self.assets[key]
+            html = asset.bodies["identity"].decode("utf-8")
+            html = ASSET_REF.sub(self._hashed_reference, html)
+            self.assets[key] = StaticAsset(asset.media_type, html.encode("utf-8"))
+
+        for asset in self.assets.values():
+            asset.compress(settings.static_min_compress_size)
+
+    def _hashed_reference(self, match: re.Match) -> str:
+        asset = self.assets.get(match.group(1))
+        if asset is None or asset.media_type == "text/html":
+            return match.group(0)
+        return f"{match.group(0)}?v={asset.digest}"
+
+    def url_for(self, path: str) -> str:
+        """Return the content-hashed URL of an asset."""
+        return f"/static/{path}?v={self.assets[path].digest}"
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        asset = self.assets.get(path.replace(os.sep, "/"))
+        if asset is None or scope["method"] not in ("GET", "HEAD"):
+            return await super().get_response(path, scope)
+
+        request_headers = Headers(scope=scope)
+        encoding = choose_encoding(request_headers.get("accept-encoding", ""), asset.bodies)
+        etag = f'"{asset.digest}-{encoding}"'
+        headers = {"etag": etag, "vary": "Accept-Encoding"}
+        if encoding != "identity":
+            headers["content-encoding"] = encoding
+
+        query = scope.get("query_string", b"").decode("latin-1")
+        if f"v={asset.digest}" in query.split("&"):
+            headers["cache-control"] = f"public, max-age={settings.static_max_age}, immutable"
+        else:
+            headers["cache-control"] = "no-cache"
+
+        if_none_match = request_headers.get("if-none-match", "")
+        if etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")] \
+                or if_none_match.strip() == "*":
+            return Response(status_code=304, headers=headers)
+
+        body = asset.bodies[encoding]
+        if scope["method"] == "HEAD":
+            headers["content-length"] = str(len(body))
+            return Response(status_code=200, headers=headers, media_type=asset.media_type)
+        return Response(body, headers=headers, media_type=asset.media_type)
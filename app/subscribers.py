@@ -0,0 +1,68 @@
+"""Built-in consumers of game events, each writing a whole batch at once."""
+import random
+
+from sqlmodel import Session, select, delete
+
+from app import engine as game, journal, season
+from app.config import settings
+from app.events import ExitReached, MobKilled, PlayerDied, bus
+from app.leaderboard import leaderboard
+from app.models import User, InventoryItem
+from app.response_cache import invalidate
+
+
+def _users(db: Session, user_ids) -> list[User]:
+    # Rows may have been changed behind the session by bulk updates
+    return db.exec(
+        select(User).where(User.id.in_(user_ids)).execution_options(populate_existing=True)
+    ).all()
+
+
+@bus.subscribe(MobKilled, PlayerDied, ExitReached)
+def store_world_changes(db: Session, events: list) -> None:
+    """Give loot to the killers and new maps to the players whose game ended."""
+    finished = {event.user_id: event for event in events if not isinstance(event, MobKilled)}
+    loot = {}
+    for event in events:
+        if not isinstance(event, MobKilled):
+            continue
+        loot[event.user_id] = [
+            InventoryItem(
+                name=name,
+                owner_id=event.user_id,
+                mob_id=event.mob_id if name == game.MOB_LOOT else None
+            )
+            for name in event.loot
+        ]
+    db.add_all(item for items in loot.values() for item in items)
+    db.flush()
+    if settings.action_log_enabled:
+        for user in _users(db, [user_id for user_id, items in loot.items() if items]):
+            journal.record(db, user, "loot", items=[
+                [item.id, item.name, item.quantity, item.mob_id] for item in loot[user.id]
+            ])
+
+    if finished:
+        died = [user_id for user_id, event in finished.items() if isinstance(event, PlayerDied)]
+        if died:
+            db.execute(delete(InventoryItem).where(InventoryItem.owner_id.in_(died)))
+        season.store_shard(
+            db.connection(), season.generate_shard(random.randrange(2 ** 32), list(finished))
+        )
+        if settings.action_log_enabled:
+            # The log of the old map must not be applied to the new one
+            journal.forget(db, *finished)
+            for user in _users(db, list(finished)):
+                journal.take_snapshot(db, user)
+    for user_id in loot.keys() | finished.keys():
+        invalidate(db, user_id)
+    db.commit()
+
+
+@bus.subscribe(MobKilled, PlayerDied, ExitReached)
+def update_leaderboard(db: Session, events: list) -> None:
+    """Record the current scores of the players behind the events."""
+    if not leaderboard.loaded:
+        return
+    for user in _users(db, list({event.user_id for event in events})):
+        leaderboard.update(user)
@@ -0,0 +1,169 @@
+"""Streaming export and import of player worlds.
+
+Each player is one NDJSON line with their account, map, mobs and
+inventory; a ``.gz`` path is gzip-compressed. Both directions work in
+batches of players, so memory use does not depend on the number of
+players. The export reads all batches in one transaction and so writes a
+consistent snapshot; on SQLite the server keeps writing meanwhile only in
+WAL mode (``PRAGMA journal_mode=WAL``), otherwise its writes wait for the
+export. Every import batch is its own short transaction.
+
+Usage::
+
+    python -m app.transfer export players.ndjson.gz
+    python -m app.transfer import players.ndjson.gz --database sqlite:///restored.db
+"""
+import argparse
+import gzip
+import json
+import sys
+import time
+from datetime import datetime
+from typing import Iterable, TextIO
+
+from sqlalchemy import Connection, Engine, create_engine, insert, select
+from sqlmodel import SQLModel
+
+from app import journal
+from app.database import engine as app_engine
+from app.models import User, MapTile, Mob, InventoryItem
+
+USERS = User.__table__
+
+
+def _dumps(record: dict) -> str:
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+
+
+def _open(path: str, mode: str) -> TextIO:
+    if path == "-":
+        return sys.stdin if mode == "r" else sys.stdout
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8", compresslevel=6)
+    return open(path, mode, encoding="utf-8")
+
+
+def _begin_snapshot(connection: Connection) -> None:
+    if connection.dialect.name == "sqlite":
+        # pysqlite opens transactions only for writes, reads would see every commit
+        connection.exec_driver_sql("BEGIN")
+    else:
+        connection.execution_options(isolation_level="REPEATABLE READ")
+
+
+def export_worlds(engine: Engine, out: TextIO, batch_size: int = 500) -> int:
+    """Write all players as NDJSON lines, return their number."""
+    count = 0
+    last_id = 0
+    with engine.connect() as connection:
+        _begin_snapshot(connection)
+        while True:
+            users = connection.execute(
+                select(USERS).where(USERS.c.id > last_id).order_by(USERS.c.id).limit(batch_size)
+            ).mappings().all()
+            if not users:
+                return count
+
+            user_ids = [user["id"] for user in users]
+            worlds = {user_id: {"tiles": [], "mobs": [], "items": []} for user_id in user_ids}
+            children = (
+                ("tiles", select(MapTile.user_id, MapTile.x, MapTile.y, MapTile.tile_type)
+                 .where(MapTile.user_id.in_(user_ids)).order_by(MapTile.id)),
+                ("mobs", select(Mob.user_id, Mob.id, Mob.x, Mob.y, Mob.health)
+                 .where(Mob.user_id.in_(user_ids)).order_by(Mob.id)),
+                ("items", select(
+                    InventoryItem.owner_id, InventoryItem.id, InventoryItem.name,
+                    InventoryItem.quantity, InventoryItem.mob_id
+                ).where(InventoryItem.owner_id.in_(user_ids)).order_by(InventoryItem.id)),
+            )
+            for key, query in children:
+                for row in connection.execute(query.execution_options(yield_per=10_000)):
+                    worlds[row[0]][key].append(list(row[1:]))
+            # Moves since the latest snapshot are only in the action log
+            tails = journal.load_tails(connection, user_ids)
+
+            for user in users:
+                tail = tails[user["id"]]
+                for mob in worlds[user["id"]]["mobs"]:
+                    changed = tail["mobs"].get(mob[0], {})
+                    mob[1:] = [
+                        changed.get(field, value)
+                        for field, value in zip(journal.LOGGED_MOB_FIELDS, mob[1:])
+                    ]
+                record = {**user, **tail["player"]}
+                if record["last_action"] is not None:
+                    record["last_action"] = record["last_action"].isoformat()
+                out.write(_dumps({"user": record, **worlds[user["id"]]}) + "\n")
+            count += len(users)
+            last_id = user_ids[-1]
+
+
+def import_worlds(engine: Engine, lines: Iterable[str], batch_size: int = 500) -> int:
+    """Insert players from NDJSON lines with bulk inserts, return their number."""
+    SQLModel.metadata.create_all(engine)
+    batches = {USERS: [], Mob.__table__: [], MapTile.__table__: [], InventoryItem.__table__: []}
+    count = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        user = record["user"]
+        if user.get("last_action"):
+            user["last_action"] = datetime.fromisoformat(user["last_action"])
+        user_id = user["id"]
+
+        batches[USERS].append(user)
+        batches[MapTile.__table__].extend(
+            {"x": x, "y": y, "tile_type": tile_type, "user_id": user_id}
+            for x, y, tile_type in record["tiles"]
+        )
+        batches[Mob.__table__].extend(
+            {"id": mob_id, "x": x, "y": y, "health": health, "user_id": user_id}
+            for mob_id, x, y, health in record["mobs"]
+        )
+        batches[InventoryItem.__table__].extend(
+            {"id": item_id, "name": name, "quantity": quantity, "owner_id": user_id, "mob_id": mob_id}
+            for item_id, name, quantity, mob_id in record["items"]
+        )
+        count += 1
+        if count % batch_size == 0:
+            _flush(engine, batches)
+    _flush(engine, batches)
+    return count
+
+
+def _flush(engine: Engine, batches: dict) -> None:
+    with engine.begin() as connection:
+        for table, rows in batches.items():
+            if rows:
+                connection.execute(insert(table), rows)
+                rows.clear()
+
+
+def main(argv: list[str] | None = None) -> None:
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="Export or import player worlds as NDJSON.")
+    parser.add_argument("command", choices=("export", "import"))
+    parser.add_argument("path", help="NDJSON file, '.gz' for gzip, '-' for stdin/stdout")
+    parser.add_argument("--database", help="database URL (default: the app database)")
+    parser.add_argument("--batch-size", type=int, default=500, help="players per batch")
+    args = parser.parse_args(argv)
+
+    engine = create_engine(args.database) if args.database else app_engine
+    started = time.perf_counter()
+    if args.command == "export":
+        with _open(args.path, "w") as out:
+            count = export_worlds(engine, out, args.batch_size)
+    else:
+        with _open(args.path, "r") as lines:
+            count = import_worlds(engine, lines, args.batch_size)
+    elapsed = time.perf_counter() - started
+    print(
+        f"{args.command}ed {count} players in {elapsed:.1f}s "
+        f"({count / elapsed if elapsed else 0:.0f} players/s)",
+        file=sys.stderr
+    )
+
+
+if __name__ == "__main__":
+    main()
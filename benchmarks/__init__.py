@@ -0,0 +1,5 @@
+"""Performance benchmarks.
+
+``python -m benchmarks`` runs the micro-benchmark suite against the stored
+baselines; ``python -m benchmarks.<name>`` runs a single scenario.
+"""
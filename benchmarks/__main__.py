@@ -0,0 +1,146 @@
+"""Run the micro-benchmarks and compare them with the stored baselines.
+
+Usage::
+
+    python -m benchmarks                  # compare, exit 1 on a regression
+    python -m benchmarks --update         # store the current results as baselines
+    python -m benchmarks -k engine --threshold 0.5
+
+Timings are the fastest of many single calls in microseconds and memory is
+the peak traced allocation of one call in KiB. Cases beyond a threshold are
+measured again before they count as regressions. Baselines depend on the
+machine: refresh them with ``--update`` on the hardware that runs the
+comparison, and raise ``--threshold`` on shared, noisy machines.
+"""
+import argparse
+import gc
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+from benchmarks.cases import CASES, Case
+
+BASELINES = Path(__file__).with_name("baselines.json")
+
+
+def measure(case: Case, budget: float = 0.5, min_calls: int = 7, max_calls: int = 2000) -> dict:
+    """Fastest time and peak memory of one call of a case.
+
+    The fastest call is the one least disturbed by other load on the
+    machine, which keeps results comparable between runs.
+    """
+    def call():
+        case.run()
+        if case.reset:
+            case.reset()
+
+    call()  # warm up caches and lazy imports
+    timings = []
+    spent = 0.0
+    gc.disable()
+    try:
+        while len(timings) < min_calls or (spent < budget and len(timings) < max_calls):
+            started = time.perf_counter()
+            case.run()
+            elapsed = time.perf_counter() - started
+            timings.append(elapsed)
+            spent += elapsed
+            if case.reset:
+                case.reset()
+    finally:
+        gc.enable()
+
+    tracemalloc.start()
+    case.run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    if case.reset:
+        case.reset()
+    return {
+        "time_us": round(min(timings) * 1e6, 2),
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def _cases(pattern: str = ""):
+    for name, (setup, variants) in CASES.items():
+        for params in variants or [{}]:
+            key = name + "".join(f"[{k}={v}]" for k, v in params.items())
+            if pattern in key:
+                yield key, setup, params
+
+
+def run_all(pattern: str = "", **limits) -> dict[str, dict]:
+    """Results of all cases whose key contains ``pattern``."""
+    return {key: measure(setup(**params), **limits) for key, setup, params in _cases(pattern)}
+
+
+def confirm(results: dict, keys: list[str], **limits) -> None:
+    """Measure the given cases again, keeping the better of both results."""
+    for key, setup, params in _cases():
+        if key in keys:
+            again = measure(setup(**params), **limits)
+            results[key] = {metric: min(value, again[metric]) for metric, value in results[key].items()}
+
+
+def compare(results: dict, baselines: dict, threshold: float, memory_threshold: float) -> list[str]:
+    """Keys of the results slower or larger than their baselines allow."""
+    regressions = []
+    for key, result in results.items():
+        baseline = baselines.get(key)
+        if baseline is None:
+            continue
+        if result["time_us"] > baseline["time_us"] * (1 + threshold) \
+                or result["peak_kib"] > baseline["peak_kib"] * (1 + memory_threshold):
+            regressions.append(key)
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Command line entry point, returns the exit status."""
+    parser = argparse.ArgumentParser(description="Micro-benchmarks of the game core.")
+    parser.add_argument("-k", dest="pattern", default="", help="only cases whose name contains this")
+    parser.add_argument("--threshold", type=float, default=0.3,
+                        help="allowed relative slowdown (default: 0.3)")
+    parser.add_argument("--memory-threshold", type=float, default=0.2,
+                        help="allowed relative growth of peak memory (default: 0.2)")
+    parser.add_argument("--retries", type=int, default=2,
+                        help="measure regressed cases again this many times (default: 2)")
+    parser.add_argument("--update", action="store_true", help="store the results as baselines")
+    args = parser.parse_args(argv)
+
+    baselines = json.loads(BASELINES.read_text()) if BASELINES.exists() else {}
+    results = run_all(args.pattern)
+    regressions = compare(results, baselines, args.threshold, args.memory_threshold)
+    # A slowdown only counts if it survives measuring again
+    for _ in range(args.retries):
+        if not regressions or args.update:
+            break
+        confirm(results, regressions)
+        regressions = compare(results, baselines, args.threshold, args.memory_threshold)
+
+    for key, result in results.items():
+        baseline = baselines.get(key)
+        if baseline:
+            change = f"{result['time_us'] / baseline['time_us'] - 1:+7.0%} " \
+                     f"{result['peak_kib'] / max(baseline['peak_kib'], 0.1) - 1:+7.0%}"
+        else:
+            change = "    new"
+        mark = "  REGRESSION" if key in regressions else ""
+        print(f"{key:<50} {result['time_us']:>11.1f} us {result['peak_kib']:>9.1f} KiB {change}{mark}")
+
+    if args.update:
+        baselines = {**baselines, **results}
+        BASELINES.write_text(json.dumps(baselines, indent=2, sort_keys=True) + "\n")
+        print(f"Baselines written to {BASELINES}")
+        return 0
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond the thresholds", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+"""Benchmarked functions of the game core, at several map sizes and mob counts.
+
+Every case builds its state against an in-memory SQLite database, like
+``tests/conftest.py``, and returns the call to measure plus an optional
+reset that puts the state back between calls without being timed.
+"""
+import itertools
+import random
+from typing import Callable, NamedTuple
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import update
+from sqlmodel import SQLModel, Session, create_engine, select
+from sqlmodel.pool import StaticPool
+
+from app import engine as game
+from app.area_effects import Area
+from app.auth import create_access_token, get_current_user
+from app.engine import GameWorld, MoveResult, Player, WALL
+from app.models import User, InventoryItem, MapTile, Mob
+from app.routes import game as routes
+
+MAP_SIZES = (20, 50, 100)
+MOB_COUNTS = (5, 50)
+
+
+class Case(NamedTuple):
+    """Call to measure and the reset to run after each call."""
+    run: Callable[[], object]
+    reset: Callable[[], None] | None = None
+
+
+CASES: dict[str, tuple[Callable[..., Case], list[dict]]] = {}
+
+
+def benchmark(name: str, **params: tuple) -> Callable:
+    """Register a case for every combination of the parameter values."""
+    def register(setup: Callable[..., Case]) -> Callable[..., Case]:
+        keys = list(params)
+        CASES[name] = (setup, [dict(zip(keys, values)) for values in itertools.product(*params.values())])
+        return setup
+    return register
+
+
+def _session() -> Session:
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    SQLModel.metadata.create_all(engine)
+    return Session(engine)
+
+
+def _world(size: int, mobs: int) -> GameWorld:
+    world = GameWorld(rng=random.Random(size * 1000 + mobs))
+    world.generate(size, size, mobs)
+    return world
+
+
+def _player_with_map(db: Session, size: int, mobs: int) -> tuple[User, GameWorld]:
+    user = User(username="bench", hashed_password="")
+    db.add(user)
+    db.commit()
+    world = _world(size, mobs)
+    routes._store_new_map(db, user, world)
+    return user, world
+
+
+def _run_sync(coroutine):
+    """Result of a coroutine that never suspends, without an event loop."""
+    try:
+        coroutine.send(None)
+    except StopIteration as stop:
+        return stop.value
+    raise RuntimeError("Coroutine suspended")
+
+
+@benchmark("engine.move_mobs", size=MAP_SIZES, mobs=MOB_COUNTS)
+def move_mobs(size: int, mobs: int) -> Case:
+    """One mob turn: every mob steps towards the player."""
+    world = _world(size, mobs)
+    world.player = Player(x=size // 2, y=size // 2)
+    start = [(mob.x, mob.y) for mob in world.mobs]
+
+    def reset():
+        for mob, (x, y) in zip(world.mobs, start):
+            mob.x, mob.y = x, y
+        world.player.health = 100
+
+    return Case(lambda: world._move_mobs(MoveResult()), reset)
+
+
+@benchmark("engine.move", size=MAP_SIZES, mobs=MOB_COUNTS)
+def move(size: int, mobs: int) -> Case:
+    """A move command: player step plus the mob turn."""
+    world = _world(size, mobs)
+    start = [(mob.x, mob.y) for mob in world.mobs]
+
+    def reset():
+        world.reset_player()
+        for mob, (x, y) in zip(world.mobs, start):
+            mob.x, mob.y = x, y
+
+    return Case(lambda: world.move("right"), reset)
+
+
+@benchmark("routes.move_player", size=MAP_SIZES, mobs=MOB_COUNTS)
+def move_player(size: int, mobs: int) -> Case:
+    """``/game/move`` with its database work: load the world, store the step."""
+    db = _session()
+    user = User(username="bench", hashed_password="")
+    db.add(user)
+    db.commit()
+    world = _world(size, mobs)
+    # A plain step from a free start, not an attack
+    world.mobs = [mob for mob in world.mobs if (mob.x, mob.y) not in ((0, 0), (1, 0))]
+    routes._store_new_map(db, user, world)
+    start = [{"id": mob.id, "x": mob.x, "y": mob.y} for mob in world.mobs]
+    direction = routes.MoveDirection(direction="right")
+
+    def reset():
+        # The mobs stepped towards the player, put them back with the player
+        db.execute(update(Mob), start)
+        user.x = user.y = 0
+        user.health = 100
+        user.is_active = True
+        db.commit()
+
+    return Case(lambda: routes.move_player(direction, db=db, user=user), reset)
+
+
+@benchmark("routes.generate_map", size=MAP_SIZES, mobs=MOB_COUNTS)
+def generate_map(size: int, mobs: int) -> Case:
+    """Generating and storing a new map, as ``/game/generate_map`` does."""
+    db = _session()
+    user, _ = _player_with_map(db, size, mobs)
+
+    def run():
+        world = GameWorld(size, size, routes._player_of(user))
+        world.generate(size, size, mobs)
+        routes._store_new_map(db, user, world)
+
+    return Case(run)
+
+
+@benchmark("routes.use_wallbreaker", size=MAP_SIZES)
+def use_wallbreaker(size: int) -> Case:
+    """``/game/use-wallbreaker`` on a map with walls next to the player."""
+    db = _session()
+    user, world = _player_with_map(db, size, 0)
+    walls = []
+    for x, y in itertools.chain(
+        Area.square(0, 0, 1).clip(size, size).cells(),
+        Area.square(size - 1, size - 1, 1).clip(size, size).cells(),
+    ):
+        if world.tile_at(x, y) == WALL or (x, y) == (1, 1):
+            walls.append((x, y))
+    rows = [
+        {"id": tile_id, "tile_type": "wall"}
+        for tile_id, x, y in db.execute(
+            select(MapTile.id, MapTile.x, MapTile.y).where(MapTile.user_id == user.id)
+        )
+        if (x, y) in walls
+    ]
+    db.execute(update(MapTile), rows)
+    db.commit()
+
+    def reset():
+        db.execute(update(MapTile), rows)
+        db.add(InventoryItem(name=game.WALLBREAKER, owner_id=user.id))
+        db.commit()
+
+    return Case(lambda: routes.use_wallbreaker(db=db, user=user), reset)
+
+
+@benchmark("routes.get_game_state", size=MAP_SIZES, mobs=MOB_COUNTS)
+def get_game_state(size: int, mobs: int) -> Case:
+    """``/game/state`` including its JSON rendering."""
+    db = _session()
+    user, _ = _player_with_map(db, size, mobs)
+    return Case(lambda: JSONResponse(jsonable_encoder(routes.get_game_state(db=db, user=user))))
+
+
+@benchmark("auth.get_current_user")
+def current_user() -> Case:
+    """Token check and user lookup of every authenticated request."""
+    db = _session()
+    db.add(User(username="bench", hashed_password=""))
+    db.commit()
+    token = create_access_token({"sub": "bench"})
+    return Case(lambda: _run_sync(get_current_user(token, db)))
+
@@ -0,0 +1,71 @@
+"""Shared world with 1,000 players on one map.
+
+Every round each player makes one random move. The report shows moves per
+second and how many players each move was sent to; a second run with four
+times the players on a four times larger map shows that the cost per move
+follows the local density, not the player count.
+
+Usage::
+
+    python -m benchmarks.shared_world [--players 1000] [--rounds 20]
+"""
+import argparse
+import random
+import time
+
+from app.config import settings
+from app.engine import DIRECTIONS, GameError
+from app.models import User
+from app.shared_world import SharedWorld
+
+
+def run(players: int, size: int, rounds: int, seed: int = 0) -> dict:
+    """Play ``rounds`` rounds on one shard, return throughput and fan-out."""
+    rng = random.Random(seed)
+    world = SharedWorld(0, size=size, mob_count=players // 2, rng=random.Random(seed))
+    for user_id in range(1, players + 1):
+        world.join(User(id=user_id, username=f"bot{user_id}", hashed_password=""))
+    for user_id in world.players:
+        world.view(user_id)
+
+    directions = list(DIRECTIONS)
+    moves = delivered = 0
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for user_id in world.players:
+            try:
+                world.move(user_id, rng.choice(directions))
+            except GameError:
+                continue
+            moves += 1
+        for user_id in world.players:
+            delivered += len(world.updates(user_id)["updates"])
+    elapsed = time.perf_counter() - started
+    return {
+        "players": players,
+        "map": f"{size}x{size}",
+        "moves/s": moves / elapsed,
+        "updates/move": delivered / max(moves, 1),
+    }
+
+
+def main(argv: list[str] | None = None) -> None:
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    size = settings.shared_map_size
+    print(f"view radius {settings.shared_view_radius}, {args.rounds} rounds")
+    for scale in (1, 2):
+        result = run(args.players * scale * scale, size * scale, args.rounds)
+        print(
+            f"{result['players']:>6} players on {result['map']:>9}: "
+            f"{result['moves/s']:>9.0f} moves/s, {result['updates/move']:.1f} updates/move "
+            f"(broadcast to all: {result['players'] - 1})"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,26 @@ from sqlmodel import SQLModel, create_engine, Session
 from sqlmodel.pool import StaticPool
 
 from app.main import app
+from app.actors import actors
 from app.database import get_session
+from app.events import bus
+from app.idempotency import idempotency_cache
+from app.leaderboard import leaderboard
+from app.ratelimit import rate_limiter
+from app.response_cache import response_cache
+from app.shared_world import shared_worlds
+
+
+@pytest.fixture(autouse=True)
+def reset_app_state():
+    leaderboard.clear()
+    rate_limiter.clear()
+    actors.clear()
+    response_cache.clear()
+    shared_worlds.clear()
+    idempotency_cache.clear()
+    bus.clear()
+    yield
 
 
 @pytest.fixture(name="session")
@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from sqlmodel import Session
+
+from app.actors import ActorRegistry, command_version
+from app.config import settings
+from app.models import User
+
+
+def test_commands_of_one_player_run_serially():
+    registry = ActorRegistry()
+    log = []
+
+    async def command(player, name):
+        async with registry.turn(player):
+            log.append(f"{name} start")
+            await asyncio.sleep(0.01)
+            log.append(f"{name} end")
+
+    async def scenario():
+        await asyncio.gather(
+            command("alice", "a1"),
+            command("alice", "a2"),
+            command("bob", "b1"),
+        )
+
+    asyncio.run(scenario())
+    assert log.index("a1 end") < log.index("a2 start")
+    # Another player is not queued behind alice
+    assert log.index("b1 start") < log.index("a1 end")
+
+    metrics = registry.metrics()
+    assert metrics["commands"] == 3
+    assert metrics["max_queue_depth"] == 1
+    assert metrics["max_wait_ms"] > 0
+    assert metrics["active_players"] == 0
+
+
+def test_actor_metrics_endpoint(client):
+    client.post("/auth/register", json={"username": "testuser", "password": "testpass"})
+    token = client.post(
+        "/auth/login",
+        data={"username": "testuser", "password": "testpass"}
+    ).json()["access_token"]
+    client.post("/game/reset", headers={"Authorization": f"Bearer {token}"})
+
+    response = client.get("/metrics/actors")
+    assert response.status_code == 200
+    assert response.json()["commands"] == 1
+    assert response.json()["queued_commands"] == 0
+
+
+def test_command_overtaken_by_another_worker_is_rejected(session, monkeypatch):
+    monkeypatch.setattr(settings, "cache_sync_enabled", True)
+    user = User(username="alice", hashed_password="")
+    session.add(user)
+    session.commit()
+
+    command = command_version(db=session, user=user)
+    next(command)
+    user.x = 1
+    session.commit()
+    user.x = 2
+    session.commit()
+    assert user.version == 2
+    command.close()
+
+    command = command_version(db=session, user=user)
+    next(command)
+    # Another worker runs a command of the same player meanwhile
+    with Session(session.get_bind()) as other:
+        other.get(User, user.id).version += 1
+        other.commit()
+    user.x = 3
+    with pytest.raises(HTTPException) as error:
+        session.commit()
+    assert error.value.status_code == 409
+    session.rollback()
+    command.close()
+    session.refresh(user)
+    assert (user.x, user.version) == (2, 3)
@@ -0,0 +1,74 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import event
+from sqlmodel import select
+
+from app.area_effects import Area, change_tiles
+from app.models import User, MapTile, InventoryItem
+
+
+@pytest.fixture
+def auth_token(client):
+    client.post("/auth/register", json={"username": "testuser", "password": "testpass"})
+    response = client.post(
+        "/auth/login",
+        data={"username": "testuser", "password": "testpass"}
+    )
+    return response.json()["access_token"]
+
+
+def test_area_shapes():
+    square = Area.square(5, 5, 2)
+    circle = Area.circle(5, 5, 2)
+    assert square.contains(7, 7)
+    assert not circle.contains(7, 7)
+    assert circle.contains(5, 7)
+
+    clipped = Area.square(0, 0, 1).clip(20, 20)
+    assert (clipped.x1, clipped.y1, clipped.x2, clipped.y2) == (0, 0, 1, 1)
+
+
+def test_range_update_changes_only_area_tiles(session):
+    user = User(username="builder", hashed_password="")
+    session.add(user)
+    session.commit()
+    for x in range(10):
+        for y in range(10):
+            tile_type = "exit" if (x, y) == (1, 1) else "wall"
+            session.add(MapTile(x=x, y=y, tile_type=tile_type, user_id=user.id))
+    session.commit()
+
+    areas = [Area.square(1, 1, 1), Area.circle(7, 7, 2)]
+    change_tiles(session, user.id, areas, "floor", from_type="wall")
+    session.commit()
+    floors = session.exec(select(MapTile).where(MapTile.tile_type == "floor")).all()
+    assert len(floors) == 8 + 13
+    assert all(any(area.contains(tile.x, tile.y) for area in areas) for tile in floors)
+
+
+def test_wallbreaker_uses_constant_queries(client, auth_token, session):
+    user = session.exec(select(User)).first()
+    # Activity is written at most once a minute, not by this request
+    user.last_action = datetime.now()
+    session.add(InventoryItem(name="Стенолом", owner_id=user.id, quantity=1))
+    for x in range(20):
+        for y in range(20):
+            session.add(MapTile(x=x, y=y, tile_type="wall", user_id=user.id))
+    session.add(MapTile(x=19, y=19, tile_type="exit", user_id=user.id))
+    session.commit()
+
+    statements = []
+    engine = session.get_bind()
+    listener = lambda *args: statements.append(args[2])
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        response = client.put(
+            "/game/use-wallbreaker",
+            headers={"Authorization": f"Bearer {auth_token}"}
+        )
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+    assert response.json()["message"] == "Уничтожено 7 стен!"
+    assert len(statements) <= 6
@@ -1,3 +1,6 @@
+from app.config import settings
+
+
 def test_register(client):
     response = client.post(
         "/auth/register",
@@ -29,4 +32,54 @@ def test_login_invalid_credentials(client):
         "/auth/login",
         data={"username": "wronguser", "password": "wrongpass"}
     )
-    assert response.status_code == 401
\ No newline at end of file
+    assert response.status_code == 401
+
+def login_tokens(client):
+    client.post("/auth/register", json={"username": "testuser", "password": "testpass"})
+    return client.post(
+        "/auth/login",
+        data={"username": "testuser", "password": "testpass"}
+    ).json()
+
+def test_refresh_rotates_token(client):
+    tokens = login_tokens(client)
+    response = client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 200
+    renewed = response.json()
+    assert renewed["refresh_token"] != tokens["refresh_token"]
+
+    headers = {"Authorization": f"Bearer {renewed['access_token']}"}
+    assert client.get("/game/upgrades", headers=headers).status_code == 200
+
+def test_refresh_reuse_revokes_session(client, monkeypatch):
+    monkeypatch.setattr(settings, "refresh_token_reuse_grace_seconds", 0)
+    tokens = login_tokens(client)
+    renewed = client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]}).json()
+
+    reused = client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert reused.status_code == 401
+    # The stolen chain is dead for its owner too
+    response = client.post("/auth/refresh", json={"refresh_token": renewed["refresh_token"]})
+    assert response.status_code == 401
+
+def test_refresh_retry_in_grace_window_gets_same_token(client):
+    tokens = login_tokens(client)
+    first = client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]}).json()
+
+    # A second request of the same client raced the first one
+    second = client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert second.status_code == 200
+    assert second.json()["refresh_token"] == first["refresh_token"]
+    renewed = client.post("/auth/refresh", json={"refresh_token": first["refresh_token"]})
+    assert renewed.status_code == 200
+
+    # Only the token rotated last gets the grace window
+    response = client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 401
+
+def test_logout_revokes_refresh_token(client):
+    tokens = login_tokens(client)
+    assert client.post("/auth/logout", json={"refresh_token": tokens["refresh_token"]}).status_code == 200
+    response = client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 401
+    assert client.post("/auth/refresh", json={"refresh_token": "garbage"}).status_code == 401
@@ -0,0 +1,25 @@
+from benchmarks.__main__ import compare, measure
+from benchmarks.cases import CASES
+
+
+def test_every_case_runs():
+    for setup, variants in CASES.values():
+        params = variants[0] if variants else {}
+        result = measure(setup(**params), budget=0, min_calls=1)
+        assert result["time_us"] > 0
+        assert result["peak_kib"] >= 0
+
+
+def test_compare_flags_time_and_memory():
+    baselines = {
+        "a": {"time_us": 100, "peak_kib": 10},
+        "b": {"time_us": 100, "peak_kib": 10},
+        "c": {"time_us": 100, "peak_kib": 10},
+    }
+    results = {
+        "a": {"time_us": 120, "peak_kib": 10},
+        "b": {"time_us": 140, "peak_kib": 10},
+        "c": {"time_us": 90, "peak_kib": 13},
+        "new": {"time_us": 1000, "peak_kib": 1000},
+    }
+    assert compare(results, baselines, threshold=0.3, memory_threshold=0.2) == ["b", "c"]
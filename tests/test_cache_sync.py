@@ -0,0 +1,98 @@
+import pytest
+from sqlmodel import SQLModel, Session, create_engine, delete
+
+from app.cache_sync import CacheSync
+from app.leaderboard import Leaderboard
+from app.models import CacheInvalidation, User
+from app.response_cache import ResponseCache, response_cache
+
+
+@pytest.fixture(name="workers")
+def workers_fixture(tmp_path):
+    # Two workers: own caches, one database file
+    engine = create_engine(f"sqlite:///{tmp_path / 'game.db'}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as db:
+        db.add_all([User(username="alice", hashed_password=""), User(username="bob", hashed_password="")])
+        db.commit()
+    workers = [CacheSync(engine, ResponseCache(), Leaderboard()) for _ in range(2)]
+    for worker in workers:
+        worker.start()
+        with Session(engine) as db:
+            worker.board.ensure_loaded(db)
+    yield engine, workers
+    for worker in workers:
+        worker.stop()
+    engine.dispose()
+
+
+def test_invalidations_reach_other_workers(workers):
+    engine, (first, second) = workers
+    first.cache.put(1, "inventory", first.cache.version(1), b"{}")
+    second.cache.put(1, "inventory", second.cache.version(1), b"{}")
+    version = second.cache.version(1)
+
+    with Session(engine) as db:
+        alice = db.get(User, 1)
+        alice.killed_mobs = 5
+        db.commit()
+        first.board.update(alice)
+    first.cache.bump(1)
+    first.sync()
+    second.sync()
+
+    assert second.cache.version(1) != version
+    assert second.cache.get(1, "inventory", second.cache.version(1)) is None
+    assert second.board.top(1) == [{"rank": 1, "username": "alice", "killed_mobs": 5}]
+    # Nothing comes back to the worker that sent it
+    version = first.cache.version(1)
+    first.sync()
+    assert first.cache.version(1) == version
+    assert (first.sent, second.received) == (1, 1)
+
+    with Session(engine) as db:
+        db.delete(db.get(User, 2))
+        db.commit()
+    first.cache.bump(2)
+    first.sync()
+    second.sync()
+    assert len(second.board) == 1
+
+
+def test_missed_invalidations_drop_the_caches(workers):
+    engine, (first, second) = workers
+    first.cache.bump(1)
+    first.sync()
+    second.sync()
+    second.cache.put(2, "inventory", second.cache.version(2), b"{}")
+
+    # The second worker stalled while older rows were trimmed
+    first.cache.bump(1)
+    first.sync()
+    with Session(engine) as db:
+        db.exec(delete(CacheInvalidation))
+        db.commit()
+    first.cache.bump(1)
+    first.sync()
+    second.sync()
+
+    assert second.resets == 1
+    assert second.cache.get(2, "inventory", second.cache.version(2)) is None
+    assert not second.board.loaded
+
+
+def test_idle_sync_reports_no_activity(workers):
+    _, (first, second) = workers
+    first.sync()
+    second.sync()
+    assert not second.sync()
+    first.cache.bump(1)
+    assert first.sync()
+    assert second.sync()
+    assert not second.sync()
+
+
+def test_registration_reaches_other_workers(client, monkeypatch):
+    monkeypatch.setattr(response_cache, "outbox", set())
+    client.post("/auth/register", json={"username": "newcomer", "password": "testpass"})
+    assert response_cache.take_outbox() == {1}
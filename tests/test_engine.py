@@ -0,0 +1,130 @@
+import random
+
+import pytest
+
+from app.engine import GameWorld, GameError, MobState, Player, apply_upgrades, MOB_LOOT
+
+
+def make_world(rows, mobs=(), **player):
+    """World from ASCII rows: '.' floor, '#' wall, 'E' exit, ' ' no tile."""
+    tiles = [
+        (x, y, {".": "floor", "#": "wall", "E": "exit"}[char])
+        for y, row in enumerate(rows)
+        for x, char in enumerate(row)
+        if char != " "
+    ]
+    return GameWorld.from_tiles(
+        tiles,
+        [MobState(i, x, y) for i, (x, y) in enumerate(mobs, start=1)],
+        Player(**player),
+        rng=random.Random(0)
+    )
+
+
+def test_move_and_walls():
+    world = make_world(["..#"])
+    assert world.move("right").outcome == "move"
+    assert (world.player.x, world.player.y) == (1, 0)
+
+    with pytest.raises(GameError, match="Invalid move"):
+        world.move("right")
+    with pytest.raises(GameError, match="Invalid direction"):
+        world.move("jump")
+
+
+def test_attack_kills_and_upgrades():
+    world = make_world([".."], mobs=[(1, 0)], base_attack=50)
+    result = world.move("right")
+
+    assert result.outcome == "attack"
+    assert result.killed
+    assert result.loot[0] == MOB_LOOT
+    assert world.mobs == []
+    assert (world.player.x, world.player.y) == (0, 0)
+    assert world.player.killed_mobs == 1
+    assert world.player.upgrade_level == 1
+    assert world.player.bonus_attack == 5
+
+
+def test_mobs_chase_and_hit():
+    world = make_world(["....."], mobs=[(4, 0)])
+    result = world.move("right")
+    assert [(mob.x, mob.y) for mob in result.moved] == [(3, 0)]
+
+    world.move("right")
+    assert world.player.health == 90
+
+
+def test_death_and_win():
+    world = make_world(["..", ".."], mobs=[(1, 1)], health=10)
+    world.wallbreakers = 2
+    result = world.move("down")
+    assert result.status == "lose"
+    assert not world.player.is_active
+    assert world.wallbreakers == 0
+
+    world = make_world([".E"])
+    assert world.move("right").status == "win"
+    with pytest.raises(GameError, match="Game over!"):
+        world.move("left")
+
+
+def test_wallbreaker_in_grid():
+    world = make_world([
+        ".#...",
+        "##...",
+        ".....",
+        "...##",
+        "...#E",
+    ])
+    world.wallbreakers = 1
+    assert world.use_wallbreaker() == [(0, 1), (1, 0), (1, 1), (3, 3), (3, 4), (4, 3)]
+    assert world.wallbreakers == 0
+    with pytest.raises(GameError):
+        world.use_wallbreaker()
+
+
+def test_generated_world_and_rows():
+    world = GameWorld(rng=random.Random(42))
+    world.restart()
+    rows = list(world.tile_rows())
+
+    assert len(rows) == 20 * 20 + 1
+    assert rows[-1] == (19, 19, "exit")
+    assert len(world.mobs) == 5
+    assert world.wallbreakers == 1
+    assert all(world.is_passable(mob.x, mob.y) for mob in world.mobs)
+
+    copy = GameWorld.from_tiles(rows, [], Player())
+    assert copy.cells == world.cells
+
+
+def test_upgrade_milestones():
+    player = Player(killed_mobs=1)
+    assert apply_upgrades(player)
+    assert not apply_upgrades(player)
+    player.killed_mobs = 2
+    assert apply_upgrades(player)
+    assert player.health == 100 + 20 + 40
+
+
+def test_line_of_sight_and_reveal():
+    world = make_world([
+        "...#...",
+        "...#...",
+        ".......",
+    ])
+    assert world.in_sight(3, 0, 4)
+    assert not world.in_sight(4, 0, 4)
+    assert world.in_sight(4, 2, 5)
+    assert not world.in_sight(4, 2, 4)
+    assert not world.in_sight(0, 2, 1)
+
+    explored = bytearray((world.width * world.height + 7) // 8)
+    revealed = world.reveal(explored, 4)
+    assert (3, 0) in revealed and (4, 0) not in revealed
+    assert world.reveal(explored, 4) == []
+
+    world.move("down")
+    world.move("down")
+    assert set(world.reveal(explored, 4)).isdisjoint(revealed)
@@ -0,0 +1,202 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import SQLModel, Session, create_engine, delete, select
+
+from app import database, engine as game, events, journal
+from app.config import settings
+from app.database import get_session
+from app.events import EventBus, MobKilled, PlayerDied
+from app.main import app
+from app.models import User, MapTile, Mob, InventoryItem, PendingEvent
+from app.subscribers import store_world_changes
+
+
+@pytest.fixture(name="file_engine")
+def file_engine_fixture(tmp_path):
+    # Handlers run in parallel, each on its own connection
+    engine = create_engine(f"sqlite:///{tmp_path / 'game.db'}")
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+def test_bus_batches_events_and_settles_players(file_engine, monkeypatch):
+    monkeypatch.setattr(settings, "event_batch_delay_ms", 50)
+    bus = EventBus(lambda: Session(file_engine))
+    session = Session(file_engine)
+    batches = []
+
+    @bus.subscribe(MobKilled)
+    def collect(_db, events):
+        batches.append(events)
+
+    @bus.subscribe(MobKilled)
+    def fail(_db, events):
+        raise RuntimeError("broken consumer")
+
+    def command():
+        for i in range(6):
+            bus.publish(session, MobKilled(1, f"player{i % 2}", i))
+        session.commit()
+
+    async def scenario():
+        await bus.start()
+        # Routes publish from threadpool workers
+        thread = threading.Thread(target=command)
+        thread.start()
+        thread.join()
+        await bus.settled("player0")
+        await bus.settled("player1")
+        assert bus.metrics()["queued"] == 0
+        await bus.stop()
+
+    asyncio.run(scenario())
+    assert [[event.mob_id for event in batch] for batch in batches] == [list(range(6))]
+    # The failed batch was retried event by event and stays pending
+    assert bus.failed == 6
+    handlers = [row.handler for row in session.exec(select(PendingEvent))]
+    assert handlers == [f"{fail.__module__}.{fail.__qualname__}"] * 6
+    assert not bus.running
+    assert bus.metrics()["published"] == {"MobKilled": 6}
+
+
+def test_pending_events_are_replayed_once(file_engine):
+    session = Session(file_engine)
+    seen = []
+
+    def collect(_db, events):
+        seen.extend(events)
+
+    # Left by a worker that stopped before handling it
+    session.add(PendingEvent(
+        handler=f"{collect.__module__}.{collect.__qualname__}",
+        player="player",
+        kind="MobKilled",
+        data='[1,"player",7,["Mob Loot"]]'
+    ))
+    session.commit()
+    buses = [EventBus(lambda: Session(file_engine)) for _ in range(2)]
+    for bus in buses:
+        bus.subscribe(MobKilled)(collect)
+
+    async def scenario():
+        for bus in buses:
+            await bus.start()
+        for bus in buses:
+            await bus.settled("player")
+            await bus.stop()
+
+    asyncio.run(scenario())
+    assert seen == [MobKilled(1, "player", 7, (game.MOB_LOOT,))]
+    assert session.exec(select(PendingEvent)).all() == []
+
+
+def test_settled_waits_for_events_of_other_workers(file_engine, monkeypatch):
+    monkeypatch.setattr(settings, "cache_sync_enabled", True)
+    session = Session(file_engine)
+    session.add_all([
+        PendingEvent(handler="other.worker", player="player", kind="MobKilled", data="[]"),
+        PendingEvent(handler="other.worker", player="failed", kind="MobKilled", data="[]", failed=True),
+    ])
+    session.commit()
+    bus = EventBus(lambda: Session(file_engine))
+
+    async def scenario():
+        await bus.start()
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(bus.settled("player"), 0.05)
+        # A failed event does not hold up its player
+        await asyncio.wait_for(bus.settled("failed"), 0.05)
+        session.exec(delete(PendingEvent).where(PendingEvent.player == "player"))
+        session.commit()
+        await asyncio.wait_for(bus.settled("player"), 0.05)
+        await bus.stop()
+
+    asyncio.run(scenario())
+
+
+def test_rolled_back_events_are_not_delivered(session):
+    bus = EventBus(lambda: session)
+    seen = []
+    bus.subscribe(MobKilled)(lambda db, events: seen.extend(events))
+
+    async def scenario():
+        await bus.start()
+        bus.publish(session, MobKilled(1, "player", 7))
+        session.rollback()
+        await asyncio.sleep(0.01)
+        await bus.stop()
+
+    asyncio.run(scenario())
+    assert seen == []
+    assert session.exec(select(PendingEvent)).all() == []
+
+
+def test_running_app_delivers_events(session, monkeypatch):
+    monkeypatch.setattr(settings, "reaper_enabled", False)
+    monkeypatch.setattr(database, "engine", session.get_bind())
+    monkeypatch.setattr(events, "engine", session.get_bind())
+    monkeypatch.setitem(app.dependency_overrides, get_session, lambda: session)
+
+    with TestClient(app) as client:
+        assert events.bus.running
+        client.post("/auth/register", json={"username": "testuser", "password": "testpass"})
+        token = client.post(
+            "/auth/login", data={"username": "testuser", "password": "testpass"}
+        ).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        client.get("/game/state", headers=headers)
+        for mob in session.exec(select(Mob)).all():
+            session.delete(mob)
+        session.add(Mob(x=1, y=0, user_id=1, health=10))
+        session.commit()
+
+        client.post("/game/move", json={"direction": "right"}, headers=headers)
+        # Waits for the loot of the kill
+        items = client.get("/inventory", headers=headers).json()["items"]
+        assert game.MOB_LOOT in [item["name"] for item in items]
+        assert session.exec(select(PendingEvent)).all() == []
+
+    assert not events.bus.running
+
+
+def test_bus_handles_events_at_once_when_stopped(session):
+    bus = EventBus(lambda: session)
+    seen = []
+    bus.subscribe(MobKilled)(lambda db, events: seen.extend(events))
+
+    bus.publish(session, MobKilled(1, "player", 7))
+    bus.publish(session, PlayerDied(1, "player"))
+    assert seen == [MobKilled(1, "player", 7)]
+
+
+def test_world_changes_are_written_per_batch(session, monkeypatch):
+    monkeypatch.setattr(settings, "action_log_enabled", True)
+    killer = User(username="killer", hashed_password="")
+    victim = User(username="victim", hashed_password="", health=0, is_active=False)
+    session.add_all([killer, victim])
+    session.commit()
+    session.add(InventoryItem(name=game.MOB_LOOT, owner_id=victim.id))
+    session.commit()
+
+    store_world_changes(session, [
+        MobKilled(killer.id, killer.username, 3, (game.MOB_LOOT, game.WALLBREAKER)),
+        PlayerDied(victim.id, victim.username),
+    ])
+
+    names = session.exec(
+        select(InventoryItem.name).where(InventoryItem.owner_id == killer.id)
+    ).all()
+    assert sorted(names) == sorted([game.MOB_LOOT, game.WALLBREAKER])
+    # The dead player starts again on a new map with a fresh wallbreaker
+    items = session.exec(select(InventoryItem).where(InventoryItem.owner_id == victim.id)).all()
+    assert [item.name for item in items] == [game.WALLBREAKER]
+    session.refresh(victim)
+    assert (victim.x, victim.y, victim.is_active) == (0, 0, True)
+    assert session.exec(select(MapTile).where(MapTile.user_id == victim.id)).first()
+    assert session.exec(select(Mob).where(Mob.user_id == victim.id)).first()
+    assert session.exec(select(MapTile).where(MapTile.user_id == killer.id)).first() is None
+    assert journal.rebuild_world(session, victim.id) == journal.capture_world(session, victim)
@@ -0,0 +1,73 @@
+import pytest
+from sqlmodel import select, update, delete
+
+from app.config import settings
+from app.models import InventoryItem, MapTile, Mob, ExploredMap
+
+
+@pytest.fixture
+def headers(client, session, monkeypatch):
+    monkeypatch.setattr(settings, "fog_of_war", True)
+    monkeypatch.setattr(settings, "sight_radius", 2)
+    client.post("/auth/register", json={"username": "testuser", "password": "testpass"})
+    token = client.post(
+        "/auth/login",
+        data={"username": "testuser", "password": "testpass"}
+    ).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    client.get("/game/state", headers=headers)
+    session.exec(update(MapTile).values(tile_type="floor"))
+    session.exec(delete(Mob))
+    session.exec(delete(ExploredMap))
+    session.add(Mob(x=5, y=0, user_id=1))
+    session.commit()
+    return headers
+
+
+def cells(tiles):
+    return {(tile["x"], tile["y"]) for tile in tiles}
+
+
+def test_state_shows_only_explored_tiles(client, headers, session):
+    state = client.get("/game/state", headers=headers).json()
+    assert cells(state["tiles"]) == {(0, 0), (1, 0), (2, 0), (0, 1), (1, 1), (0, 2)}
+    assert state["mobs"] == []
+    assert len(session.exec(select(ExploredMap)).one().bits) == 50
+
+
+def test_move_returns_newly_revealed_tiles(client, headers):
+    client.get("/game/state", headers=headers)
+    response = client.post("/game/move", json={"direction": "right"}, headers=headers).json()
+
+    assert cells(response["revealed"]) == {(3, 0), (2, 1), (1, 2)}
+    assert response["mobs"] == []
+
+    response = client.post("/game/move", json={"direction": "right"}, headers=headers).json()
+    assert cells(response["revealed"]) == {(4, 0), (3, 1), (2, 2)}
+    # The mob came one step closer and is now in sight
+    assert response["mobs"] == [{"x": 4, "y": 0}]
+
+    state = client.get("/game/state", headers=headers).json()
+    assert len(state["tiles"]) == 12
+
+
+def test_wallbreaker_redraws_explored_walls(client, headers, session):
+    session.add(InventoryItem(name="Стенолом", owner_id=1, quantity=1))
+    session.exec(update(MapTile).where(MapTile.x + MapTile.y == 2).values(tile_type="wall"))
+    session.exec(update(MapTile).where(MapTile.x == 19, MapTile.y == 18).values(tile_type="wall"))
+    session.exec(update(MapTile).where(MapTile.x == 19, MapTile.y == 19).values(tile_type="exit"))
+    session.commit()
+    client.get("/game/state", headers=headers)
+    client.post("/game/move", json={"direction": "right"}, headers=headers)
+
+    response = client.put("/game/use-wallbreaker", headers=headers).json()
+    # The wall next to the exit was never seen and stays hidden
+    assert response["message"] == "Уничтожено 3 стен!"
+    assert cells(response["tiles"]) == {(2, 0), (1, 1)}
+    assert {tile["type"] for tile in response["tiles"]} == {"floor"}
+
+
+def test_new_map_resets_fog(client, headers, session):
+    client.get("/game/state", headers=headers)
+    client.post("/game/generate_map", headers=headers)
+    assert session.exec(select(ExploredMap)).first() is None
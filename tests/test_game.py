@@ -211,17 +211,89 @@ def test_mob_movement(client, auth_token,session):
 
 
 def test_upgrade_system(client, auth_token, session):
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    client.get("/game/state", headers=headers)
     user = session.exec(select(User)).first()
-    user.killed_mobs += 4
+    for mob in session.exec(select(Mob)).all():
+        session.delete(mob)
+    # Моб с одним ударом до смерти справа от игрока
+    session.add(Mob(x=1, y=0, user_id=user.id, health=10))
     session.commit()
 
-    # Добавьте вызов apply_upgrades
-    from app.routes.game import apply_upgrades
-    apply_upgrades(user, session)
+    # Первое убийство дает первое улучшение
+    client.post("/game/move", json={"direction": "right"}, headers=headers)
 
     response = client.get(
         "/game/upgrades",
         headers={"Authorization": f"Bearer {auth_token}"}
     )
     assert response.status_code == 200
-    assert response.json()["bonus_attack"] > 0
\ No newline at end of file
+    assert response.json()["bonus_attack"] > 0
+
+
+def test_upgrades_not_modified(client, auth_token, session):
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    response = client.get("/game/upgrades", headers=headers)
+    etag = response.headers["etag"]
+    assert response.json()["bonus_attack"] == 0
+
+    response = client.get("/game/upgrades", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
+
+    user = session.exec(select(User)).first()
+    user.base_attack = 50
+    session.add(MapTile(x=1, y=0, tile_type="floor", user_id=user.id))
+    session.add(Mob(x=1, y=0, user_id=user.id, health=50))
+    session.commit()
+    client.post("/game/move", json={"direction": "right"}, headers=headers)
+
+    response = client.get("/game/upgrades", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["bonus_attack"] == 5
+
+
+def test_upgrades_built_after_version(client, auth_token, session, monkeypatch):
+    from sqlmodel import update
+    from app.response_cache import response_cache
+
+    version = response_cache.version
+    user = session.exec(select(User)).first()
+
+    def commit_meanwhile(user_id):
+        # Another request commits after the user was loaded
+        with Session(session.get_bind()) as other:
+            other.exec(update(User).values(bonus_attack=7))
+            other.commit()
+        response_cache.bump(user_id)
+        return version(user_id)
+
+    monkeypatch.setattr(response_cache, "version", commit_meanwhile)
+    response = client.get("/game/upgrades", headers={"Authorization": f"Bearer {auth_token}"})
+    assert response.json()["bonus_attack"] == 7
+    assert user.bonus_attack == 7
+
+
+def test_move_loads_only_nearby_tiles(client, auth_token, session):
+    from app.routes.game import _load_world, _move_window
+
+    user = session.exec(select(User)).first()
+    user.x, user.y = 30, 30
+    for x in range(60):
+        for y in range(60):
+            session.add(MapTile(x=x, y=y, tile_type="floor", user_id=user.id))
+    session.add(MapTile(x=59, y=59, tile_type="exit", user_id=user.id))
+    session.add(Mob(x=10, y=10, user_id=user.id))
+    session.commit()
+
+    world, _ = _load_world(session, user, window=_move_window)
+    assert (world.width, world.height, world.exit) == (60, 60, (59, 59))
+    # 3x3 вокруг игрока и 3x3 вокруг моба
+    assert sum(1 for cell in world.cells if cell) == 18
+
+    response = client.post(
+        "/game/move",
+        json={"direction": "right"},
+        headers={"Authorization": f"Bearer {auth_token}"}
+    )
+    assert (response.json()["x"], response.json()["y"]) == (31, 30)
+    assert response.json()["mobs"] == [{"x": 11, "y": 10}]
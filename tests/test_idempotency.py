@@ -0,0 +1,131 @@
+import asyncio
+
+import pytest
+from sqlmodel import SQLModel, create_engine, select, update, delete
+
+from app import idempotency
+from app.auth import create_access_token
+from app.config import settings
+from app.idempotency import IdempotencyMiddleware, SharedKeys, idempotency_cache
+from app.models import MapTile, Mob, User
+
+
+@pytest.fixture
+def auth_token(client):
+    client.post("/auth/register", json={"username": "testuser", "password": "testpass"})
+    response = client.post(
+        "/auth/login",
+        data={"username": "testuser", "password": "testpass"}
+    )
+    return response.json()["access_token"]
+
+
+@pytest.fixture
+def headers(client, auth_token, session):
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    client.get("/game/state", headers=headers)
+    session.exec(update(MapTile).values(tile_type="floor"))
+    session.exec(delete(Mob))
+    session.commit()
+    return headers
+
+
+def player_x(session):
+    session.expire_all()
+    return session.exec(select(User.x)).one()
+
+
+def test_retry_replays_response(client, headers, session):
+    headers = {**headers, "Idempotency-Key": "move-1"}
+    first = client.post("/game/move", json={"direction": "right"}, headers=headers)
+    retry = client.post("/game/move", json={"direction": "right"}, headers=headers)
+
+    assert retry.status_code == first.status_code == 200
+    assert retry.json() == first.json()
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert "idempotent-replayed" not in first.headers
+    assert player_x(session) == 1
+
+    response = client.post("/game/move", json={"direction": "down"}, headers=headers)
+    assert response.status_code == 422
+
+    headers["Idempotency-Key"] = "move-2"
+    client.post("/game/move", json={"direction": "right"}, headers=headers)
+    assert player_x(session) == 2
+
+
+def test_expired_and_missing_keys_run_again(client, headers, session, monkeypatch):
+    client.post("/game/move", json={"direction": "right"}, headers=headers)
+    client.post("/game/move", json={"direction": "right"}, headers=headers)
+    assert player_x(session) == 2
+
+    monkeypatch.setattr(settings, "idempotency_ttl_seconds", 0)
+    headers = {**headers, "Idempotency-Key": "move-1"}
+    client.post("/game/move", json={"direction": "right"}, headers=headers)
+    client.post("/game/move", json={"direction": "right"}, headers=headers)
+    assert player_x(session) == 4
+
+
+def run_duplicates():
+    calls = []
+
+    async def app(scope, receive, send):
+        calls.append((await receive())["body"])
+        await asyncio.sleep(0.01)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"done"})
+
+    async def request():
+        sent = []
+        body = iter([{"type": "http.request", "body": b"{}", "more_body": False}])
+
+        async def receive():
+            return next(body)
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {
+            "type": "http", "method": "POST", "path": "/game/move",
+            "headers": [
+                (b"authorization", f"Bearer {create_access_token({'sub': 'someone'})}".encode()),
+                (b"idempotency-key", b"k"),
+            ],
+        }
+        await IdempotencyMiddleware(app)(scope, receive, send)
+        return sent
+
+    async def both():
+        return await asyncio.gather(request(), request())
+
+    first, second = asyncio.run(both())
+    return calls, first, second
+
+
+def test_concurrent_duplicate_waits_for_first():
+    calls, first, second = run_duplicates()
+    assert calls == [b"{}"]
+    assert first[-1]["body"] == second[-1]["body"] == b"done"
+    assert (b"idempotent-replayed", b"true") in second[0]["headers"]
+
+
+def test_keys_are_shared_between_workers(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'game.db'}")
+    SQLModel.metadata.create_all(engine)
+    monkeypatch.setattr(settings, "cache_sync_enabled", True)
+    monkeypatch.setattr(idempotency, "shared_keys", SharedKeys(engine))
+
+    calls, first, second = run_duplicates()
+    assert calls == [b"{}"]
+    assert first[-1]["body"] == second[-1]["body"] == b"done"
+    # Either request may claim the key first
+    replayed = [(b"idempotent-replayed", b"true") in sent[0]["headers"] for sent in (first, second)]
+    assert sorted(replayed) == [False, True]
+    assert len(idempotency_cache) == 0
+
+    # Another worker sees the stored response and the keys still running
+    other = SharedKeys(engine)
+    assert other.claim("someone", "k", "different").status == 200
+    assert other.claim("someone", "new", "f") is None
+    assert idempotency.shared_keys.claim("someone", "new", "f").status is None
+    engine.dispose()
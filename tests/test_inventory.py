@@ -3,6 +3,7 @@ import pytest
 from sqlmodel import Session, select, delete
 
 from app.models import InventoryItem, MapTile, User, Mob
+from app.response_cache import invalidate, response_cache
 
 
 @pytest.fixture
@@ -41,6 +42,12 @@ def test_use_wallbreaker_success(client, auth_token, session: Session):
     # Генерируем карту и находим игрока
     client.post("/game/generate_map", headers={"Authorization": f"Bearer {auth_token}"})
     user = session.exec(select(User)).first()
+    # Ставим стену рядом с игроком: на случайной карте её может не быть
+    tile = session.exec(select(MapTile).where(
+        MapTile.user_id == user.id, MapTile.x == 1, MapTile.y == 1
+    )).one()
+    tile.tile_type = "wall"
+    session.commit()
 
     # Проверяем начальное количество стенолома
 
@@ -132,4 +139,47 @@ def test_add_item_to_inventory(client, auth_token, session: Session):
     )
 
     assert response.status_code == 200
-    assert any(item["name"] == "Жажда" for item in response.json()["items"])
\ No newline at end of file
+    assert any(item["name"] == "Жажда" for item in response.json()["items"])
+
+
+def test_inventory_not_modified(client, auth_token):
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    client.post("/game/generate_map", headers=headers)
+    response = client.get("/inventory", headers=headers)
+    etag = response.headers["etag"]
+
+    response = client.get("/inventory", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
+
+    # Another worker, or a restarted server, issues the same ETag
+    response_cache.clear()
+    response = client.get("/inventory", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
+
+    # A new map adds a wallbreaker, which changes the inventory and its ETag
+    client.post("/game/generate_map", headers=headers)
+    response = client.get("/inventory", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+
+def test_cache_is_invalidated_before_and_after_commit(session: Session):
+    user = User(username="cached", hashed_password="")
+    session.add(user)
+    session.commit()
+    version = response_cache.version(user.id)
+
+    user.killed_mobs = 3
+    invalidate(session, user.id)
+    # Пока идет запись, старый ETag уже не подходит
+    during = response_cache.version(user.id)
+    assert during != version
+    session.commit()
+    # Ответы, собранные до коммита, тоже устарели
+    assert response_cache.version(user.id) not in (version, during)
+
+    invalidate(session, user.id)
+    session.rollback()
+    after_rollback = response_cache.version(user.id)
+    session.commit()
+    assert response_cache.version(user.id) == after_rollback
@@ -0,0 +1,108 @@
+import json
+
+import pytest
+from sqlmodel import Session, select, update
+
+from app import journal
+from app.config import settings
+from app.models import User, MapTile, Mob, ActionEvent, WorldSnapshot
+
+
+@pytest.fixture
+def auth_token(client, monkeypatch):
+    monkeypatch.setattr(settings, "action_log_enabled", True)
+    client.post("/auth/register", json={"username": "testuser", "password": "testpass"})
+    response = client.post(
+        "/auth/login",
+        data={"username": "testuser", "password": "testpass"}
+    )
+    return response.json()["access_token"]
+
+
+def play(client, auth_token, moves):
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    client.get("/game/state", headers=headers)
+    for direction in moves:
+        client.post("/game/move", json={"direction": direction}, headers=headers)
+    client.put("/game/use-wallbreaker", headers=headers)
+
+
+def test_replay_matches_state_tables(client, auth_token, session):
+    play(client, auth_token, ["right", "down", "right", "down", "left", "down"])
+    user = session.exec(select(User)).first()
+
+    assert session.exec(select(ActionEvent)).first() is not None
+    rebuilt = journal.rebuild_world(session, user.id)
+    assert rebuilt == journal.capture_world(session, user)
+
+
+def test_periodic_snapshots(client, auth_token, session, monkeypatch):
+    monkeypatch.setattr(settings, "snapshot_interval", 2)
+    play(client, auth_token, ["right", "down", "right", "down", "down"])
+    user = session.exec(select(User)).first()
+
+    # Only the latest snapshot and the events after it are kept
+    snapshots = session.exec(select(WorldSnapshot)).all()
+    assert len(snapshots) == 1
+    assert len(session.exec(select(ActionEvent)).all()) < 2
+    assert journal.rebuild_world(session, user.id) == journal.capture_world(session, user)
+
+
+def test_moves_only_append_to_the_log(client, auth_token, session):
+    play(client, auth_token, ["right", "down", "right", "down"])
+    user = session.exec(select(User)).first()
+    snapshot = json.loads(session.exec(select(WorldSnapshot)).one().state)
+
+    # The user row keeps the snapshot position, the loaded user the logged one
+    row = session.connection().execute(
+        select(User.__table__.c.x, User.__table__.c.y).where(User.__table__.c.id == user.id)
+    ).one()
+    assert tuple(row) == (snapshot["player"]["x"], snapshot["player"]["y"])
+    assert journal.rebuild_world(session, user.id) == journal.capture_world(session, user)
+
+    session.expunge_all()
+    session.info.clear()
+    user = session.get(User, user.id)
+    assert journal.rebuild_world(session, user.id) == journal.capture_world(session, user)
+
+
+def test_direct_writes_are_not_hidden_by_the_log(client, auth_token, session):
+    play(client, auth_token, ["right", "down"])
+    user = session.exec(select(User)).first()
+    mob = session.exec(select(Mob)).first()
+    user.x, user.health = 5, 42
+    mob.y = 9
+    session.commit()
+
+    with Session(session.get_bind()) as fresh:
+        user = fresh.get(User, user.id)
+        assert (user.x, user.health) == (5, 42)
+        assert fresh.get(Mob, mob.id).y == 9
+        assert journal.rebuild_world(fresh, user.id) == journal.capture_world(fresh, user)
+
+
+def test_restore_world_from_log(client, auth_token, session):
+    play(client, auth_token, ["down", "right", "down"])
+    user = session.exec(select(User)).first()
+    expected = journal.capture_world(session, user)
+
+    # Damage the state tables behind the log's back
+    for tile in session.exec(select(MapTile)).all():
+        tile.tile_type = "wall"
+    session.exec(update(User).values(x=7, y=7))
+    session.commit()
+
+    journal.restore_world(session, user, journal.rebuild_world(session, user.id))
+    assert journal.capture_world(session, user) == expected
+
+
+def test_log_disabled_by_default(client, session):
+    client.post("/auth/register", json={"username": "quiet", "password": "testpass"})
+    token = client.post(
+        "/auth/login",
+        data={"username": "quiet", "password": "testpass"}
+    ).json()["access_token"]
+    play(client, token, ["right"])
+
+    assert session.exec(select(ActionEvent)).first() is None
+    assert session.exec(select(WorldSnapshot)).first() is None
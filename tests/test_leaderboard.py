@@ -0,0 +1,94 @@
+import threading
+
+from sqlmodel import select
+
+from app.leaderboard import Leaderboard
+from app.models import User, MapTile, Mob
+
+
+def register_and_login(client, username):
+    client.post("/auth/register", json={"username": username, "password": "testpass"})
+    response = client.post(
+        "/auth/login",
+        data={"username": username, "password": "testpass"}
+    )
+    return response.json()["access_token"]
+
+
+def test_top_and_rank_order():
+    board = Leaderboard()
+    board.loaded = True
+    for user_id, score in enumerate([3, 10, 0, 10, 7, 500], start=1):
+        board.update(User(id=user_id, username=f"p{user_id}", hashed_password="", killed_mobs=score))
+
+    top = board.top(4)
+    assert [p["username"] for p in top] == ["p6", "p2", "p4", "p5"]
+    assert [p["rank"] for p in top] == [1, 2, 2, 4]
+    assert board.rank(3) == 6
+    assert board.rank(4) == 2
+
+    board.update(User(id=3, username="p3", hashed_password="", killed_mobs=11))
+    assert board.rank(3) == 2
+    board.remove(6)
+    assert board.rank(3) == 1
+    assert len(board.top(100)) == 5
+
+
+def test_update_during_first_load_is_kept():
+    board = Leaderboard()
+    user = User(id=1, username="p1", hashed_password="", killed_mobs=5)
+
+    class SlowSession:
+        """Returns the rows read before a kill that commits during the load."""
+        def exec(self, _query):
+            racer.start()
+            racer.join(1)
+            # The update did not wait for the load
+            assert not racer.is_alive()
+            return StaleRows()
+
+    class StaleRows:
+        def all(self):
+            return [(1, "p1", 4)]
+
+    racer = threading.Thread(target=board.update, args=(user,))
+    board.ensure_loaded(SlowSession())
+    racer.join()
+    assert board.top(1) == [{"rank": 1, "username": "p1", "killed_mobs": 5}]
+
+
+def test_leaderboard_endpoint(client, session):
+    token = register_and_login(client, "first")
+    register_and_login(client, "second")
+    second = session.exec(select(User).where(User.username == "second")).first()
+    second.killed_mobs = 5
+    session.commit()
+
+    response = client.get("/leaderboard", params={"limit": 1})
+    assert response.status_code == 200
+    assert response.json()["players"][0]["username"] == "second"
+    assert response.json()["total"] == 2
+
+    response = client.get("/leaderboard/me", headers={"Authorization": f"Bearer {token}"})
+    assert response.json()["rank"] == 2
+
+
+def test_kill_updates_rank(client, session):
+    token = register_and_login(client, "hunter")
+    register_and_login(client, "idle")
+    client.get("/leaderboard")
+
+    user = session.exec(select(User).where(User.username == "hunter")).first()
+    user.base_attack = 50
+    session.add(MapTile(x=1, y=0, tile_type="floor", user_id=user.id))
+    session.add(Mob(x=1, y=0, user_id=user.id, health=50))
+    session.commit()
+
+    client.post(
+        "/game/move",
+        json={"direction": "right"},
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    response = client.get("/leaderboard/me", headers={"Authorization": f"Bearer {token}"})
+    assert response.json()["rank"] == 1
+    assert response.json()["killed_mobs"] == 1
@@ -0,0 +1,52 @@
+import pytest
+
+from app.config import settings
+from app.ratelimit import RateLimiter
+
+
+@pytest.fixture
+def auth_token(client):
+    client.post("/auth/register", json={"username": "testuser", "password": "testpass"})
+    response = client.post(
+        "/auth/login",
+        data={"username": "testuser", "password": "testpass"}
+    )
+    return response.json()["access_token"]
+
+
+def test_route_limit_returns_429(client, auth_token, monkeypatch):
+    monkeypatch.setitem(settings.rate_limits, "/game/generate_map", (0.01, 2))
+    headers = {"Authorization": f"Bearer {auth_token}"}
+
+    for _ in range(2):
+        assert client.post("/game/generate_map", headers=headers).status_code == 200
+
+    response = client.post("/game/generate_map", headers=headers)
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+
+    # Other routes and other users keep their own buckets
+    assert client.get("/game/state", headers=headers).status_code == 200
+
+
+def test_concurrency_cap_returns_503(client, auth_token, monkeypatch):
+    monkeypatch.setattr(settings, "max_concurrent_requests", 0)
+    response = client.get(
+        "/game/state",
+        headers={"Authorization": f"Bearer {auth_token}"}
+    )
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+
+def test_buckets_refill_and_evict(monkeypatch):
+    monkeypatch.setattr(settings, "rate_limit_max_keys", 3)
+    limiter = RateLimiter()
+
+    assert limiter.acquire(("a", "/x"), 1000.0, 1) == 0
+    assert limiter.acquire(("a", "/x"), 0.5, 1) > 0
+    for user in "bcd":
+        limiter.acquire((user, "/x"), 1.0, 1)
+    assert len(limiter) == 3
+    # "a" was evicted, so it starts again with a full bucket
+    assert limiter.acquire(("a", "/x"), 0.5, 1) == 0
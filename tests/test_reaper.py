@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import inspect
+from sqlmodel import create_engine, select
+
+from app import database
+from app.models import User, MapTile, Mob, InventoryItem
+from app.reaper import reap_idle_worlds
+
+
+def add_world(session, username, last_action):
+    user = User(username=username, hashed_password="", last_action=last_action)
+    session.add(user)
+    session.commit()
+    for x in range(3):
+        session.add(MapTile(x=x, y=0, tile_type="floor", user_id=user.id))
+    session.add(Mob(x=2, y=0, user_id=user.id))
+    session.add(InventoryItem(name="Стенолом", owner_id=user.id))
+    session.commit()
+    return user
+
+
+def test_reaps_only_idle_worlds(session):
+    now = datetime.now()
+    idle = add_world(session, "idle", now - timedelta(days=90))
+    active = add_world(session, "active", now - timedelta(hours=1))
+    # Not seen since last_action was introduced
+    unseen = add_world(session, "unseen", None)
+
+    assert reap_idle_worlds(session, now) == 2
+    for user in (idle, unseen):
+        assert session.exec(select(MapTile).where(MapTile.user_id == user.id)).first() is None
+        assert session.exec(select(Mob).where(Mob.user_id == user.id)).first() is None
+        assert session.exec(select(InventoryItem).where(InventoryItem.owner_id == user.id)).first() is None
+    assert session.exec(select(MapTile).where(MapTile.user_id == active.id)).first()
+
+    # Already released worlds are not selected again
+    assert reap_idle_worlds(session, now) == 0
+
+
+def test_reaped_world_regenerates_on_return(client, session):
+    client.post("/auth/register", json={"username": "testuser", "password": "testpass"})
+    token = client.post(
+        "/auth/login",
+        data={"username": "testuser", "password": "testpass"}
+    ).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    client.get("/game/state", headers=headers)
+
+    user = session.exec(select(User)).first()
+    user.last_action = datetime.now() - timedelta(days=365)
+    session.commit()
+    assert reap_idle_worlds(session) == 1
+
+    response = client.get("/game/state", headers=headers)
+    assert len(response.json()["tiles"]) > 0
+    assert len(response.json()["mobs"]) == 5
+
+
+def test_every_command_counts_as_activity(client, session):
+    client.post("/auth/register", json={"username": "reader", "password": "testpass"})
+    token = client.post(
+        "/auth/login",
+        data={"username": "reader", "password": "testpass"}
+    ).json()["access_token"]
+
+    client.get("/inventory/", headers={"Authorization": f"Bearer {token}"})
+    user = session.exec(select(User)).first()
+    assert datetime.now() - user.last_action < timedelta(minutes=1)
+
+
+def test_missing_indexes_are_created(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as connection:
+        connection.exec_driver_sql(
+            "CREATE TABLE maptile (id INTEGER PRIMARY KEY, x INTEGER, y INTEGER, "
+            "tile_type VARCHAR, user_id INTEGER)"
+        )
+    monkeypatch.setattr(database, "engine", engine)
+
+    database.create_db_and_tables()
+    assert "ix_maptile_user_id" in {index["name"] for index in inspect(engine).get_indexes("maptile")}
@@ -0,0 +1,68 @@
+from sqlmodel import SQLModel, Session, create_engine, select
+
+from app.models import User, MapTile, Mob, InventoryItem, CacheInvalidation
+from app.season import main, reset_season, generate_shard
+
+
+def add_players(session, count):
+    users = [User(username=f"player{n}", hashed_password="hash", x=3, y=4, health=5,
+                  bonus_health=20, is_active=False) for n in range(count)]
+    session.add_all(users)
+    session.commit()
+    session.add(MapTile(x=0, y=0, tile_type="wall", user_id=users[0].id))
+    session.add(Mob(x=1, y=1, user_id=users[0].id))
+    session.commit()
+    return users
+
+
+def worlds(session):
+    return sorted(
+        (t.user_id, t.x, t.y, t.tile_type) for t in session.exec(select(MapTile)).all()
+    ) + sorted((m.user_id, m.x, m.y, m.health) for m in session.exec(select(Mob)).all())
+
+
+def test_reset_replaces_every_world(session):
+    users = add_players(session, 7)
+    progress = []
+
+    assert reset_season(session.get_bind(), workers=1, shard_size=3, seed=7,
+                        progress=lambda done, total, _: progress.append((done, total))) == 7
+    assert progress == [(3, 7), (6, 7), (7, 7)]
+
+    session.expire_all()
+    for user in users:
+        assert (user.x, user.y, user.health, user.is_active) == (0, 0, 120, True)
+        assert user.version == 1
+        assert len(session.exec(select(MapTile).where(MapTile.user_id == user.id)).all()) == 401
+        assert len(session.exec(select(Mob).where(Mob.user_id == user.id)).all()) == 5
+        assert session.exec(select(InventoryItem).where(InventoryItem.owner_id == user.id)).one().quantity == 1
+
+    # The same seed gives the same maps whatever the sharding and worker count
+    first = worlds(session)
+    reset_season(session.get_bind(), workers=2, shard_size=2, seed=7)
+    assert worlds(session) == first
+    assert sorted(generate_shard(7, [users[0].id])[1]) == sorted(
+        (x, y, tile_type, user_id) for user_id, x, y, tile_type in first[:401]
+    )
+
+
+def test_reset_with_other_paramstyle():
+    # Drivers without "?" placeholders get plain Core inserts
+    engine = create_engine("sqlite://", paramstyle="named")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        users = add_players(session, 2)
+        assert reset_season(engine, workers=1, seed=7) == 2
+        assert len(session.exec(select(MapTile).where(MapTile.user_id == users[1].id)).all()) == 401
+
+
+def test_command_tells_running_servers(tmp_path, capsys):
+    # Servers read the invalidations with cache_sync_enabled, whatever the setting here
+    url = f"sqlite:///{tmp_path / 'game.db'}"
+    engine = create_engine(url)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        users = add_players(session, 2)
+        main(["--database", url, "--workers", "1"])
+        invalidated = session.exec(select(CacheInvalidation.user_id)).all()
+        assert sorted(invalidated) == sorted(user.id for user in users)
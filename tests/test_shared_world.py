@@ -0,0 +1,154 @@
+import random
+
+import pytest
+
+from app.config import settings
+from app.engine import GameError, FLOOR
+from app.models import User
+from app.shared_world import SharedWorld, SharedWorlds, SpatialGrid, SharedMob, shared_worlds
+
+
+def open_world(size=30, mobs=0):
+    world = SharedWorld(0, size=size, mob_count=mobs, rng=random.Random(1))
+    world.terrain.cells[:] = bytes([FLOOR]) * len(world.terrain.cells)
+    return world
+
+
+def place(world, user_id, x, y):
+    world.join(User(id=user_id, username=f"player{user_id}", hashed_password=""))
+    player = world.players[user_id]
+    world._relocate(player, world.player_grid, x, y)
+    player.outbox.clear()
+    return player
+
+
+def test_grid_matches_brute_force():
+    rng = random.Random(3)
+    points = [SharedMob(i) for i in range(300)]
+    grid = SpatialGrid(8)
+    for point in points:
+        point.x, point.y = rng.randrange(100), rng.randrange(100)
+        grid.add(point)
+    for point in points[:100]:
+        point.x, point.y = rng.randrange(100), rng.randrange(100)
+        grid.update(point)
+    grid.remove(points[-1])
+
+    for x, y, radius in [(0, 0, 8), (50, 50, 8), (99, 10, 3), (40, 60, 20)]:
+        expected = {p for p in points[:-1] if abs(p.x - x) <= radius and abs(p.y - y) <= radius}
+        assert set(grid.near(x, y, radius)) == expected
+
+
+def test_moves_reach_only_nearby_players():
+    world = open_world()
+    radius = settings.shared_view_radius
+    mover = place(world, 1, 10, 10)
+    place(world, 2, 12, 12)
+    behind = place(world, 3, 10 + radius, 10)
+    ahead = place(world, 4, 9 - radius, 10)
+    far = place(world, 5, 12 + radius + 2, 10)
+    for user_id in world.players:
+        world.view(user_id)
+
+    assert world.move(1, "left")["outcome"] == "move"
+    gone = {"type": "player", "id": 1, "gone": True}
+    assert world.updates(2) == {"updates": [mover.state()], "resync": False}
+    assert world.updates(3)["updates"] == [gone]
+    assert world.updates(4)["updates"] == [mover.state()]
+    assert world.updates(5)["updates"] == []
+    # The mover's own view changed too
+    assert world.updates(1)["updates"] == [ahead.state(), {"type": "player", "id": behind.id, "gone": True}]
+
+    view = world.view(2)
+    assert sorted(player["id"] for player in view["players"]) == [1, behind.id]
+    assert far.id not in [player["id"] for player in world.view(1)["players"]]
+
+    place(world, 6, 9, 11)
+    with pytest.raises(GameError, match="occupied"):
+        world.move(1, "down")
+
+
+def test_outbox_overflow_asks_for_resync(monkeypatch):
+    monkeypatch.setattr(settings, "shared_outbox_size", 2)
+    world = open_world()
+    place(world, 1, 10, 10)
+    place(world, 2, 12, 10)
+    world.view(1)
+
+    for direction in ("down", "up", "down"):
+        world.move(2, direction)
+    assert world.updates(1) == {"updates": [], "resync": True}
+    assert world.updates(1)["resync"]
+    world.view(1)
+    world.move(2, "up")
+    assert world.updates(1) == {"updates": [world.players[2].state()], "resync": False}
+
+
+def test_idle_players_are_evicted(monkeypatch):
+    monkeypatch.setattr(settings, "shared_map_size", 40)
+    monkeypatch.setattr(settings, "shared_mob_count", 0)
+    worlds = SharedWorlds()
+    for user_id in (1, 2):
+        worlds.join(User(id=user_id, username=f"player{user_id}", hashed_password=""))
+    world = worlds.world_of(1)
+    world.players[1].last_seen -= settings.shared_idle_seconds + 1
+
+    assert worlds.evict_idle() == 1
+    assert list(world.players) == [2]
+    with pytest.raises(GameError):
+        worlds.world_of(1)
+
+
+def test_mobs_fight_and_respawn():
+    world = open_world(mobs=1)
+    mob = next(iter(world.mobs.values()))
+    world._relocate(mob, world.mob_grid, 11, 10)
+    player = place(world, 1, 10, 10)
+    player.attack = 50
+
+    assert world.move(1, "right")["outcome"] == "attack"
+    assert mob.id not in world.mobs
+    assert len(world.mobs) == 1
+    assert player.killed_mobs == 1
+
+    respawned = next(iter(world.mobs.values()))
+    world._relocate(respawned, world.mob_grid, player.x + 1, player.y - 1)
+    player.health = 10
+    result = world.move(1, "up")
+    assert result["outcome"] == "death"
+    assert result["player"]["health"] == player.max_health
+
+
+def test_shared_routes(client, monkeypatch):
+    headers = {}
+    response = client.post("/shared/join", headers=headers)
+    assert response.status_code in (401, 404)
+
+    client.post("/auth/register", json={"username": "testuser", "password": "testpass"})
+    token = client.post(
+        "/auth/login", data={"username": "testuser", "password": "testpass"}
+    ).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.post("/shared/join", headers=headers).status_code == 404
+
+    monkeypatch.setattr(settings, "shared_world_enabled", True)
+    monkeypatch.setattr(settings, "shared_map_size", 40)
+    monkeypatch.setattr(settings, "shared_mob_count", 0)
+    assert client.get("/shared/view", headers=headers).status_code == 400
+
+    view = client.post("/shared/join", headers=headers).json()
+    assert view["shard"] == 0
+    assert view["player"]["name"] == "testuser"
+
+    # A known free cell to step into, wherever the player was placed
+    world = shared_worlds.world_of(view["player"]["id"])
+    player = world.players[view["player"]["id"]]
+    world._relocate(player, world.player_grid, 10, 10)
+    world.terrain.cells[10 * world.terrain.width + 11] = FLOOR
+    response = client.post("/shared/move", json={"direction": "right"}, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["outcome"] == "move"
+    assert response.json()["resync"] is False
+    assert client.get("/shared/updates", headers=headers).json() == {"updates": [], "resync": False}
+    assert client.post("/shared/leave", headers=headers).status_code == 200
+    assert client.get("/shared/view", headers=headers).status_code == 400
@@ -0,0 +1,54 @@
+import gzip
+
+from app.main import app
+
+
+def static_files():
+    return next(route.app for route in app.routes if route.path == "/static")
+
+
+def test_html_references_hashed_assets(client):
+    response = client.get("/static/game.html")
+    assert response.status_code == 200
+    assert static_files().url_for("styles.css") in response.text
+    assert static_files().url_for("images/wall.png") in response.text
+    assert response.headers["cache-control"] == "no-cache"
+
+
+def test_gzip_served_by_accept_encoding(client):
+    response = client.get(
+        "/static/styles.css",
+        headers={"Accept-Encoding": "gzip"}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    with open("app/static/styles.css", "rb") as file:
+        assert response.content == file.read()
+
+    raw = client.get(
+        "/static/styles.css",
+        headers={"Accept-Encoding": "identity"}
+    )
+    assert "content-encoding" not in raw.headers
+    assert len(gzip.compress(raw.content)) < len(raw.content)
+
+
+def test_hashed_url_is_immutable(client):
+    response = client.get(static_files().url_for("images/mob.png"))
+    assert response.status_code == 200
+    assert "immutable" in response.headers["cache-control"]
+
+
+def test_etag_not_modified(client):
+    response = client.get("/static/index.html")
+    etag = response.headers["etag"]
+
+    response = client.get("/static/index.html", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+
+def test_missing_static_file(client):
+    response = client.get("/static/missing.css")
+    assert response.status_code == 404
@@ -0,0 +1,117 @@
+import gzip
+import io
+import json
+from datetime import datetime
+
+from sqlmodel import SQLModel, Session, create_engine, select
+from sqlmodel.pool import StaticPool
+
+from app import journal
+from app.config import settings
+from app.models import User, MapTile, Mob, InventoryItem
+from app.transfer import export_worlds, import_worlds, main
+
+
+def add_player(session, username, tiles):
+    user = User(username=username, hashed_password="hash", killed_mobs=3, last_action=datetime(2026, 1, 2, 3, 4))
+    session.add(user)
+    session.commit()
+    for x in range(tiles):
+        session.add(MapTile(x=x, y=0, tile_type="wall" if x % 2 else "floor", user_id=user.id))
+    mob = Mob(x=1, y=0, health=20, user_id=user.id)
+    session.add(mob)
+    session.commit()
+    session.add(InventoryItem(name="Mob Loot", owner_id=user.id, mob_id=mob.id))
+    session.add(InventoryItem(name="Стенолом", owner_id=user.id, quantity=2))
+    session.commit()
+
+
+def dump(session):
+    return [
+        [(u.id, u.username, u.hashed_password, u.killed_mobs, u.last_action)
+         for u in session.exec(select(User).order_by(User.id))],
+        [(t.x, t.y, t.tile_type, t.user_id) for t in session.exec(select(MapTile).order_by(MapTile.id))],
+        [(m.id, m.x, m.y, m.health, m.user_id) for m in session.exec(select(Mob).order_by(Mob.id))],
+        [(i.id, i.name, i.quantity, i.owner_id, i.mob_id)
+         for i in session.exec(select(InventoryItem).order_by(InventoryItem.id))],
+    ]
+
+
+def test_export_import_roundtrip(session):
+    for n in range(5):
+        add_player(session, f"player{n}", tiles=n * 3)
+
+    out = io.StringIO()
+    assert export_worlds(session.get_bind(), out, batch_size=2) == 5
+    lines = out.getvalue().splitlines()
+    assert len(lines) == 5
+
+    target = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(target)
+    assert import_worlds(target, lines, batch_size=2) == 5
+    with Session(target) as restored:
+        assert dump(restored) == dump(session)
+
+
+def test_cli_gzip_file(session, tmp_path):
+    add_player(session, "solo", tiles=4)
+    url = f"sqlite:///{tmp_path / 'source.db'}"
+    source = create_engine(url)
+    SQLModel.metadata.create_all(source)
+    import_worlds(source, export_lines(session))
+
+    path = str(tmp_path / "players.ndjson.gz")
+    main(["export", path, "--database", url])
+    with gzip.open(path, "rt", encoding="utf-8") as file:
+        assert '"username":"solo"' in file.read()
+
+    restored_url = f"sqlite:///{tmp_path / 'restored.db'}"
+    main(["import", path, "--database", restored_url])
+    with Session(create_engine(restored_url)) as restored:
+        assert dump(restored) == dump(session)
+
+
+def test_export_includes_logged_moves(session, monkeypatch):
+    monkeypatch.setattr(settings, "action_log_enabled", True)
+    add_player(session, "walker", tiles=4)
+    user = session.exec(select(User)).one()
+    journal.take_snapshot(session, user)
+    mob = session.exec(select(Mob)).one()
+    user.x, user.health, mob.x = 2, 90, 3
+    journal.record(session, user, "move", p=[2, 0, 90], m=[[mob.id, 3, 0]])
+    session.commit()
+
+    record = json.loads(export_lines(session)[0])
+    assert (record["user"]["x"], record["user"]["health"]) == (2, 90)
+    assert record["mobs"] == [[mob.id, 3, 0, 20]]
+
+
+def test_export_is_one_snapshot(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'live.db'}")
+    SQLModel.metadata.create_all(engine)
+    with engine.connect() as connection:
+        connection.exec_driver_sql("PRAGMA journal_mode=WAL")
+    with Session(engine) as session:
+        for n in range(3):
+            add_player(session, f"player{n}", tiles=2)
+
+    class Playing(io.StringIO):
+        """The server keeps writing while the first batch is exported."""
+        def write(self, line):
+            if not self.tell():
+                with Session(engine) as session:
+                    session.get(User, 3).username = "renamed"
+                    add_player(session, "late", tiles=2)
+            return super().write(line)
+
+    out = Playing()
+    assert export_worlds(engine, out, batch_size=1) == 3
+    usernames = [json.loads(line)["user"]["username"] for line in out.getvalue().splitlines()]
+    assert usernames == ["player0", "player1", "player2"]
+    engine.dispose()
+
+
+def export_lines(session):
+    out = io.StringIO()
+    export_worlds(session.get_bind(), out)
+    return out.getvalue().splitlines()